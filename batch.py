@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import uuid
+import logging
+import asyncio
+import argparse
+
+from src.pipeline.parser_py import parse_repo, get_head_commit, _repo_name
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.ignore import IgnoreEngine
+from src.pipeline.nla_generator_py import generate_nla
+from src.pipeline.snapshot import write_graph, SNAPSHOT_EXTENSION
+from src.pipeline.index import build_index, index_path_for, load_embedder
+from src.pipeline.symbols import SymbolTable, symbols_path_for
+from src.pipeline.scheduler import FairScheduler
+from src.pipeline.utils import setup_service_llm
+from src.pipeline import telemetry
+
+from main import build_parser as build_pipeline_parser
+from utils import update_args
+
+logger = logging.getLogger(__name__)
+
+def load_manifest(path: str):
+    """
+    Reads a JSON lines manifest with one repository per line, e.g.
+    {"repo": "https://github.com/psf/requests", "ref": "v2.32.3", "name": "requests"}.
+    "repo" is a GitHub URL or a local path, "ref" and "name" are optional. The
+    name defaults to the repository's directory name and names the outputs.
+    """
+    entries = []
+    with open(path, "r") as file:
+        for lineno, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"{path}:{lineno} is not valid JSON: {exc}") from exc
+            if not isinstance(entry, dict) or "repo" not in entry:
+                raise ValueError(f"{path}:{lineno} has no \"repo\"")
+            entry.setdefault("ref", None)
+            entry.setdefault("name", _repo_name(os.path.normpath(entry["repo"])))
+            entries.append(entry)
+
+    names = [entry["name"] for entry in entries]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path} lists several repositories named {', '.join(duplicates)}, give them distinct \"name\"s")
+    return entries
+
+def _write_outputs(graph, name: str, args):
+    graph_ext = SNAPSHOT_EXTENSION if args.graph_format == "snapshot" else ".graphml"
+    graph_path = os.path.join(args.output_dir, f"{name}_nla{graph_ext}")
+
+    # written under a temporary name so that an interrupted batch never leaves a partial graph behind
+    temp_path = f"{graph_path}.{uuid.uuid4().hex}{graph_ext}"
+    write_graph(graph, temp_path)
+    os.replace(temp_path, graph_path)
+
+    if graph.graph.get("symbol_edges"):
+        SymbolTable.from_graph(graph).save(symbols_path_for(graph_path))
+    if args.build_index:
+        build_index(graph, embedder=load_embedder(args.index_embedder)).save(index_path_for(graph_path))
+    return graph_path
+
+async def _annotate_repo(entry: dict, args, scheduler: FairScheduler, build_semaphore: asyncio.Semaphore):
+    name = entry["name"]
+    start = time.perf_counter()
+
+    # the CPU bound clone, parse and graph build run in threads, at most --repo-concurrency at once
+    async with build_semaphore:
+        with telemetry.span("batch.build_graph", repo=name):
+            path = await asyncio.to_thread(parse_repo, entry["repo"], entry["ref"], args.clone_cache_dir)
+            root_node, graph = await asyncio.to_thread(
+                build_graph, path, draw_graph=False, parse_workers=args.parse_workers, symbol_edges=args.symbol_edges,
+                ignores=IgnoreEngine.from_config(args.parse_ignores_path, args.exclude, args.include, gitignore=not args.no_gitignore),
+            )
+    commit = get_head_commit(path)
+    if commit:
+        graph.graph["commit"] = commit
+    logger.info("%s: %d nodes, annotating", name, graph.number_of_nodes())
+
+    repo_args = argparse.Namespace(**vars(args))
+    repo_args.nla_slot = lambda: scheduler.slot(name)
+    repo_args.save_graph_animation = False
+    if args.checkpoint_dir:
+        # root package names may repeat across repositories
+        repo_args.checkpoint_dir = os.path.join(args.checkpoint_dir, name)
+
+    with telemetry.span("batch.generate_nla", repo=name):
+        graph = await generate_nla(graph, root_node, repo_args)
+    with telemetry.span("batch.export", repo=name):
+        graph_path = await asyncio.to_thread(_write_outputs, graph, name, args)
+
+    logger.info("%s: wrote %s", name, graph_path)
+    return {
+        "repo": name,
+        "status": "done",
+        "nodes": graph.number_of_nodes(),
+        "nla_tasks": scheduler.granted[name],
+        "wall_s": round(time.perf_counter() - start, 3),
+        "graph_path": graph_path,
+    }
+
+async def run_batch(entries: list, args):
+    """
+    Annotates the repositories of a manifest in one process. Graphs of up to
+    `args.repo_concurrency` repositories are built at once, and the nodes of
+    all of them go through one pool of `args.workers` NLA slots shared fairly
+    between the repositories, calling one service LLM client so that a single
+    rate limiter sees the whole quota. Every repository's outputs are written
+    as soon as it is done, and a failing repository does not stop the others.
+
+    Returns:
+    One result dict per manifest entry, in manifest order.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    args.service_llm, args.service_llm_gen_configs = setup_service_llm(args)
+    scheduler = FairScheduler(args.workers)
+    build_semaphore = asyncio.Semaphore(max(1, args.repo_concurrency))
+
+    async def __run(entry):
+        try:
+            return await _annotate_repo(entry, args, scheduler, build_semaphore)
+        except Exception as exc:
+            logger.exception("%s failed", entry["name"])
+            return {"repo": entry["name"], "status": "failed", "error": f"{type(exc).__name__}: {exc}"}
+
+    results = await asyncio.gather(*[__run(entry) for entry in entries])
+    if hasattr(args.service_llm, "stats"):
+        logger.info("Service LLM: %s", args.service_llm.stats())
+    return results
+
+def build_parser():
+    parser = build_pipeline_parser(single_repo=False)
+    parser.description = "Annotates every repository of a manifest with one shared service LLM client and worker pool"
+    parser.add_argument("--manifest", type=str, required=True,
+                        help="JSON lines file with one {\"repo\": ..., \"ref\": ..., \"name\": ...} object per repository")
+    parser.add_argument("--output-dir", type=str, default="batch_outputs",
+                        help="Directory the NLA graphs (and indexes) of the repositories are written to")
+    parser.add_argument("--repo-concurrency", type=int, default=2,
+                        help="Number of repositories cloned, parsed and built at once")
+    return parser
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = update_args(parser, parser.parse_args())
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    telemetry.configure(args.metrics_jsonl_path)
+    try:
+        results = asyncio.run(run_batch(load_manifest(args.manifest), args))
+    finally:
+        telemetry.finish(args.metrics_prom_path)
+
+    print(f"{'repo':<24}{'status':>8}{'nodes':>8}{'nla tasks':>11}{'wall (s)':>10}")
+    for result in results:
+        print(f"{result['repo']:<24}{result['status']:>8}{result.get('nodes', 0):>8}"
+              f"{result.get('nla_tasks', 0):>11}{result.get('wall_s', 0.0):>10.3f}")
+    if any(result["status"] != "done" for result in results):
+        raise SystemExit(1)
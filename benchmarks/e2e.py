@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import yaml
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import contextlib
+
+from src.pipeline.parser_py import parse_repo
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.nla_generator_py import generate_nla
+from src.pipeline.retreival_py import retrieve
+from src.pipeline.index import build_index, candidate_nodes
+from src.pipeline.utils import setup_service_llm
+
+_QUERIES = ["how to send a request", "where is the graph built", "parse a config value"]
+
+def generate_synthetic_repo(path: str, num_modules: int, depth: int, branching: int = 3,
+                            classes_per_module: int = 3, methods_per_class: int = 4, functions_per_module: int = 4,
+                            seed: int = 0):
+    """
+    Writes a synthetic Python package to `path`. Subpackages are nested `depth`
+    levels deep with `branching` subpackages each, and the `num_modules`
+    modules are spread over all of them.
+
+    Returns:
+    The path to the root package.
+    """
+    rng = random.Random(seed)
+    root = os.path.join(path, "synthpkg")
+    packages = [root]
+    frontier = [root]
+    for _ in range(depth):
+        frontier = [os.path.join(package, f"sub{idx}") for package in frontier for idx in range(branching)]
+        packages.extend(frontier)
+
+    for package in packages:
+        os.makedirs(package, exist_ok=True)
+        with open(os.path.join(package, "__init__.py"), "w") as file:
+            file.write('"""Synthetic package."""\n')
+
+    verbs = ["send", "parse", "build", "load", "merge", "render", "resolve", "encode"]
+    nouns = ["request", "graph", "config", "token", "node", "buffer", "session", "index"]
+    for module_idx in range(num_modules):
+        lines = ["import os", "import json", ""]
+        for class_idx in range(classes_per_module):
+            lines.append(f"class {rng.choice(nouns).title()}{class_idx}:")
+            lines.append(f'    """Handles the {rng.choice(nouns)} of the {rng.choice(nouns)}."""')
+            for method_idx in range(methods_per_class):
+                lines.append(f"    def {rng.choice(verbs)}_{rng.choice(nouns)}_{method_idx}(self, value):")
+                lines.append(f"        result = json.dumps({{'value': value, 'step': {method_idx}}})")
+                lines.append("        return os.path.join(str(value), result)")
+                lines.append("")
+        for function_idx in range(functions_per_module):
+            lines.append(f"def {rng.choice(verbs)}_{rng.choice(nouns)}_{function_idx}(value, *args):")
+            lines.append(f'    """{rng.choice(verbs).title()}s a {rng.choice(nouns)}."""')
+            lines.append("    return [value, *args]")
+            lines.append("")
+        with open(os.path.join(packages[module_idx % len(packages)], f"mod{module_idx}.py"), "w") as file:
+            file.write("\n".join(lines))
+
+    return root
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux, children cover the parse pool
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(self_rss, children_rss) / 1024
+
+def _llm_calls(client):
+    # unwrap the rate limited client to count the calls of the fake provider
+    return getattr(client, "client", client).calls
+
+def _llm_args(args, workspace, gen_config_path):
+    return argparse.Namespace(
+        service_llm_provider="fake",
+        service_llm_model="fake",
+        service_llm_api_key=None,
+        gcp_project_id=None,
+        gcp_location=None,
+        aws_location=None,
+        service_llm_gen_config_path=gen_config_path,
+        fake_llm_config_path=args.fake_llm_config_path,
+        rate_limit_config_path=args.rate_limit_config_path,
+        workers=args.workers,
+        traverse_priority=args.traverse_priority,
+        nla_batch_size=args.nla_batch_size,
+        nla_batch_gen_config_path="configs/nla_batch_gpt_gen_configs.yaml",
+        nla_batch_max_tokens=4000,
+        nla_prompt_token_budget=8000,
+        nla_cache_path=os.path.join(workspace, "nla_cache.sqlite"),
+        nla_cache_max_size_mb=1024,
+        disable_nla_cache=True,
+        checkpoint_dir=None,
+        resume=False,
+        save_graph_animation=False,
+        graph_imgs_path=os.path.join(workspace, "graph_imgs"),
+        graph_animation_duration_per_step=1.0,
+    )
+
+async def _run(args, workspace):
+    stages = []
+
+    def __record(stage, start, llm_calls=0):
+        stages.append({
+            "stage": stage,
+            "wall_s": round(time.perf_counter() - start, 4),
+            "llm_calls": llm_calls,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        })
+
+    repo_path = generate_synthetic_repo(
+        os.path.join(workspace, "repo"), args.modules, args.depth, args.branching, seed=args.seed
+    )
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        path = parse_repo(repo_path)
+        __record("parse_repo", start)
+
+        start = time.perf_counter()
+        root_node, graph = build_graph(path, draw_graph=False, parse_workers=args.parse_workers)
+        __record("build_graph", start)
+
+        start = time.perf_counter()
+        nla_args = _llm_args(args, workspace, "configs/gpt_gen_configs.yaml")
+        graph = await generate_nla(graph, root_node, nla_args)
+        __record("generate_nla", start, _llm_calls(nla_args.service_llm))
+
+        start = time.perf_counter()
+        client, gen_configs = setup_service_llm(_llm_args(args, workspace, "configs/retrieval_gpt_gen_configs.yaml"))
+        index = build_index(graph)
+        for query in _QUERIES:
+            candidates = candidate_nodes(graph, index, query, top_k=50)
+            await retrieve(graph, query, client, "fake", gen_configs, root_node=root_node,
+                           workers=args.workers, candidates=candidates)
+        __record("retrieval", start, _llm_calls(client))
+
+    return graph.number_of_nodes(), stages
+
+def _check_regressions(stages, baseline_path, max_regression):
+    with open(baseline_path, "r") as file:
+        baseline = {stage["stage"]: stage for stage in json.load(file)["stages"]}
+
+    regressions = []
+    for stage in stages:
+        previous = baseline.get(stage["stage"])
+        if previous and stage["wall_s"] > previous["wall_s"] * (1 + max_regression):
+            regressions.append(f"{stage['stage']}: {previous['wall_s']:.3f}s -> {stage['wall_s']:.3f}s")
+        if previous and stage["llm_calls"] > previous["llm_calls"]:
+            regressions.append(f"{stage['stage']}: {previous['llm_calls']} -> {stage['llm_calls']} LLM calls")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measures the whole pipeline on a synthetic repository with the offline fake provider")
+    parser.add_argument("--modules", type=int, default=200, help="Number of modules of the synthetic repository")
+    parser.add_argument("--depth", type=int, default=3, help="Nesting depth of the subpackages")
+    parser.add_argument("--branching", type=int, default=3, help="Number of subpackages of every package")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--workers", type=int, default=10, help="Number of workers to process the graph")
+    parser.add_argument("--traverse-priority", type=str, default="fifo", choices=["fifo", "critical-path"])
+    parser.add_argument("--nla-batch-size", type=int, default=1)
+    parser.add_argument("--fake-llm-config-path", type=str, default="configs/fake_llm.yaml")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Overrides the latency of the fake provider")
+    parser.add_argument("--rate-limit-config-path", type=str, default="configs/rate_limits.yaml")
+    parser.add_argument("--output-path", type=str, default=None, help="Path to save the results as JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="Results of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Tolerated relative slowdown of a stage before the run fails")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as workspace:
+        if args.latency_ms is not None:
+            with open(args.fake_llm_config_path, "r") as file:
+                fake_configs = yaml.safe_load(file) or {}
+            fake_configs["latency_ms"] = args.latency_ms
+            args.fake_llm_config_path = os.path.join(workspace, "fake_llm.yaml")
+            with open(args.fake_llm_config_path, "w") as file:
+                yaml.safe_dump(fake_configs, file)
+
+        num_nodes, stages = asyncio.run(_run(args, workspace))
+
+    print(f"modules={args.modules} depth={args.depth} nodes={num_nodes}")
+    print(f"{'stage':<14}{'wall (s)':>10}{'llm calls':>11}{'peak rss (MB)':>15}")
+    for stage in stages:
+        print(f"{stage['stage']:<14}{stage['wall_s']:>10.3f}{stage['llm_calls']:>11}{stage['peak_rss_mb']:>15.1f}")
+    print(f"{'total':<14}{sum(stage['wall_s'] for stage in stages):>10.3f}{sum(stage['llm_calls'] for stage in stages):>11}")
+
+    if args.output_path:
+        with open(args.output_path, "w") as file:
+            json.dump({"modules": args.modules, "depth": args.depth, "nodes": num_nodes, "stages": stages}, file, indent=2)
+
+    if args.baseline:
+        regressions = _check_regressions(stages, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+import argparse
+import contextlib
+import networkx as nx
+
+from src.pipeline.nla_generator_py import _dynamic_traverse
+
+class _StubLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_text(self, model, prompt, **kwargs):
+        self.calls += 1
+        return "stub annotation"
+
+def _synthetic_tree(num_nodes: int, branching: int):
+    """
+    Builds a package-like tree with `num_nodes` nodes where every internal node
+    has up to `branching` children. Node names are dotted paths like the ones
+    produced by `build_graph`.
+    """
+    graph = nx.DiGraph()
+    graph.add_node("pkg")
+    frontier = ["pkg"]
+    next_frontier = []
+    count = 1
+
+    while count < num_nodes:
+        for parent in frontier:
+            for idx in range(branching):
+                if count >= num_nodes:
+                    break
+                child = f"{parent}.n{idx}"
+                graph.add_edge(parent, child)
+                next_frontier.append(child)
+                count += 1
+        frontier, next_frontier = next_frontier, []
+
+    return graph
+
+async def _run(num_nodes: int, args):
+    graph = _synthetic_tree(num_nodes, args.branching)
+    client = _StubLLM()
+    traverse_args = argparse.Namespace(
+        workers=args.workers,
+        traverse_priority=args.traverse_priority,
+        service_llm=client,
+        service_llm_model="stub",
+        service_llm_gen_configs={},
+        save_graph_animation=False,
+        graph_imgs_path=args.graph_imgs_path,
+        nla_cache=None,
+        checkpoint=None,
+        nla_batch_size=1,
+        nla_batch_max_tokens=4000,
+        nla_prompt_token_budget=None,
+    )
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        await _dynamic_traverse(graph, "pkg", traverse_args)
+    elapsed = time.perf_counter() - start
+
+    print(f"nodes={graph.number_of_nodes():>7} llm_calls={client.calls:>7} "
+          f"elapsed={elapsed:8.3f}s per_node={elapsed / graph.number_of_nodes() * 1e6:8.2f}us")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measures NLA traversal overhead with the service LLM stubbed out")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Number of nodes of each synthetic graph")
+    parser.add_argument("--branching", type=int, default=8, help="Number of children of every internal node")
+    parser.add_argument("--workers", type=int, default=10, help="Number of workers to process the graph")
+    parser.add_argument("--traverse-priority", type=str, default="fifo", choices=["fifo", "critical-path"])
+    parser.add_argument("--graph-imgs-path", type=str, default="graph_imgs", help="Path to save the graph images")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    for size in args.sizes:
+        asyncio.run(_run(size, args))
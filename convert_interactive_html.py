@@ -1,125 +1,438 @@
 import os
-import yaml
+import json
+import glob
+import math
+import logging
+import toml
 import asyncio
-import argparse
 import networkx as nx
+import argparse
+from string import Template
 from pyvis.network import Network
 
-from genai_apis import APIFactory
-from src.pipeline.utils import create_pydantic_class_from_yaml
+from src.pipeline.utils import setup_service_llm, load_gen_configs, resolve_gen_config_path, parse_structured_output
+from src.pipeline.cache import RelevanceCache
+from src.pipeline.source_reader import has_source, get_source
+from src.pipeline.snapshot import read_graph
+from src.pipeline.index import NLAIndex, candidate_nodes, index_path_for, load_embedder
+from src.pipeline.symbols import CONTAINS, containment_view
+from src.pipeline.utils import find_root
 
 from utils import update_args
 
-def _setup_service_llm(args):
-    service_llm_kwargs = {
-        "api_key": args.service_llm_api_key,
-        "GCP_PROJECT_ID": args.gcp_project_id,
-        "GCP_PROJECT_LOCATION": args.gcp_location,
-        "AWS_REGION": args.aws_location,
-    }
-
-    with open(args.service_llm_gen_config_path, 'r') as file:
-        service_llm_gen_configs = yaml.safe_load(file)
-
-    if args.service_llm_provider == "openai":
-        if "schema" in service_llm_gen_configs:
-            service_llm_gen_configs["response_format"] = create_pydantic_class_from_yaml(service_llm_gen_configs["schema"])
-            del service_llm_gen_configs["schema"]
-    elif args.service_llm_provider == "gemini":
-        if "schema" in service_llm_gen_configs:
-            service_llm_gen_configs["response_schema"] = service_llm_gen_configs["schema"]
-            del service_llm_gen_configs["schema"]
-    elif args.service_llm_provider == "anthropic":
-        if "schema" in service_llm_gen_configs:
-            service_llm_gen_configs["tool_choice"] = service_llm_gen_configs["schema"]["tool_choice"]
-            service_llm_gen_configs["tools"] = service_llm_gen_configs["schema"]["tools"]
-            del service_llm_gen_configs["schema"]
-
-    service_llm_client = APIFactory.get_api_client(args.service_llm_provider, **service_llm_kwargs)
-    return (service_llm_client, service_llm_gen_configs)
+logger = logging.getLogger(__name__)
+
+prompt_tmpls = toml.load("configs/prompts.toml")
+
+# generation configs of batched relevance requests, with the `verdicts` schema in the form of each provider
+_BATCH_GEN_CONFIG_PATHS = {
+    "openai": "configs/graph_creation_batch_gpt_gen_configs.yaml",
+    "gemini": "configs/graph_creation_batch_gemini_gen_configs.yaml",
+    "anthropic": "configs/graph_creation_batch_anthropic_gen_configs.yaml",
+    "fake": "configs/graph_creation_batch_gpt_gen_configs.yaml",
+}
+
+# node attributes the side panel shows, which the scalable export keeps out of the page
+_DETAIL_KEYS = ("nla", "source", "relevance")
+
+# the side panel reads the details of a node from its attributes
+_INLINE_JS = """
+            function toggleNode(nodeId) {}
+
+            function loadDetails(nodeId, callback) {
+                callback(nodes.get(nodeId));
+            }
+"""
+
+# the side panel loads the details of a node from its chunk of the sidecar,
+# and clicking a subpackage expands or collapses it
+_SCALABLE_JS = """
+            var detailsDir = $details_dir;
+            var childrenOf = $children;
+            var expanded = new Set($expanded);
+            var loadedChunks = {};
+            var pendingChunks = {};
+
+            window.layerlensDetails = function (chunk, details) {
+                loadedChunks[chunk] = details;
+                (pendingChunks[chunk] || []).forEach(function (done) { done(); });
+                delete pendingChunks[chunk];
+            };
+
+            function loadDetails(nodeId, callback) {
+                var chunk = nodes.get(nodeId).chunk;
+                if (chunk === undefined) {
+                    callback({});
+                    return;
+                }
+                var done = function () { callback(loadedChunks[chunk][nodeId] || {}); };
+                if (loadedChunks[chunk]) {
+                    done();
+                } else if (pendingChunks[chunk]) {
+                    pendingChunks[chunk].push(done);
+                } else {
+                    pendingChunks[chunk] = [done];
+                    var script = document.createElement("script");
+                    script.src = detailsDir + "/chunk_" + String(chunk).padStart(5, "0") + ".js";
+                    document.head.appendChild(script);
+                }
+            }
+
+            function showChildren(nodeId, updates) {
+                (childrenOf[nodeId] || []).forEach(function (child) {
+                    updates.push({id: child, hidden: false});
+                    if (nodes.get(child).type !== "subpackage" || expanded.has(child)) {
+                        showChildren(child, updates);
+                    }
+                });
+            }
+
+            function hideChildren(nodeId, updates) {
+                (childrenOf[nodeId] || []).forEach(function (child) {
+                    updates.push({id: child, hidden: true});
+                    expanded.delete(child);
+                    hideChildren(child, updates);
+                });
+            }
+
+            function toggleNode(nodeId) {
+                if (nodes.get(nodeId).type !== "subpackage" || !childrenOf[nodeId]) {
+                    return;
+                }
+                var updates = [];
+                if (expanded.has(nodeId)) {
+                    expanded.delete(nodeId);
+                    hideChildren(nodeId, updates);
+                } else {
+                    expanded.add(nodeId);
+                    showChildren(nodeId, updates);
+                }
+                nodes.update(updates);
+            }
+"""
+
+async def _score_node(node, nla, args, client, gen_configs):
+    prompt = Template(prompt_tmpls["relevance"]["single_prompt"]).safe_substitute(query=args.prompt, context=nla)
+    relevance = parse_structured_output(
+        await client.generate_text(args.service_llm_model, prompt=prompt, **gen_configs)
+    )
+    return {node: (bool(relevance.get("relevance")), relevance.get("reason", ""))}
+
+async def _score_batch(batch, args, client, batch_gen_configs):
+    """
+    Scores several nodes with a single structured-output request. Returns the
+    verdicts of the nodes the response covers.
+    """
+    contexts = "".join(
+        Template(prompt_tmpls["relevance"]["batch_item"]).safe_substitute(node=node, context=nla)
+        for node, nla in batch
+    )
+    prompt = Template(prompt_tmpls["relevance"]["batch_prompt"]).safe_substitute(query=args.prompt, contexts=contexts)
+    response = parse_structured_output(
+        await client.generate_text(args.service_llm_model, prompt=prompt, **batch_gen_configs)
+    )
+
+    batch_nodes = {node for node, _ in batch}
+    verdicts = {}
+    for verdict in response.get("verdicts", response.get("items", [])):
+        if isinstance(verdict, dict) and verdict.get("node") in batch_nodes:
+            verdicts[verdict["node"]] = (bool(verdict.get("relevance")), verdict.get("reason", ""))
+    return verdicts
+
+async def _score_nodes(nodes, args, client, gen_configs, batch_gen_configs):
+    """
+    Scores the (node, nla) pairs with at most `args.workers` requests in flight.
+    With `args.batch_size` > 1, nodes are packed into batch requests; nodes a
+    batch response does not cover, or whose batch request failed, are scored
+    again one by one.
+    """
+    semaphore = asyncio.Semaphore(args.workers)
+
+    async def __single(node, nla):
+        async with semaphore:
+            return await _score_node(node, nla, args, client, gen_configs)
+
+    async def __batch(batch):
+        async with semaphore:
+            try:
+                verdicts = await _score_batch(batch, args, client, batch_gen_configs)
+            except Exception:
+                # e.g. a provider rejecting the structured output schema
+                logger.warning("batched relevance request of %d nodes failed, scoring them one by one", len(batch), exc_info=True)
+                verdicts = {}
+        missing = [(node, nla) for node, nla in batch if node not in verdicts]
+        for result in await asyncio.gather(*[__single(node, nla) for node, nla in missing]):
+            verdicts.update(result)
+        return verdicts
+
+    if args.batch_size > 1:
+        batches = [nodes[idx:idx + args.batch_size] for idx in range(0, len(nodes), args.batch_size)]
+        results = await asyncio.gather(*[__batch(batch) for batch in batches])
+    else:
+        results = await asyncio.gather(*[__single(node, nla) for node, nla in nodes])
+
+    verdicts = {}
+    for result in results:
+        verdicts.update(result)
+    return verdicts
+
+async def _score_nodes_cached(nodes, args, client, gen_configs, batch_gen_configs, cache=None):
+    """
+    Scores the (node, nla) pairs like `_score_nodes`, serving the verdicts of
+    nodes already scored for the same query, NLA, model and config from
+    `cache` and storing the new ones in it.
+
+    Returns:
+    The verdicts, and the set of nodes whose verdicts came from the cache.
+    """
+    if cache is None:
+        return await _score_nodes(nodes, args, client, gen_configs, batch_gen_configs), set()
+
+    # batched and single requests ask for the same verdict, the config of the single ones is part of the key
+    configs = [gen_configs, prompt_tmpls["relevance"]]
+    keys = {node: cache.make_key(args.prompt, nla, args.service_llm_model, configs) for node, nla in nodes}
+
+    verdicts = {}
+    for node, _ in nodes:
+        verdict = cache.get_verdict(keys[node])
+        if verdict is not None:
+            verdicts[node] = verdict
+    cached_nodes = set(verdicts)
+
+    scored = await _score_nodes(
+        [(node, nla) for node, nla in nodes if node not in cached_nodes], args, client, gen_configs, batch_gen_configs
+    )
+    for node, (relevance, reason) in scored.items():
+        cache.put_verdict(keys[node], relevance, reason)
+    verdicts.update(scored)
+    return verdicts, cached_nodes
+
+def _propagate_relevance(G, relevant_nodes):
+    """
+    Returns the relevant nodes together with all of their ancestors, so that the
+    path from the root to every relevant node is highlighted. Every node is
+    visited at most once.
+    """
+    highlighted_nodes = set(relevant_nodes)
+    stack = list(relevant_nodes)
+    while stack:
+        for parent in G.predecessors(stack.pop()):
+            if parent not in highlighted_nodes:
+                highlighted_nodes.add(parent)
+                stack.append(parent)
+    return highlighted_nodes
+
+def _radial_layout(tree, root, ring_gap: float = 300.0, leaf_spacing: float = 40.0):
+    """
+    Places the nodes of the containment tree on rings around the root, one
+    ring per depth, every subtree within a wedge proportional to its number of
+    leaves. Linear in the number of nodes, unlike a force-directed layout, and
+    the rings widen so that the leaves on the outermost one stay about
+    `leaf_spacing` apart.
+
+    Returns:
+    A dict of node -> (x, y).
+    """
+    leaves = {}
+    for node in nx.dfs_postorder_nodes(tree, root):
+        leaves[node] = sum(leaves.get(child, 0) for child in tree.successors(node)) or 1
+    depth = max(nx.single_source_shortest_path_length(tree, root).values())
+    ring_gap = max(ring_gap, leaves[root] * leaf_spacing / (2 * math.pi * max(depth, 1)))
+
+    positions = {root: (0.0, 0.0)}
+    stack = [(root, 0.0, 2 * math.pi, 1)]
+    while stack:
+        node, start, span, depth = stack.pop()
+        for child in sorted(tree.successors(node)):
+            if child in positions:
+                continue
+            child_span = span * leaves[child] / leaves[node]
+            angle = start + child_span / 2
+            positions[child] = (depth * ring_gap * math.cos(angle), depth * ring_gap * math.sin(angle))
+            stack.append((child, start, child_span, depth + 1))
+            start += child_span
+    return positions
+
+def _visible_nodes(tree, root, expanded):
+    """
+    Returns the nodes shown when every subpackage except the ones in
+    `expanded` is collapsed, i.e. the nodes without a collapsed subpackage
+    among their ancestors.
+    """
+    visible = {root}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for child in tree.successors(node):
+            if child in visible:
+                continue
+            visible.add(child)
+            if tree.nodes[child].get("type") != "subpackage" or child in expanded:
+                stack.append(child)
+    return visible
+
+def _write_detail_chunks(details: list, details_dir: str, chunk_size: int):
+    """
+    Writes the (node, details) pairs to `details_dir` in chunks of
+    `chunk_size` nodes. Every chunk is a script calling
+    `layerlensDetails(chunk, {node: details})`, so that the page loads it with
+    a <script> tag, which unlike fetch() also works for pages opened from
+    file://.
+
+    Returns:
+    A dict of node -> chunk number.
+    """
+    os.makedirs(details_dir, exist_ok=True)
+    for stale_path in glob.glob(os.path.join(details_dir, "chunk_*.js")):
+        os.remove(stale_path)
+
+    chunks = {}
+    for chunk, start in enumerate(range(0, len(details), chunk_size)):
+        batch = dict(details[start:start + chunk_size])
+        with open(os.path.join(details_dir, f"chunk_{chunk:05d}.js"), "w") as file:
+            file.write(f"layerlensDetails({chunk}, {json.dumps(batch)});\n")
+        chunks.update((node, chunk) for node in batch)
+    return chunks
 
 async def main(args):
-    service_llm_client, gen_configs = _setup_service_llm(args)
+    service_llm_client, gen_configs = setup_service_llm(args)
+    batch_gen_configs = None
+    if args.batch_size > 1:
+        batch_gen_config_path = resolve_gen_config_path(
+            args.batch_gen_config_path, args.service_llm_provider, _BATCH_GEN_CONFIG_PATHS, "--batch-gen-config-path"
+        )
+        batch_gen_configs = load_gen_configs(batch_gen_config_path, args.service_llm_provider)
+
+    G = read_graph(args.graph_path)
+    tree = containment_view(G)
 
-    G = nx.read_graphml(args.graph_path)
-    output_path = os.path.basename(args.graph_path.split(".")[0]) + "-pyvis.html"
+    # narrow the query down with the local index before any LLM call
+    candidates = None
+    index_path = args.index_path or index_path_for(args.graph_path)
+    if args.index_top_k > 0 and os.path.exists(index_path):
+        index = NLAIndex.load(index_path, embedder=load_embedder(args.index_embedder))
+        candidates = candidate_nodes(G, index, args.prompt, top_k=args.index_top_k)
+    output_path = args.output_path or os.path.basename(args.graph_path.split(".")[0]) + "-pyvis.html"
 
     net = Network(
         height="100vh", width="100vw", 
         notebook=False, 
-        bgcolor="#ffffff", font_color="black" #, select_menu=True#, filter_menu=True
+        bgcolor="#ffffff", font_color="black", #, select_menu=True#, filter_menu=True
+        # load vis.js from the CDN so that the HTML is self-contained when it is served
+        cdn_resources="remote",
     )
 
-    net.options.layout = {
-        'physics': {
-            'enabled': True,
-            'solver': 'forceAtlas2Based',
-            'forceAtlas2Based': {
-                'gravitationalConstant': 50,
-                'centralGravity': 0.0001,
-                'springLength': 1000,
-                'springConstant': 0.1,
-                'damping': 0.001,
-                'avoidOverlap': 19
+    scalable = args.export_mode == "scalable"
+    if scalable:
+        # the positions are computed here, the browser only has to draw them
+        net.toggle_physics(False)
+        net.options.edges.smooth.enabled = False
+        net.options.interaction.hideEdgesOnDrag = True
+    else:
+        net.options.layout = {
+            'physics': {
+                'enabled': True,
+                'solver': 'forceAtlas2Based',
+                'forceAtlas2Based': {
+                    'gravitationalConstant': 50,
+                    'centralGravity': 0.0001,
+                    'springLength': 1000,
+                    'springConstant': 0.1,
+                    'damping': 0.001,
+                    'avoidOverlap': 19
+                }
             }
         }
-    }
 
-    relevant_nodes = set()
-    reasons = []
+    # Score the annotated nodes concurrently, optionally packing several of them per request
+    nodes_to_score = [
+        (node, data["nla"]) for node, data in G.nodes(data=True)
+        if tree.out_degree(node) > 0 and "nla" in data and (candidates is None or node in candidates)
+    ]
+    relevance_cache = None
+    if not args.disable_relevance_cache:
+        relevance_cache = RelevanceCache(
+            args.relevance_cache_path, max_size_mb=args.relevance_cache_max_size_mb,
+            ttl_s=args.relevance_cache_ttl_hours * 3600 or None,
+        )
+    try:
+        verdicts, cached_nodes = await _score_nodes_cached(
+            nodes_to_score, args, service_llm_client, gen_configs, batch_gen_configs, cache=relevance_cache
+        )
+    finally:
+        if relevance_cache is not None:
+            logger.info("Relevance cache: %s", relevance_cache.stats())
+            relevance_cache.close()
+
+    relevant_nodes = {node for node, (relevance, _) in verdicts.items() if relevance}
+    reasons = [verdicts[node][1] for node, _ in nodes_to_score if node in relevant_nodes]
+    highlighted_nodes = _propagate_relevance(tree, relevant_nodes)
+
+    node_attrs = {}
+    for node, data in G.nodes(data=True):
+        node_attrs[node] = {k: v for k, v in data.items() if k not in ["label"]}
+        if has_source(G, node):
+            node_attrs[node]["source"] = get_source(G, node, args.repo_path)
+        if node in relevant_nodes:
+            node_attrs[node]["relevance"] = {"reason": verdicts[node][1], "cached": node in cached_nodes}
+
+    node_order = list(G.nodes)
+    children, expanded, details_dir = {}, [], None
+    if scalable:
+        root = find_root(G)
+        positions = _radial_layout(tree, root)
+        # subpackages start collapsed, except the ones on the path to a relevant node
+        expanded = sorted(node for node in highlighted_nodes if G.nodes[node].get("type") == "subpackage")
+        visible = _visible_nodes(tree, root, set(expanded))
+        children = {node: list(tree.successors(node)) for node in G.nodes if tree.out_degree(node) > 0}
+
+        # in preorder, the details of a subtree end up in a few neighbouring chunks
+        node_order = list(dict.fromkeys([*nx.dfs_preorder_nodes(tree, root), *G.nodes]))
+        details_dir = os.path.splitext(output_path)[0] + "_details"
+        details = [
+            (node, {key: node_attrs[node][key] for key in _DETAIL_KEYS if key in node_attrs[node]})
+            for node in node_order
+        ]
+        chunks = _write_detail_chunks([item for item in details if item[1]], details_dir, args.detail_chunk_size)
+        for node in node_order:
+            x, y = positions.get(node, (0.0, 0.0))
+            node_attrs[node] = {"x": x, "y": y, "hidden": node not in visible, "type": G.nodes[node].get("type")}
+            if node in chunks:
+                node_attrs[node]["chunk"] = chunks[node]
 
     # Add nodes with conditions
-    for idx, (node, data) in enumerate(G.nodes(data=True)):
-        node_attrs = {k: v for k, v in data.items() if k not in ["label"]}
+    for node in node_order:
         size = 20
         color = "gray"
 
-        out_neighbors = list(G.successors(node))
-
-        if len(out_neighbors) > 0 and "nla" in data:
-            prompt = f"""Given the following context, determine if the following query is relevant:
-            Query: {args.prompt}
-            Context: {data["nla"]}
-            """
-
-            relevance = await service_llm_client.generate_text(
-                args.service_llm_model, prompt=prompt, **gen_configs
-            )
-
-            if relevance.relevance:
-                size = 50
-                color = "red"
-                relevant_nodes.add(node)  # Keep track of relevant nodes
-                node_attrs["relevance"] = {"reason": relevance.reason}
-                reasons.append(relevance.reason)
-                G.nodes[node]["relevance"] = relevance
+        if node in highlighted_nodes:
+            size = 50
+            color = "red"
 
         net.add_node(
             node,
             label=node.split(".")[-1],
             title=node,
             labelHighlightBold=True,
-            physics=True,
+            physics=not scalable,
             size=size,
             color=color,
             borderWidth=2,
-            **node_attrs
+            **node_attrs[node]
         )
 
-    for node in net.nodes:
-        successors = list(G.successors(node["id"]))
-        if any(element in list(relevant_nodes) for element in successors):
-            node["color"] = "red"  # Highlight connected node
-            node["size"] = 50  # Increase size for visibility
-            relevant_nodes.add(node["id"])
-
     # Add edges with conditions
-    for idx, (source, target) in enumerate(G.edges()):
+    for idx, (source, target, edge_type) in enumerate(G.edges(data="type", default=CONTAINS)):
+        if edge_type != CONTAINS:
+            # imports, inheritance and calls are drawn as thin dashed edges
+            net.add_edge(source, target, color="#9db4c0", width=1, dashes=True, title=edge_type)
+            continue
+
         edge_color = "black"  # Default color
         width = 1  # Default width
 
         # Check if source or target node is relevant
-        if source in relevant_nodes and target in relevant_nodes:
+        if source in highlighted_nodes and target in highlighted_nodes:
             edge_color = "red"  # Highlight edges connected to relevant nodes
             width = 10  # Make highlighted edges thicker
 
@@ -136,7 +449,16 @@ async def main(args):
         html_content = file.read()
 
     reasons = "\n\n".join(reasons)
-    print(reasons)
+    logger.debug(reasons)
+
+    if scalable:
+        details_js = Template(_SCALABLE_JS).safe_substitute(
+            details_dir=json.dumps(os.path.basename(details_dir)),
+            children=json.dumps(children).replace("</", "<\\/"),
+            expanded=json.dumps(expanded).replace("</", "<\\/"),
+        )
+    else:
+        details_js = _INLINE_JS
 
     custom_js = f"""
     <script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
@@ -171,56 +493,62 @@ async def main(args):
                 }}
             }}
     
+            {details_js}
+
             // Listen for node and background clicks
             network.on("click", function (params) {{
                 if (params.nodes.length > 0) {{
                     // A node was clicked
                     var nodeId = params.nodes[0];
-                    var node = nodes.get(nodeId);
+                    toggleNode(nodeId);
+                    loadDetails(nodeId, function (node) {{
+                        // Markdown content
+                        var markdownContent = ""; // Default content
+
+                        if (node.relevance) {{
+                            markdownContent += "## Relevance to prompt";
+                            markdownContent += "\\n\\nReason: " + node.relevance.reason + "\\n\\n";
+                            if (node.relevance.cached) {{
+                                markdownContent += "*Verdict from the relevance cache*\\n\\n";
+                            }}
+                        }}
+
+                        if (node.nla) {{
+                            markdownContent += "### LLM generated annotations\\n\\n" + node.nla;
+                        }} else if (node.source) {{
+                            markdownContent += "### Raw source\\n\\n" + node.source;
+                        }} else {{
+                            markdownContent += "### No message available for this node.";
+                        }}
     
-                    // Markdown content
-                    var markdownContent = ""; // Default content
-
-                    if (node.relevance) {{
-                        markdownContent += "## Relevance to prompt";
-                        markdownContent += "\\n\\nReason: " + node.relevance.reason + "\\n\\n";
-                    }}
-
-                    if (node.nla) {{
-                        markdownContent += "### LLM generated annotations\\n\\n" + node.nla;
-                    }} else if (node.source) {{
-                        markdownContent += "### Raw source\\n\\n" + node.source;
-                    }} else {{
-                        markdownContent += "### No message available for this node.";
-                    }}
+                        // Check if side panel exists, otherwise create it
+                        var sidePanel = document.getElementById("side-panel");
+                        if (!sidePanel) {{
+                            sidePanel = document.createElement("div");
+                            sidePanel.id = "side-panel";
+                            sidePanel.style.position = "fixed";
+                            sidePanel.style.top = "50px";
+                            sidePanel.style.right = "0";
+                            sidePanel.style.width = "40%";
+                            sidePanel.style.height = "100%";
+                            sidePanel.style.backgroundColor = "#fff";
+                            sidePanel.style.borderLeft = "1px solid #ccc";
+                            sidePanel.style.boxShadow = "0 4px 8px rgba(0, 0, 0, 0.3)";
+                            sidePanel.style.overflowY = "auto";
+                            sidePanel.style.padding = "20px";
+                            sidePanel.style.zIndex = 1000;
+                            sidePanel.style.paddingBottom = "100px";
+                            document.body.appendChild(sidePanel);
+                        }}
     
-                    // Check if side panel exists, otherwise create it
-                    var sidePanel = document.getElementById("side-panel");
-                    if (!sidePanel) {{
-                        sidePanel = document.createElement("div");
-                        sidePanel.id = "side-panel";
-                        sidePanel.style.position = "fixed";
-                        sidePanel.style.top = "50px";
-                        sidePanel.style.right = "0";
-                        sidePanel.style.width = "40%";
-                        sidePanel.style.height = "100%";
-                        sidePanel.style.backgroundColor = "#fff";
-                        sidePanel.style.borderLeft = "1px solid #ccc";
-                        sidePanel.style.boxShadow = "0 4px 8px rgba(0, 0, 0, 0.3)";
-                        sidePanel.style.overflowY = "auto";
-                        sidePanel.style.padding = "20px";
-                        sidePanel.style.zIndex = 1000;
-                        sidePanel.style.paddingBottom = "100px";
-                        document.body.appendChild(sidePanel);
-                    }}
+                        // Populate side panel with content
+                        sidePanel.innerHTML = `
+                            <div>${{marked.parse(markdownContent)}}</div>
+                        `;
     
-                    // Populate side panel with content
-                    sidePanel.innerHTML = `
-                        <div>${{marked.parse(markdownContent)}}</div>
-                    `;
-    
-                    // Display the side panel
-                    sidePanel.style.display = "block";
+                        // Display the side panel
+                        sidePanel.style.display = "block";
+                    }});
                 }} else {{
                     // Background clicked, close the side panel
                     closeSidePanel();
@@ -243,10 +571,39 @@ async def main(args):
         file.write(html_content)
 
 
-def parse_args():
+def build_parser():
     parser = argparse.ArgumentParser(description="HIERA: Hierarchical Information Extraction and Retrieval Augmentation")
     parser.add_argument("--graph-path", type=str, default="requests_nla.graphml", help="Path to the graph file")
     parser.add_argument("--prompt", type=str, default="how to send HTTP request?", help="text prompt query to ask")
+    parser.add_argument("--output-path", type=str, default=None,
+                        help="Path of the HTML output. Defaults to <graph name>-pyvis.html in the working directory")
+    parser.add_argument("--repo-path", type=str, default=None,
+                        help="Path to the repository checkout the graph was built from. Defaults to the path recorded in the graph")
+    parser.add_argument("--index-path", type=str, default=None,
+                        help="Path to the local NLA index. Defaults to the index saved next to the graph")
+    parser.add_argument("--index-top-k", type=int, default=50,
+                        help="Number of index matches to pre-select before any LLM call. 0 disables the index")
+    parser.add_argument("--index-embedder", type=str, default="none", help="Dense embedder the index was built with")
+    parser.add_argument("--export-mode", type=str, default="inline", choices=["inline", "scalable"],
+                        help="inline embeds every node's attributes and lays the graph out in the browser. scalable "
+                        "precomputes the layout, starts with the subpackages collapsed and loads node details lazily "
+                        "from a <output name>_details/ directory next to the HTML, for graphs with thousands of nodes")
+    parser.add_argument("--detail-chunk-size", type=int, default=500,
+                        help="Number of nodes per details file of the scalable export")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of concurrent relevance requests")
+    parser.add_argument("--relevance-cache-path", type=str, default=".layerlens_cache/nla_cache.sqlite",
+                        help="Path to the persistent cache of relevance verdicts")
+    parser.add_argument("--relevance-cache-max-size-mb", type=float, default=64,
+                        help="Size cap of the relevance cache. Least recently used entries are evicted first")
+    parser.add_argument("--relevance-cache-ttl-hours", type=float, default=168,
+                        help="Age after which cached relevance verdicts are scored again. 0 keeps them until evicted")
+    parser.add_argument("--disable-relevance-cache", action="store_true", default=False,
+                        help="Always score every node with the service LLM")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Number of node contexts packed into one relevance request. 1 scores every node separately")
+    parser.add_argument("--batch-gen-config-path", type=str, default=None,
+                        help="Generation config used for batched relevance requests. "
+                        "Defaults to the configs/graph_creation_batch_*_gen_configs.yaml of the provider")
 
     parser.add_argument("--service-llm-provider", type=str, default="gemini",
                         help="Which service LLM provider to choose")
@@ -256,15 +613,26 @@ def parse_args():
                         help="API KEY for selected service LLM. Credentials for GCP, AWS based LLM, "
                         "use dedicated authentication CLI (ignore this option)")
     parser.add_argument("--service-llm-gen-config-path", type=str, default="configs/gemini_gen_configs.yaml")
+    parser.add_argument("--fake-llm-config-path", type=str, default="configs/fake_llm.yaml",
+                        help="Latencies, error rates and answer lengths of the offline \"fake\" provider")
+    parser.add_argument("--rate-limit-config-path", type=str, default="configs/rate_limits.yaml",
+                        help="Per-provider rate limits, retries and timeouts of the service LLM. Empty to disable")
     parser.add_argument("--gcp-project-id", type=str, default=os.getenv("GCP_PROJECT_ID"))
     parser.add_argument("--gcp-location", type=str, default=os.getenv("GCP_LOCATION"))
     parser.add_argument("--aws-location", type=str, default=os.getenv("AWS_LOCATION"))
 
+    parser.add_argument("--log-level", type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+
     parser.add_argument("--from-config", type=str, default="configs/graph_creation_configs.yaml", help="Path to the YAML configuration file")
 
+    return parser
+
+def parse_args():
+    parser = build_parser()
     return parser,parser.parse_args()
 
 if __name__ == "__main__":
     parser, args = parse_args()
     args = update_args(parser, args)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     asyncio.run(main(args))
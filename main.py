@@ -1,11 +1,18 @@
 import os
+import yaml
+import logging
 import argparse
 import asyncio
-import networkx as nx
 
-from src.pipeline.parser_py import parse_repo
+from src.pipeline.parser_py import parse_repo, get_head_commit
 from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.ignore import IgnoreEngine
+from src.pipeline.incremental_py import update_graph
 from src.pipeline.nla_generator_py import generate_nla
+from src.pipeline.snapshot import write_graph, SNAPSHOT_EXTENSION
+from src.pipeline.index import NLAIndex, build_index, index_path_for, load_embedder
+from src.pipeline.symbols import SymbolTable, symbols_path_for
+from src.pipeline import telemetry
 
 from utils import update_args
 
@@ -14,22 +21,57 @@ async def main(args):
     # - Load the target Python repositories.
     # - Use the `ast` module to parse each file and extract structural elements 
     #   like modules, classes, methods, and functions.
-    path = parse_repo(args.repo)
+    with telemetry.span("parse_repo"):
+        path = parse_repo(args.repo, ref=args.ref, cache_dir=args.clone_cache_dir)
 
     # Step 2: Build the Graph
     # - Represent each code element as a node (module, class, method, function).
     # - Create edges based on relationships (e.g., imports, inheritance, function calls, memberships).
     # - Use a graph library like NetworkX or store in a graph database like Neo4j.
-    root_node, graph = build_graph(path)
+    dirty_nodes = None
+    ignores = IgnoreEngine.from_config(args.parse_ignores_path, args.exclude, args.include, gitignore=not args.no_gitignore)
+    with telemetry.span("build_graph"):
+        if args.incremental_from:
+            # re-parse only the files that changed since the snapshot was built
+            root_node, graph, dirty_nodes = update_graph(args.incremental_from, path, args.base_commit, ignores=ignores)
+        else:
+            root_node, graph = build_graph(
+                path, draw_graph=args.draw_graph, parse_workers=args.parse_workers, symbol_edges=args.symbol_edges,
+                ignores=ignores,
+            )
+
+    commit = get_head_commit(path)
+    if commit:
+        graph.graph["commit"] = commit
+
+    graph_ext = SNAPSHOT_EXTENSION if args.graph_format == "snapshot" else ".graphml"
     if args.save_raw_graph:
-        nx.write_graphml(graph, f"{root_node}_raw.graphml", named_key_ids=True)
+        with telemetry.span("export", kind="raw_graph"):
+            write_graph(graph, f"{root_node}_raw{graph_ext}")
 
     # Step 3: Generate Natural Language Annotations (NLAs)
     # - For each node in the graph, generate descriptive annotations using an LLM.
     # - Store annotations with the corresponding nodes in the graph.
-    graph = await generate_nla(graph, root_node, args)
+    with telemetry.span("generate_nla"):
+        graph = await generate_nla(graph, root_node, args, dirty_nodes=dirty_nodes)
     if args.save_nla_graph:
-        nx.write_graphml(graph, f"{root_node}_nla.graphml", named_key_ids=True)
+        with telemetry.span("export", kind="nla_graph"):
+            write_graph(graph, f"{root_node}_nla{graph_ext}")
+            if graph.graph.get("symbol_edges"):
+                # name -> node lookups without rebuilding the table from the graph
+                SymbolTable.from_graph(graph).save(symbols_path_for(f"{root_node}_nla{graph_ext}"))
+
+    if args.build_index:
+        # lexical/vector index over the NLAs to pre-filter retrieval candidates
+        with telemetry.span("export", kind="index"):
+            embedder = load_embedder(args.index_embedder)
+            previous_index_path = index_path_for(args.incremental_from) if args.incremental_from else None
+            if previous_index_path and os.path.exists(previous_index_path):
+                index = NLAIndex.load(previous_index_path, embedder=embedder)
+                index.update_from_graph(graph, dirty_nodes)
+            else:
+                index = build_index(graph, embedder=embedder)
+            index.save(index_path_for(f"{root_node}_nla{graph_ext}"))
 
     # Step 4: Implement Retrieval Mechanism
     # - Process user queries to identify relevant parts of the graph.
@@ -47,13 +89,44 @@ async def main(args):
 
     pass  # Placeholder for implementation
 
-def parse_args():
+def build_parser(single_repo: bool = True):
+    """
+    Builds the pipeline's argument parser. `batch.py` reuses it without the
+    options of the single target repository, which come from its manifest.
+    """
     parser = argparse.ArgumentParser(description="HIERA: Hierarchical Information Extraction and Retrieval Augmentation")
     # parsing repo
-    parser.add_argument("--repo", type=str, required=True, help="Path or GitHub URL to the target Python repository")
+    if single_repo:
+        parser.add_argument("--repo", type=str, required=True, help="Path or GitHub URL to the target Python repository")
+        parser.add_argument("--ref", type=str, default=None,
+                            help="Branch, tag or commit SHA of a GitHub repository to check out. Defaults to the remote HEAD")
+    parser.add_argument("--clone-cache-dir", type=str, default=".layerlens_cache/repos",
+                        help="Directory of the cached shallow clones of GitHub repositories")
 
     # building graph
     parser.add_argument("--save-raw-graph", action="store_true", default=False, help="Save the graph to a file")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count(),
+                        help="Number of processes used to parse the Python files of the repository")
+    parser.add_argument("--parse-ignores-path", type=str, default=None,
+                        help="File of .gitignore style rules of the files and directories left out of every repository. "
+                        "Defaults to configs/parse_ignores of LayerLens, empty for none")
+    parser.add_argument("--exclude", type=str, action="append", default=[],
+                        help="Glob of files or directories to leave out, e.g. '*_pb2.py' or 'third_party/'. Can be repeated")
+    parser.add_argument("--include", type=str, action="append", default=[],
+                        help="Glob of files or directories to keep even when another rule leaves them out. Can be repeated")
+    parser.add_argument("--no-gitignore", action="store_true", default=False,
+                        help="Do not apply the .gitignore files of the repository")
+    parser.add_argument("--symbol-edges", action="store_true", default=False,
+                        help="Resolve imports, base classes and calls into typed cross-module edges, "
+                        "and save a name -> node symbol table next to the NLA graph")
+    parser.add_argument("--graph-format", type=str, default="graphml", choices=["graphml", "snapshot"],
+                        help=f"File format of the saved graphs. 'snapshot' writes the compact binary {SNAPSHOT_EXTENSION} format")
+    if single_repo:
+        parser.add_argument("--incremental-from", type=str, default=None,
+                            help=f"Path to a previous *_nla.graphml or *_nla{SNAPSHOT_EXTENSION} snapshot. Only the files changed since the snapshot's "
+                            "commit are re-parsed, and only the changed nodes and their ancestors are re-annotated")
+        parser.add_argument("--base-commit", type=str, default=None,
+                            help="Commit the --incremental-from snapshot was built from. Defaults to the commit recorded in the snapshot")
 
     # generating nla
     parser.add_argument("--service-llm-provider", type=str, default="gemini",
@@ -64,6 +137,10 @@ def parse_args():
                         help="API KEY for selected service LLM. Credentials for GCP, AWS based LLM, "
                         "use dedicated authentication CLI (ignore this option)")
     parser.add_argument("--service-llm-gen-config-path", type=str, default="configs/gemini_gen_configs.yaml")
+    parser.add_argument("--fake-llm-config-path", type=str, default="configs/fake_llm.yaml",
+                        help="Latencies, error rates and answer lengths of the offline \"fake\" provider")
+    parser.add_argument("--rate-limit-config-path", type=str, default="configs/rate_limits.yaml",
+                        help="Per-provider rate limits, retries and timeouts of the service LLM. Empty to disable")
     parser.add_argument("--gcp-project-id", type=str, default=os.getenv("GCP_PROJECT_ID"))
     parser.add_argument("--gcp-location", type=str, default=os.getenv("GCP_LOCATION"))
     parser.add_argument("--aws-location", type=str, default=os.getenv("AWS_LOCATION"))    
@@ -72,16 +149,69 @@ def parse_args():
                         default=os.path.abspath("configs/prompts.toml"),
                         help="Path to the prompts TOML configuration file.")
     parser.add_argument("--workers", type=int, default=4, help="Number of workers to process the graph")
+    parser.add_argument("--traverse-priority", type=str, default="fifo", choices=["fifo", "critical-path"],
+                        help="Order in which ready nodes are dispatched to the workers. "
+                        "'critical-path' starts the deepest and largest subtrees first")
+    parser.add_argument("--nla-batch-size", type=int, default=1,
+                        help="Maximum number of ready sibling nodes annotated with a single request. 1 disables batching")
+    parser.add_argument("--nla-batch-gen-config-path", type=str, default=None,
+                        help="Generation config used for batched NLA requests, with the structured output schema of the annotations. "
+                        "Defaults to the configs/nla_batch_*_gen_configs.yaml of the provider")
+    parser.add_argument("--nla-batch-max-tokens", type=int, default=4000,
+                        help="Maximum estimated number of dependency tokens of a batched request")
+    parser.add_argument("--nla-prompt-token-budget", type=int, default=8000,
+                        help="Maximum number of dependency tokens in a single NLA prompt. Larger parents are summarized "
+                             "chunk by chunk and then combined. 0 disables the budget")
+    parser.add_argument("--model-tiers", type=yaml.safe_load, default=None,
+                        help="List of tiers routing NLA requests to models by node type and prompt size, usually set in "
+                        "the YAML config, e.g. [{types: [function, class], max_prompt_tokens: 2000, model: gpt-4o-mini, "
+                        "escalate: true}]. Requests no tier matches go to --service-llm-model")
+    parser.add_argument("--nla-cache-path", type=str, default=".layerlens_cache/nla_cache.sqlite",
+                        help="Path to the persistent cache of generated NLAs")
+    parser.add_argument("--nla-cache-max-size-mb", type=float, default=1024,
+                        help="Size cap of the NLA cache. Least recently used entries are evicted first")
+    parser.add_argument("--disable-nla-cache", action="store_true", default=False, help="Always call the service LLM")
+    parser.add_argument("--checkpoint-dir", type=str, default=".layerlens_cache/checkpoints",
+                        help="Directory of the write-ahead log of completed nodes. Empty to disable checkpointing")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Flush the checkpoint every this many nodes")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0, help="Flush the checkpoint at least every this many seconds")
+    parser.add_argument("--resume", action="store_true", default=False,
+                        help="Restore the nodes completed by an interrupted run from its checkpoint and annotate only the rest")
     parser.add_argument("--graph-imgs-path", type=str, default="graph_imgs", help="Path to save the graph images")
     parser.add_argument("--save-graph-animation", action="store_true", default=False, help="Save the graph animation")
     parser.add_argument("--graph-animation-duration-per-step", type=float, default=1.0, help="Duration of each graph animation frame")
+    parser.add_argument("--graph-animation-max-fps", type=float, default=2.0,
+                        help="Maximum number of animation frames rendered per second of annotation")
+    parser.add_argument("--graph-animation-max-nodes", type=int, default=2000,
+                        help="Graphs larger than this are not animated even with --save-graph-animation. 0 for no limit")
+    parser.add_argument("--draw-graph", action="store_true", default=False, help="Draw the parsed graph to graph.png")
     parser.add_argument("--save-nla-graph", action="store_true", default=False, help="Save the graph to a file")
+    parser.add_argument("--build-index", action="store_true", default=False,
+                        help="Build a local index over the NLAs next to the saved graph, used to pre-filter retrieval candidates")
+    parser.add_argument("--index-embedder", type=str, default="none",
+                        help="Dense embedder of the index: 'none', 'hashing', or 'module:callable' for a custom local embedder")
+
+    parser.add_argument("--log-level", type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG also logs every prompt and annotated node")
+    parser.add_argument("--metrics-jsonl-path", type=str, default=None,
+                        help="Path to append span timings, gauge samples and per-node token counts to as JSON lines")
+    parser.add_argument("--metrics-prom-path", type=str, default=None,
+                        help="Path to write the metrics of the run to in Prometheus text format")
 
     parser.add_argument("--from-config", type=str, default="configs/cli_configs.yaml", help="Path to the YAML configuration file")
 
+    return parser
+
+def parse_args():
+    parser = build_parser()
     return parser,parser.parse_args()
 
 if __name__ == "__main__":
     parser, args = parse_args()
     args = update_args(parser, args)
-    asyncio.run(main(args))
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    telemetry.configure(args.metrics_jsonl_path)
+    try:
+        asyncio.run(main(args))
+    finally:
+        telemetry.finish(args.metrics_prom_path)
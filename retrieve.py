@@ -0,0 +1,83 @@
+import os
+import logging
+import json
+import asyncio
+import argparse
+
+from src.pipeline.utils import setup_service_llm
+from src.pipeline.snapshot import read_graph
+from src.pipeline.retreival_py import retrieve
+from src.pipeline.index import NLAIndex, candidate_nodes, index_path_for, load_embedder
+
+from utils import update_args
+
+async def main(args):
+    service_llm_client, gen_configs = setup_service_llm(args)
+    graph = read_graph(args.graph_path)
+
+    candidates = None
+    index_path = args.index_path or index_path_for(args.graph_path)
+    if args.index_top_k > 0 and os.path.exists(index_path):
+        index = NLAIndex.load(index_path, embedder=load_embedder(args.index_embedder))
+        candidates = candidate_nodes(graph, index, args.prompt, top_k=args.index_top_k)
+        logging.info("index pre-selected %d of %d nodes", len(candidates), graph.number_of_nodes())
+
+    results, llm_calls = await retrieve(
+        graph, args.prompt, service_llm_client, args.service_llm_model, gen_configs,
+        beam_width=args.beam_width, max_depth=args.max_depth, min_score=args.min_score,
+        workers=args.workers, repo_path=args.repo_path, candidates=candidates,
+    )
+
+    print(f"{len(results)} relevant code nodes for \"{args.prompt}\" ({llm_calls} LLM calls, {graph.number_of_nodes()} nodes)")
+    for rank, result in enumerate(results[:args.top_k], start=1):
+        print(f"{rank}. [{result['score']:.1f}] {result['node']} ({result['type']}): {result['reason']}")
+
+    if args.output_path:
+        with open(args.output_path, "w") as file:
+            json.dump(results[:args.top_k], file, indent=2)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="HIERA: Hierarchical Information Extraction and Retrieval Augmentation")
+    parser.add_argument("--graph-path", type=str, default="requests_nla.graphml", help="Path to the graph file")
+    parser.add_argument("--prompt", type=str, default="how to send HTTP request?", help="text prompt query to ask")
+    parser.add_argument("--repo-path", type=str, default=None,
+                        help="Path to the repository checkout the graph was built from. Defaults to the path recorded in the graph")
+    parser.add_argument("--beam-width", type=int, default=3, help="Number of nodes kept at every level of the graph")
+    parser.add_argument("--max-depth", type=int, default=8, help="Maximum number of levels to descend")
+    parser.add_argument("--min-score", type=float, default=5, help="Nodes scoring below this (0-10) are pruned")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of concurrent LLM calls")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of results to report")
+    parser.add_argument("--output-path", type=str, default=None, help="Path to save the results as JSON")
+    parser.add_argument("--index-path", type=str, default=None,
+                        help="Path to the local NLA index. Defaults to the index saved next to the graph")
+    parser.add_argument("--index-top-k", type=int, default=50,
+                        help="Number of index matches to pre-select before any LLM call. 0 disables the index")
+    parser.add_argument("--index-embedder", type=str, default="none", help="Dense embedder the index was built with")
+
+    parser.add_argument("--service-llm-provider", type=str, default="gemini",
+                        help="Which service LLM provider to choose")
+    parser.add_argument("--service-llm-model", type=str, default="gemini-1.5-flash-latest",
+                        help="Which service LLM model to choose")
+    parser.add_argument("--service-llm-api-key", type=str, default=os.getenv("SERVICE_LLM_API_KEY"),
+                        help="API KEY for selected service LLM. Credentials for GCP, AWS based LLM, "
+                        "use dedicated authentication CLI (ignore this option)")
+    parser.add_argument("--service-llm-gen-config-path", type=str, default="configs/gemini_gen_configs.yaml")
+    parser.add_argument("--fake-llm-config-path", type=str, default="configs/fake_llm.yaml",
+                        help="Latencies, error rates and answer lengths of the offline \"fake\" provider")
+    parser.add_argument("--rate-limit-config-path", type=str, default="configs/rate_limits.yaml",
+                        help="Per-provider rate limits, retries and timeouts of the service LLM. Empty to disable")
+    parser.add_argument("--gcp-project-id", type=str, default=os.getenv("GCP_PROJECT_ID"))
+    parser.add_argument("--gcp-location", type=str, default=os.getenv("GCP_LOCATION"))
+    parser.add_argument("--aws-location", type=str, default=os.getenv("AWS_LOCATION"))
+
+    parser.add_argument("--log-level", type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+
+    parser.add_argument("--from-config", type=str, default="configs/retrieval_configs.yaml", help="Path to the YAML configuration file")
+
+    return parser,parser.parse_args()
+
+if __name__ == "__main__":
+    parser, args = parse_args()
+    args = update_args(parser, args)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(args))
@@ -0,0 +1,290 @@
+import os
+import git
+import time
+import uuid
+import yaml
+import asyncio
+import logging
+from collections import OrderedDict
+
+from src.pipeline.cache import make_cache_key
+from src.pipeline.parser_py import get_head_commit, _clone_repo
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.ignore import IgnoreEngine
+from src.pipeline.nla_generator_py import generate_nla
+from src.pipeline.snapshot import write_graph, SNAPSHOT_EXTENSION
+from src.pipeline.index import build_index, index_path_for
+
+from main import build_parser as build_pipeline_parser
+from convert_interactive_html import build_parser as build_render_parser, main as render_html
+
+logger = logging.getLogger(__name__)
+
+_TERMINAL_STATUSES = ("done", "failed")
+
+# generation configs the per-job max_tokens and temperature are applied on top of
+_NLA_GEN_CONFIG_PATHS = {"gemini": "configs/gemini_gen_configs.yaml"}
+_DEFAULT_NLA_GEN_CONFIG_PATH = "configs/gpt_gen_configs.yaml"
+_RELEVANCE_GEN_CONFIG_PATH = "configs/graph_creation_gpt_gen_configs.yaml"
+
+def _resolve_commit(repo_url: str, commit: str = None):
+    if commit:
+        return commit
+    if os.path.isdir(repo_url):
+        return get_head_commit(repo_url) or "worktree"
+    return git.cmd.Git().ls_remote(repo_url, "HEAD").split()[0]
+
+def _checkout(repo_url: str, commit: str, repos_dir: str):
+    """
+    Returns a checkout of `repo_url` at `commit`. Local directories are used in
+    place, remote repositories are shallow fetched into the clone cache, one
+    checkout per commit so that jobs on different commits never share one.
+    """
+    if os.path.isdir(repo_url):
+        return repo_url
+    return _clone_repo(repo_url, ref=commit, cache_dir=os.path.join(repos_dir, commit[:12]))
+
+def _save_graph(graph, graph_path: str):
+    # written under a temporary name so that a crash never leaves a partial graph in the cache
+    temp_path = f"{graph_path}.{uuid.uuid4().hex}{SNAPSHOT_EXTENSION}"
+    write_graph(graph, temp_path)
+    build_index(graph).save(index_path_for(graph_path))
+    os.replace(temp_path, graph_path)
+
+def _write_gen_configs(base_path: str, provider: str, max_tokens: int, temperature: float, out_dir: str):
+    with open(base_path, "r") as file:
+        gen_configs = yaml.safe_load(file) or {}
+    gen_configs.pop("max_tokens", None)
+    gen_configs.pop("max_output_tokens", None)
+    gen_configs["max_output_tokens" if provider == "gemini" else "max_tokens"] = max_tokens
+    gen_configs["temperature"] = temperature
+
+    path = os.path.join(out_dir, make_cache_key(gen_configs) + ".yaml")
+    if not os.path.exists(path):
+        with open(path, "w") as file:
+            yaml.safe_dump(gen_configs, file)
+    return path
+
+class Job:
+    """
+    One request of a user. Progress is recorded as a list of events, which
+    `stream` replays and then follows until the job is done or failed.
+    """
+    def __init__(self, job_id: str, request: dict, key: str):
+        self.id = job_id
+        self.request = request
+        self.key = key
+        self.status = "queued"
+        self.events = []
+        self.result_path = None
+        self.error = None
+        self.created = time.time()
+        self._condition = asyncio.Condition()
+
+    async def emit(self, status: str = None, **data):
+        if status is not None:
+            self.status = status
+        async with self._condition:
+            self.events.append({"status": self.status, "time": round(time.time(), 3), **data})
+            self._condition.notify_all()
+
+    async def stream(self):
+        sent = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: len(self.events) > sent)
+                events = self.events[sent:]
+            sent += len(events)
+            for event in events:
+                yield event
+            if self.status in _TERMINAL_STATUSES:
+                return
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "request": self.request,
+            "error": self.error,
+            "last_event": self.events[-1] if self.events else None,
+        }
+
+class JobManager:
+    """
+    Runs the parse -> build -> NLA -> HTML pipeline for submitted jobs on a
+    bounded number of concurrent pipelines.
+
+    Graphs are keyed by (repo_url, commit, provider, model) and HTML outputs by
+    the graph key plus the prompt. Both are cached on disk under `data_dir`,
+    and a job submitted while an identical one is running joins it instead of
+    starting another one. Jobs with different prompts over the same graph share
+    a single graph build.
+
+    Args:
+    data_dir: Directory of the cached graphs, HTML outputs and checkouts.
+    max_workers: Maximum number of pipeline stages running at once.
+    max_jobs: Number of finished jobs kept in memory for status queries.
+    pipeline_overrides: Attributes set on the pipeline args of every job,
+        e.g. the workers or the rate limit config.
+    """
+    def __init__(self, data_dir: str, max_workers: int = 2, max_jobs: int = 1000, pipeline_overrides: dict = None):
+        self.data_dir = data_dir
+        self.max_jobs = max_jobs
+        self.pipeline_overrides = pipeline_overrides or {}
+        for sub_dir in ("graphs", "html", "repos", "gen_configs", "checkpoints"):
+            os.makedirs(os.path.join(data_dir, sub_dir), exist_ok=True)
+
+        self.jobs = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._running = {}
+        self._graph_tasks = {}
+        self._graph_subscribers = {}
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def _register(self, job):
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if oldest.status not in _TERMINAL_STATUSES:
+                break
+            del self.jobs[oldest_id]
+
+    async def submit(self, request: dict):
+        """
+        Returns a tuple of (job, deduplicated). A deduplicated job is an
+        identical one that is already queued or running.
+        """
+        commit = await asyncio.to_thread(_resolve_commit, request["repo_url"], request.get("commit"))
+        graph_key = make_cache_key(request["repo_url"], commit, request["service_llm_provider"], request["service_llm_model"])
+        html_key = make_cache_key(graph_key, request["prompt"])
+
+        if html_key in self._running:
+            return self._running[html_key], True
+
+        job = Job(uuid.uuid4().hex, {**request, "commit": commit}, html_key)
+        self._register(job)
+
+        html_path = os.path.join(self.data_dir, "html", f"{html_key}.html")
+        if os.path.exists(html_path):
+            job.result_path = html_path
+            await job.emit("done", stage="cached")
+            return job, False
+
+        self._running[html_key] = job
+        await job.emit("queued")
+        asyncio.create_task(self._run(job, graph_key, html_path))
+        return job, False
+
+    async def _run(self, job, graph_key, html_path):
+        try:
+            graph_path = await self._graph(job, graph_key)
+
+            async with self._semaphore:
+                await job.emit("running", stage="rendering")
+                await self._render(job, graph_path, html_path)
+
+            job.result_path = html_path
+            await job.emit("done", stage="done")
+        except Exception as exc:
+            logger.exception("job %s failed", job.id)
+            job.error = f"{type(exc).__name__}: {exc}"
+            await job.emit("failed", error=job.error)
+        finally:
+            self._running.pop(job.key, None)
+
+    async def _graph(self, job, graph_key):
+        graph_path = os.path.join(self.data_dir, "graphs", f"{graph_key}{SNAPSHOT_EXTENSION}")
+        if os.path.exists(graph_path):
+            await job.emit("running", stage="graph cached")
+            return graph_path
+
+        self._graph_subscribers.setdefault(graph_key, []).append(job)
+        task = self._graph_tasks.get(graph_key)
+        if task is None:
+            task = asyncio.create_task(self._build_graph(job.request, graph_key, graph_path))
+            self._graph_tasks[graph_key] = task
+        else:
+            await job.emit("running", stage="waiting for identical graph build")
+        return await asyncio.shield(task)
+
+    async def _notify(self, graph_key, **data):
+        for job in list(self._graph_subscribers.get(graph_key, [])):
+            await job.emit("running", **data)
+
+    def _pipeline_args(self, request, repo_path, graph_key):
+        args = build_pipeline_parser().parse_args(["--repo", repo_path])
+        args.from_config = None
+        args.service_llm_provider = request["service_llm_provider"]
+        args.service_llm_model = request["service_llm_model"]
+        args.service_llm_gen_config_path = _write_gen_configs(
+            _NLA_GEN_CONFIG_PATHS.get(request["service_llm_provider"], _DEFAULT_NLA_GEN_CONFIG_PATH),
+            request["service_llm_provider"], request["max_tokens"], request["temperature"],
+            os.path.join(self.data_dir, "gen_configs"),
+        )
+        args.graph_format = "snapshot"
+        args.checkpoint_dir = os.path.join(self.data_dir, "checkpoints", graph_key)
+        args.resume = True
+        for key, value in self.pipeline_overrides.items():
+            setattr(args, key, value)
+        return args
+
+    async def _build_graph(self, request, graph_key, graph_path):
+        try:
+            async with self._semaphore:
+                await self._notify(graph_key, stage="cloning")
+                repo_path = await asyncio.to_thread(
+                    _checkout, request["repo_url"], request["commit"], os.path.join(self.data_dir, "repos")
+                )
+
+                await self._notify(graph_key, stage="building graph")
+                args = self._pipeline_args(request, repo_path, graph_key)
+                root_node, graph = await asyncio.to_thread(
+                    build_graph, repo_path, draw_graph=False, parse_workers=args.parse_workers,
+                    symbol_edges=args.symbol_edges,
+                    ignores=IgnoreEngine.from_config(args.parse_ignores_path, args.exclude, args.include, gitignore=not args.no_gitignore),
+                )
+                graph.graph["commit"] = request["commit"]
+
+                async def __report_progress():
+                    while True:
+                        processed = sum(1 for _, data in graph.nodes(data=True) if data.get("processed"))
+                        await self._notify(graph_key, stage="annotating", processed=processed, total=graph.number_of_nodes())
+                        await asyncio.sleep(1.0)
+
+                progress = asyncio.create_task(__report_progress())
+                try:
+                    graph = await generate_nla(graph, root_node, args)
+                finally:
+                    progress.cancel()
+
+                await self._notify(graph_key, stage="saving graph")
+                # serializing and indexing a large graph would otherwise stall the event loop and its SSE streams
+                await asyncio.to_thread(_save_graph, graph, graph_path)
+                return graph_path
+        finally:
+            self._graph_tasks.pop(graph_key, None)
+            self._graph_subscribers.pop(graph_key, None)
+
+    async def _render(self, job, graph_path, html_path):
+        request = job.request
+        args = build_render_parser().parse_args([])
+        args.from_config = None
+        args.graph_path = graph_path
+        args.prompt = request["prompt"]
+        args.service_llm_provider = request["service_llm_provider"]
+        args.service_llm_model = request["service_llm_model"]
+        args.service_llm_gen_config_path = _write_gen_configs(
+            _RELEVANCE_GEN_CONFIG_PATH, request["service_llm_provider"], request["max_tokens"], request["temperature"],
+            os.path.join(self.data_dir, "gen_configs"),
+        )
+        args.relevance_cache_path = os.path.join(self.data_dir, "relevance_cache.sqlite")
+        for key, value in self.pipeline_overrides.items():
+            if hasattr(args, key):
+                setattr(args, key, value)
+
+        temp_path = f"{html_path}.{uuid.uuid4().hex}.html"
+        args.output_path = temp_path
+        await render_html(args)
+        os.replace(temp_path, html_path)
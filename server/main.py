@@ -1,7 +1,12 @@
-from fastapi import FastAPI, Query
-from fastapi.responses import HTMLResponse
+import os
+import json
+from typing import Optional
+from pydantic import BaseModel
+from fastapi import FastAPI, Query, HTTPException
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import time
+
+from server.jobs import JobManager
 
 app = FastAPI()
 
@@ -14,6 +19,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+manager = JobManager(
+    os.getenv("LAYERLENS_DATA_DIR", ".layerlens_cache/server"),
+    max_workers=int(os.getenv("LAYERLENS_SERVER_WORKERS", "2")),
+)
+
+class JobRequest(BaseModel):
+    repo_url: str
+    prompt: str
+    service_llm_provider: str = "gemini"
+    service_llm_model: str = "gemini-1.5-flash-latest"
+    max_tokens: int = 4096
+    temperature: float = 0.8
+    commit: Optional[str] = None
+
+def _get_job(job_id: str):
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Submits a repository and prompt. Identical jobs that are still running are
+    joined, and finished graphs and HTML outputs are served from the cache.
+    """
+    job, deduplicated = await manager.submit(request.model_dump())
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "deduplicated": deduplicated,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        "result_url": f"/jobs/{job.id}/result",
+    }
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Streams the progress of a job as server-sent events until it is done or failed.
+    """
+    job = _get_job(job_id)
+
+    async def __events():
+        async for event in job.stream():
+            yield f"event: {event['status']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(__events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = _get_job(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+
+    with open(job.result_path, "r") as file:
+        return HTMLResponse(content=file.read(), status_code=200)
+
 @app.get("/generate")
 async def generate(
     service_llm_provider: str = Query(...),
@@ -25,31 +94,15 @@ async def generate(
     timestamp: int = Query(...),
 ):
     """
-    Simulates graph generation based on provided parameters.
-
-    For demonstration, it returns a simple HTML response after a delay.
-    In a real application, you would use these parameters to interact with
-    your graph generation logic and an LLM.
-    """
-    print(f"Received request with parameters: {service_llm_provider=}, {service_llm_model=}, {max_tokens=}, {temperature=}, {repo_url=}, {prompt=}, {timestamp=}")
-
-    # Simulate processing time (replace with actual graph generation logic)
-    time.sleep(2)
-
-    # Placeholder for a generated HTML graph (replace with your actual output)
-    html_content = f"""
-    <html>
-    <head><title>Generated Graph</title></head>
-    <body>
-        <h1>Graph generated for {repo_url}</h1>
-        <p>Prompt: {prompt}</p>
-        <p>LLM Provider: {service_llm_provider}</p>
-        <p>LLM Model: {service_llm_model}</p>
-        <p>Max Tokens: {max_tokens}</p>
-        <p>Temperature: {temperature}</p>
-        <p>Timestamp: {timestamp}</p>
-        <p> This is a placeholder for a graph. Imagine a beautiful graph here! </p>
-        </body>
-    </html>
+    Submits a job and answers with its HTML output once it is done, for the
+    GUI. Waiting does not block the event loop, so other requests are served
+    in the meantime.
     """
-    return HTMLResponse(content=html_content, status_code=200)
\ No newline at end of file
+    job, _ = await manager.submit(JobRequest(
+        repo_url=repo_url, prompt=prompt, service_llm_provider=service_llm_provider,
+        service_llm_model=service_llm_model, max_tokens=max_tokens, temperature=temperature,
+    ).model_dump())
+
+    async for _ in job.stream():
+        pass
+    return await job_result(job.id)
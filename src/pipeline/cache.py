@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+def _config_default(value):
+    # pydantic classes are generated from the YAML `schema` for structured outputs
+    if hasattr(value, "model_json_schema"):
+        return value.model_json_schema()
+    return repr(value)
+
+def make_cache_key(*parts):
+    """
+    Hashes the given parts into a stable content address. Parts are serialized
+    as JSON with sorted keys, so dicts that only differ in ordering map to the
+    same key.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=_config_default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class NLACache:
+    """
+    Persistent, content-addressed store of generated annotations backed by
+    SQLite. Entries are keyed by a hash of the fully rendered prompt, the model
+    and the generation config, so identical code is served from the cache
+    across runs and across repositories.
+
+    The total size of stored values is capped at `max_size_mb`; least recently
+    used entries are evicted first. The access times of hits are kept in
+    memory and written back in bulk, on the next `put`, every
+    `_FLUSH_ACCESSES_EVERY` hits and on `close`, so a warm run does not commit
+    once per node.
+    """
+    _TABLE = "nla_cache"
+    _FLUSH_ACCESSES_EVERY = 1024
+
+    def __init__(self, path: str, max_size_mb: float = 1024):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._accesses = {}
+
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._TABLE} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self._TABLE}_last_access ON {self._TABLE} (last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self._TABLE}").fetchone()[0]
+
+    def make_key(self, prompt, model, gen_configs):
+        return make_cache_key(prompt, model, gen_configs)
+
+    def get(self, key):
+        row = self._conn.execute(f"SELECT value FROM {self._TABLE} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._accesses[key] = time.time()
+        if len(self._accesses) >= self._FLUSH_ACCESSES_EVERY:
+            self._flush_accesses()
+            self._conn.commit()
+        return row[0]
+
+    def _flush_accesses(self):
+        if self._accesses:
+            self._conn.executemany(
+                f"UPDATE {self._TABLE} SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in self._accesses.items()],
+            )
+            self._accesses.clear()
+
+    def put(self, key, value: str):
+        # eviction has to see the recent hits
+        self._flush_accesses()
+        size = len(value.encode("utf-8"))
+        previous = self._conn.execute(f"SELECT size FROM {self._TABLE} WHERE key = ?", (key,)).fetchone()
+        if previous is not None:
+            self._size -= previous[0]
+
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {self._TABLE} (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time()),
+        )
+        self._size += size
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        while self._size > self.max_size:
+            rows = self._conn.execute(
+                f"SELECT key, size FROM {self._TABLE} ORDER BY last_access ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+
+            for key, size in rows:
+                if self._size <= self.max_size:
+                    break
+                self._conn.execute(f"DELETE FROM {self._TABLE} WHERE key = ?", (key,))
+                self._size -= size
+                self.evictions += 1
+
+    def delete(self, key):
+        self._accesses.pop(key, None)
+        row = self._conn.execute(f"SELECT size FROM {self._TABLE} WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute(f"DELETE FROM {self._TABLE} WHERE key = ?", (key,))
+            self._size -= row[0]
+            self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self._TABLE}").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "size_bytes": self._size,
+        }
+
+    def close(self):
+        self._flush_accesses()
+        self._conn.commit()
+        self._conn.close()
+
+def normalize_query(query: str):
+    """
+    Normalizes a relevance query so that questions which only differ in case,
+    whitespace or trailing punctuation share their cached verdicts.
+    """
+    return " ".join(query.lower().split()).strip(" ?!.")
+
+class RelevanceCache(NLACache):
+    """
+    Persistent cache of the relevance verdicts of `convert_interactive_html`,
+    in the same SQLite store as the NLAs. Entries are keyed by the normalized
+    query, a hash of the node's NLA and the model and config, so only the
+    nodes whose annotations changed are scored again. On top of the LRU size
+    cap of `NLACache`, entries older than `ttl_s` are dropped on lookup.
+    """
+    _TABLE = "relevance_cache"
+
+    def __init__(self, path: str, max_size_mb: float = 64, ttl_s: float = None):
+        super().__init__(path, max_size_mb=max_size_mb)
+        self.ttl_s = ttl_s
+        self.expired = 0
+
+    def make_key(self, query, nla, model, configs):
+        nla_hash = hashlib.sha256(nla.encode("utf-8")).hexdigest()
+        return make_cache_key(normalize_query(query), nla_hash, model, configs)
+
+    def get_verdict(self, key):
+        """
+        Returns the (relevance, reason) stored under `key`, or None.
+        """
+        value = self.get(key)
+        if value is None:
+            return None
+
+        entry = json.loads(value)
+        if self.ttl_s and time.time() - entry["stored_at"] > self.ttl_s:
+            # the lookup was counted as a hit by `get`
+            self.hits -= 1
+            self.misses += 1
+            self.expired += 1
+            self.delete(key)
+            return None
+        return entry["relevance"], entry["reason"]
+
+    def put_verdict(self, key, relevance: bool, reason: str):
+        self.put(key, json.dumps({"relevance": relevance, "reason": reason, "stored_at": time.time()}))
+
+    def stats(self):
+        return {**super().stats(), "expired": self.expired}
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# node attributes written to the checkpoint, besides the implied "processed"
+_CHECKPOINT_ATTRS = ("nla", "prompt_tokens", "completion_tokens")
+
+class NLACheckpoint:
+    """
+    Append-only write-ahead log of completed nodes. Every completed node is
+    buffered and appended as one JSON line, and the buffer is flushed (and
+    fsynced) every `flush_every` nodes or `flush_interval` seconds, so that a
+    crash loses at most that much work.
+
+    The first line is a header identifying the graph, checked on resume.
+    """
+    def __init__(self, path: str, root_node: str, commit: str = None, resume: bool = False,
+                 flush_every: int = 100, flush_interval: float = 30.0):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+        header = {"type": "header", "root": root_node, "commit": commit}
+        if resume and os.path.exists(path):
+            self._file = open(path, "a")
+            if self._file.tell() > 0:
+                with open(path, "rb") as file:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        # terminate a line cut short by a crash
+                        self._file.write("\n")
+        else:
+            self._file = open(path, "w")
+            self._file.write(json.dumps(header) + "\n")
+            self._file.flush()
+
+    def record(self, node, data):
+        record = {"node": node}
+        record.update((attr, data[attr]) for attr in _CHECKPOINT_ATTRS if attr in data)
+        self._buffer.append(json.dumps(record, default=str))
+        if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+def checkpoint_path_for(checkpoint_dir: str, root_node: str):
+    return os.path.join(checkpoint_dir, f"{root_node}_nla.ckpt.jsonl")
+
+def load_checkpoint(path: str):
+    """
+    Reads a checkpoint written by `NLACheckpoint`.
+
+    Returns:
+    A tuple of (header, records) where records maps every completed node to its
+    checkpointed attributes. A line cut short by a crash is ignored.
+    """
+    header, records = None, {}
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("type") == "header":
+                header = record
+            else:
+                records[record.pop("node")] = record
+    return header, records
+
+def restore_checkpoint(graph, root_node, path: str, commit: str = None):
+    """
+    Restores the NLAs and "processed" flags of the nodes completed in the
+    checkpoint at `path`.
+
+    Returns:
+    The set of nodes restored. Nodes of the checkpoint that are no longer part
+    of the graph are skipped.
+    """
+    header, records = load_checkpoint(path)
+    if header is None or header["root"] != root_node:
+        raise ValueError(f"{path} is not a checkpoint of {root_node}")
+    if commit and header.get("commit") and header["commit"] != commit:
+        raise ValueError(f"{path} was written at commit {header['commit']}, the repository is at {commit}")
+
+    restored = set()
+    for node, attrs in records.items():
+        if node in graph:
+            graph.nodes[node].update(attrs)
+            graph.nodes[node]["processed"] = True
+            restored.add(node)
+
+    logger.info("restored %d completed nodes from %s", len(restored), path)
+    return restored
@@ -0,0 +1,126 @@
+import re
+import json
+import zlib
+import yaml
+import random
+import asyncio
+
+from src.pipeline.utils import count_tokens
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+class FakeServerError(Exception):
+    status_code = 500
+
+class FakeLLMClient:
+    """
+    Offline stand-in for an `APIFactory` client, selected with the "fake"
+    service LLM provider. It sleeps like a real provider would, fails at the
+    configured rates, accounts the tokens it reads and writes, and answers the
+    structured prompts of the pipeline (batched NLAs, relevance verdicts and
+    scores) with well-formed JSON, so that every stage can run and be measured
+    without API keys.
+
+    Args:
+    latency: Distribution of the time to first token, "constant", "uniform",
+        "exponential" or "lognormal".
+    latency_ms: Mean latency in milliseconds (median for "lognormal").
+    latency_sigma: Spread, the shape parameter of "lognormal" and the relative
+        half-width of "uniform".
+    ms_per_output_token: Additional latency per generated token.
+    output_tokens: Mean number of tokens of a free-form answer.
+    throttle_rate: Fraction of calls failing with a 429 `FakeRateLimitError`.
+    error_rate: Fraction of calls failing with a 500 `FakeServerError`.
+    hang_rate: Fraction of calls that never answer, to exercise timeouts.
+    seed: Seed of the random number generator.
+    """
+    def __init__(self, latency: str = "lognormal", latency_ms: float = 500.0, latency_sigma: float = 0.5,
+                 ms_per_output_token: float = 0.0, output_tokens: int = 80,
+                 throttle_rate: float = 0.0, error_rate: float = 0.0, hang_rate: float = 0.0, seed: int = 0):
+        if latency not in ("constant", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.ms_per_output_token = ms_per_output_token
+        self.output_tokens = output_tokens
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _sample_latency(self):
+        if self.latency == "constant":
+            latency_ms = self.latency_ms
+        elif self.latency == "uniform":
+            spread = self.latency_ms * self.latency_sigma
+            latency_ms = self.random.uniform(self.latency_ms - spread, self.latency_ms + spread)
+        elif self.latency == "exponential":
+            latency_ms = self.random.expovariate(1.0 / self.latency_ms) if self.latency_ms > 0 else 0.0
+        else:
+            latency_ms = self.random.lognormvariate(0.0, self.latency_sigma) * self.latency_ms
+        return max(0.0, latency_ms) / 1000.0
+
+    def _respond(self, prompt):
+        # answers only depend on the prompt, so that runs are comparable whatever the order of the calls
+        rng = random.Random(zlib.crc32(prompt.encode("utf-8")) ^ self.seed)
+        words = ["handles", "parses", "builds", "returns", "the", "request", "graph", "node", "module", "value"]
+
+        def __text(num_tokens):
+            return " ".join(rng.choice(words) for _ in range(max(1, num_tokens)))
+
+        num_tokens = max(1, int(rng.expovariate(1.0 / self.output_tokens))) if self.output_tokens > 0 else 1
+        if '"annotations"' in prompt:
+            nodes = re.findall(r'^dependencies of "([^"]+)"', prompt, flags=re.MULTILINE)
+            return json.dumps({"annotations": [{"node": node, "nla": __text(num_tokens)} for node in nodes]})
+        if '"verdicts"' in prompt:
+            nodes = re.findall(r"^Context of @(\S+):", prompt, flags=re.MULTILINE)
+            return json.dumps({"verdicts": [
+                {"node": node, "relevance": rng.random() < 0.2, "reason": __text(8)} for node in nodes
+            ]})
+        if '"score"' in prompt:
+            return json.dumps({"score": rng.randint(0, 10), "reason": __text(8)})
+        if "determine if the following query is relevant" in prompt:
+            return json.dumps({"relevance": rng.random() < 0.2, "reason": __text(8)})
+        return __text(num_tokens)
+
+    async def generate_text(self, model, prompt, **kwargs):
+        self.calls += 1
+        self.prompt_tokens += count_tokens(prompt)
+        await asyncio.sleep(self._sample_latency())
+
+        draw = self.random.random()
+        if draw < self.hang_rate:
+            self.failures += 1
+            await asyncio.Event().wait()
+        if draw < self.hang_rate + self.throttle_rate:
+            self.failures += 1
+            raise FakeRateLimitError("429 Too Many Requests")
+        if draw < self.hang_rate + self.throttle_rate + self.error_rate:
+            self.failures += 1
+            raise FakeServerError("500 Internal Server Error")
+
+        response = self._respond(prompt)
+        completion_tokens = count_tokens(response)
+        self.completion_tokens += completion_tokens
+        if self.ms_per_output_token > 0:
+            await asyncio.sleep(completion_tokens * self.ms_per_output_token / 1000.0)
+        return response
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+def load_fake_llm(path: str):
+    with open(path, "r") as file:
+        return FakeLLMClient(**(yaml.safe_load(file) or {}))
@@ -1,99 +1,255 @@
 import os
 import ast
+import logging
 import networkx as nx
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 from matplotlib import pylab
 
-with open("configs/parse_ignores", "r") as f:
-    _IGNORE_LIST = f.read().splitlines()
+from src.pipeline import telemetry
+from src.pipeline import symbols
+from src.pipeline.ignore import IgnoreEngine
 
-def _should_ignore(path: str):
-    return path in _IGNORE_LIST
+logger = logging.getLogger(__name__)
 
-def _add_directories_to_graph(graph: nx.DiGraph, parent_dir: str, root_dir: str):
+# below this many files, spawning the process pool costs more than it saves
+_MIN_FILES_FOR_POOL = 32
+
+def _walk_repo(path: str, root_name: str, ignores: IgnoreEngine):
     """
-    Recursively traverses a directory and adds all subdirectories as nodes to a graph.
+    Walks the repository once with `os.scandir` and collects the package and
+    module nodes along with the Python files that need to be parsed. Ignored
+    directories, and `.git` in any case, are pruned without being entered.
 
     Args:
-    graph: The NetworkX graph to add nodes to.
-    root_dir: The path to the root directory.
+    path: The path to the root directory.
+    root_name: The name of the root node.
+    ignores: The ignore rules, which also count what they removed.
+
+    Returns:
+    A tuple of (package_edges, module_edges, py_files, init_files) where
+    py_files is a list of (module_node, file_path, path_relative_to_root)
+    tuples. init_files lists the ignored `__init__.py` files the same way,
+    they are only parsed for the names their package re-exports.
     """
-    for fs_item in os.listdir(root_dir):
-        item_path = os.path.join(root_dir, fs_item)
+    package_edges, module_edges, py_files, init_files = [], [], [], []
+    stack = [(path, root_name, "", None)]
+
+    while stack:
+        dir_path, parent_node, rel_dir, parent_scope = stack.pop()
+        with os.scandir(dir_path) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        scope = ignores.scope(rel_dir, dir_path, parent_scope, any(entry.name == ".gitignore" for entry in entries))
 
-        if os.path.isdir(item_path):
-            if _should_ignore(fs_item):
+        for entry in entries:
+            if entry.name == ".git":
+                # never walked whatever the rules say, a directory in a clone and a file in a worktree
                 continue
-            
-            node_name = fs_item if not parent_dir else f"{parent_dir}.{fs_item}"
-            graph.add_node(node_name)  # Add the directory as a node
-            graph.nodes[node_name]["type"] = "package"
-            if "." in node_name: graph.nodes[node_name]["type"] = "subpackage"
-
-            if parent_dir:
-                graph.add_edge(parent_dir, node_name)
-
-            _add_directories_to_graph(graph, node_name, item_path)  # Recursive call for subdirectories
-
-def _add_files_to_graph(graph: nx.DiGraph, root_name: str):
-    all_pkg_level_nodes = list(nx.dfs_preorder_nodes(graph, source=root_name))
-    for node in all_pkg_level_nodes:
-        dir_name = node.replace(".", "/")
-        for fs_item in os.listdir(dir_name):
-            fs_item_path = os.path.join(dir_name, fs_item)  
-            if os.path.isfile(fs_item_path) and not _should_ignore(fs_item):
-                fs_item = fs_item.split(".")[0]
-                graph.add_edge(node, f"{node}.{fs_item}")
-                graph.nodes[f"{node}.{fs_item}"]["type"] = "module"
-
-def _add_obj_to_graph(graph: nx.DiGraph, parent_name: str, file_path: str):
-    with open(file_path, "r") as f:
-        tree = ast.parse(f.read())
-
-    for tree_node in ast.walk(tree):
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            is_dir = entry.is_dir()
+            if ignores.is_ignored(scope, rel_path, is_dir):
+                if entry.name == "__init__.py" and not is_dir:
+                    init_files.append((f"{parent_node}.__init__", entry.path, rel_path))
+                continue
+
+            if is_dir:
+                node_name = f"{parent_node}.{entry.name}"
+                package_edges.append((parent_node, node_name))
+                stack.append((entry.path, node_name, rel_path, scope))
+            elif entry.is_file():
+                module_name = entry.name.split(".")[0]
+                node_name = f"{parent_node}.{module_name}"
+                module_edges.append((parent_node, node_name))
+                if entry.name == f"{module_name}.py":
+                    py_files.append((node_name, entry.path, rel_path))
+
+    return package_edges, module_edges, py_files, init_files
+
+def _source_span(tree_node, line_starts: list, rel_path: str):
+    # start at the beginning of the first line (including decorators) so that the
+    # text can be dedented when it is read back
+    start_line = min([tree_node.lineno] + [decorator.lineno for decorator in tree_node.decorator_list])
+    return {
+        "file": rel_path,
+        "lineno": start_line,
+        "end_lineno": tree_node.end_lineno,
+        "start_byte": line_starts[start_line - 1],
+        "end_byte": line_starts[tree_node.end_lineno - 1] + tree_node.end_col_offset,
+    }
+
+def _dotted_name(expr):
+    # `a.b.c` for Name/Attribute chains, None for calls on anything else
+    parts = []
+    while isinstance(expr, ast.Attribute):
+        parts.append(expr.attr)
+        expr = expr.value
+    if not isinstance(expr, ast.Name):
+        return None
+    parts.append(expr.id)
+    return ".".join(reversed(parts))
+
+def _import_aliases(tree_node, module_node: str):
+    """
+    Returns the (alias, target) pairs bound by an import statement. Relative
+    imports are resolved against the node of the importing module's package.
+    """
+    if isinstance(tree_node, ast.Import):
+        # `import a.b` binds `a`, the code then refers to `a.b` as a whole
+        return [(alias.asname or alias.name, alias.name) for alias in tree_node.names]
+
+    base = tree_node.module or ""
+    if tree_node.level > 0:
+        package = module_node.rsplit(".", tree_node.level)[0]
+        base = f"{package}.{base}" if base else package
+    return [(alias.asname or alias.name, f"{base}.{alias.name}") for alias in tree_node.names if alias.name != "*"]
+
+def _parse_file(parent_name: str, file_path: str, rel_path: str, collect_refs: bool = False):
+    """
+    Parses a single Python file and returns its classes and functions as a list
+    of (parent, node, attributes) tuples. Nodes only record the span of their
+    source in the file, see `source_reader.get_source`. This runs in the parse
+    worker processes, hence it does not touch the graph.
+
+    With `collect_refs`, the same pass also collects the import aliases of the
+    module and the names its nodes import, inherit from and call, for
+    `symbols.add_symbol_edges` to resolve once every file is parsed.
+
+    Returns:
+    A tuple of (objs, refs) where refs is None unless `collect_refs` is set,
+    otherwise an (aliases, refs) tuple of (module, alias, target) and
+    (source, edge_type, name, alias) lists.
+    """
+    with open(file_path, "rb") as f:
+        content = f.read()
+    tree = ast.parse(content)
+
+    line_starts = [0]
+    for line in content.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    objs, aliases, raw_refs = [], [], []
+    # breadth-first like `ast.walk`, tracking the node that references are
+    # attributed to, the class of a method's `self`, and the class that
+    # directly contains a def
+    todo = deque([(tree, parent_name, None, None)])
+    while todo:
+        tree_node, source, self_class, owner_class = todo.popleft()
+        child_source, child_self, child_owner = source, self_class, None
+
         if isinstance(tree_node, ast.FunctionDef):
             func_name = f"{parent_name}.{tree_node.name}"
-
-            graph.add_edge(parent_name, func_name)
-            graph.nodes[func_name]["type"] = "function"
-            graph.nodes[func_name]["source"] = ast.unparse(tree_node)
+            objs.append((parent_name, func_name, {"type": "function", **_source_span(tree_node, line_starts, rel_path)}))
+            child_source = f"{owner_class}.{tree_node.name}" if owner_class else func_name
+            child_self = owner_class or self_class
 
         elif isinstance(tree_node, ast.ClassDef):
             class_name = f"{parent_name}.{tree_node.name}"
-
-            graph.add_edge(parent_name, class_name)
-            graph.nodes[class_name]["type"] = "class"
-            graph.nodes[class_name]["source"] = ast.unparse(tree_node)
+            objs.append((parent_name, class_name, {"type": "class", **_source_span(tree_node, line_starts, rel_path)}))
 
             for class_node in tree_node.body:
                 if isinstance(class_node, ast.FunctionDef):
                     func_name = f"{class_name}.{class_node.name}"
+                    objs.append((class_name, func_name, {"type": "function", **_source_span(class_node, line_starts, rel_path)}))
+
+            child_source, child_self, child_owner = class_name, None, class_name
+            if collect_refs:
+                raw_refs.extend((class_name, symbols.INHERITS, _dotted_name(base), None) for base in tree_node.bases)
+
+        elif collect_refs and isinstance(tree_node, (ast.Import, ast.ImportFrom)):
+            for alias, target in _import_aliases(tree_node, parent_name):
+                aliases.append((parent_name, alias, target))
+                raw_refs.append((parent_name, symbols.IMPORTS, alias, alias))
+
+        elif collect_refs and isinstance(tree_node, ast.Call):
+            raw_refs.append((source, symbols.CALLS, _dotted_name(tree_node.func), self_class))
 
-                    graph.add_edge(class_name, func_name)
-                    graph.nodes[func_name]["type"] = "function"
-                    graph.nodes[func_name]["source"] = ast.unparse(class_node)
+        todo.extend((child, child_source, child_self, child_owner) for child in ast.iter_child_nodes(tree_node))
 
-    return graph
+    if not collect_refs:
+        return objs, None
 
-def _add_objs_to_graph(graph: nx.DiGraph, root_name: str):
-    all_nodes = list(nx.dfs_preorder_nodes(graph, source=root_name))
+    # only names bound at module level or by an import can refer to other
+    # nodes, everything else is a local variable or a builtin
+    local_names = {alias.split(".")[0] for _, alias, _ in aliases}
+    local_names.update(
+        tree_node.name for tree_node in tree.body if isinstance(tree_node, (ast.FunctionDef, ast.ClassDef))
+    )
+    refs = []
+    for source, edge_type, name, extra in raw_refs:
+        if name is None:
+            continue
+        head, _, rest = name.partition(".")
+        if edge_type == symbols.CALLS and head in ("self", "cls") and extra and rest:
+            refs.append((source, edge_type, f"{extra}.{rest}", None))
+        elif head in local_names:
+            refs.append((source, edge_type, f"{parent_name}.{name}", extra if edge_type == symbols.IMPORTS else None))
+    return objs, (aliases, refs)
 
-    for node in all_nodes:
-        file_path = node.replace(".", "/") + ".py"
+def _merge_objs(graph: nx.DiGraph, objs: list):
+    graph.add_edges_from((parent, node) for parent, node, _ in objs)
+    graph.add_nodes_from((node, attrs) for _, node, attrs in objs)
 
-        if os.path.isfile(file_path):
-            graph = _add_obj_to_graph(graph, node, file_path)
+def _add_obj_to_graph(graph: nx.DiGraph, parent_name: str, file_path: str, rel_path: str, collect_refs: bool = False):
+    """
+    Parses a single file into `graph` and returns its references, see `_parse_file`.
+    """
+    objs, refs = _parse_file(parent_name, file_path, rel_path, collect_refs)
+    _merge_objs(graph, objs)
+    return refs
+
+def _parse_files(py_files: list, parse_workers: int, collect_refs: bool = False):
+    if parse_workers <= 1 or len(py_files) < _MIN_FILES_FOR_POOL:
+        return [_parse_file(node, file_path, rel_path, collect_refs) for node, file_path, rel_path in py_files]
 
-def _parse_repo(path: str):
-    root_name = path.split("/")[-1]
-    print(root_name)
+    chunksize = max(1, len(py_files) // (parse_workers * 4))
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        nodes, file_paths, rel_paths = zip(*py_files)
+        return list(executor.map(
+            _parse_file, nodes, file_paths, rel_paths, [collect_refs] * len(py_files), chunksize=chunksize
+        ))
 
-    G = nx.DiGraph()    
+def _parse_repo(path: str, parse_workers: int = 1, symbol_edges: bool = False, ignores: IgnoreEngine = None):
+    root_name = os.path.basename(os.path.normpath(path))
+    logger.info("building the graph of %s", root_name)
 
+    G = nx.DiGraph(repo_path=os.path.abspath(path))
     G.add_node(root_name)
-    _add_directories_to_graph(G, root_name, path)
-    _add_files_to_graph(G, root_name)
-    _add_objs_to_graph(G, root_name)
+
+    with telemetry.span("build_graph.walk") as attrs:
+        ignores = ignores or IgnoreEngine.from_config()
+        package_edges, module_edges, py_files, init_files = _walk_repo(path, root_name, ignores)
+        removed = ignores.report()
+        attrs.update(
+            directories=len(package_edges), files=len(module_edges),
+            ignored_directories=sum(rule["dirs"] for rule in removed), ignored_files=sum(rule["files"] for rule in removed),
+        )
+
+    for rule in removed:
+        logger.info("ignore rule %r (%s) removed %d directories and %d files", rule["rule"], rule["source"], rule["dirs"], rule["files"])
+
+    G.add_edges_from(package_edges)
+    G.add_nodes_from((node, {"type": "subpackage"}) for _, node in package_edges)
+    G.add_edges_from(module_edges)
+    G.add_nodes_from((node, {"type": "module"}) for _, node in module_edges)
+
+    with telemetry.span("build_graph.parse", files=len(py_files), workers=parse_workers):
+        parsed_files = _parse_files(py_files, parse_workers, collect_refs=symbol_edges)
+
+    with telemetry.span("build_graph.merge") as attrs:
+        for objs, _ in parsed_files:
+            _merge_objs(G, objs)
+        attrs["nodes"] = G.number_of_nodes()
+
+    if symbol_edges:
+        with telemetry.span("build_graph.symbols") as attrs:
+            init_refs = [refs for _, refs in _parse_files(init_files, parse_workers, collect_refs=True)]
+            added = symbols.add_symbol_edges(G, [refs for _, refs in parsed_files] + init_refs)
+            attrs.update(added)
+        logger.info("resolved %s cross-module edges", dict(added))
+
+    logger.info("walked %d directories and %d files, parsed %d Python files with %d workers into %d nodes",
+                len(package_edges), len(module_edges), len(py_files), parse_workers, G.number_of_nodes())
 
     return root_name, G
 
@@ -114,8 +270,25 @@ def _save_graph(graph, file_name):
     pylab.close()
     del fig
 
-def build_graph(path: str, draw_graph: bool = True):
-    root_name, G = _parse_repo(path)
+def build_graph(path: str, draw_graph: bool = False, parse_workers: int = 1, symbol_edges: bool = False,
+                ignores: IgnoreEngine = None):
+    """
+    Builds the containment graph of the repository at `path`.
+
+    Args:
+    path: The path to the repository.
+    draw_graph: Whether to draw the graph to graph.png.
+    parse_workers: Number of processes used to parse the Python files.
+    symbol_edges: Also resolve imports, base classes and calls across the
+        repository into "imports", "inherits" and "calls" edges. Tree
+        traversals then go through `symbols.containment_view`.
+    ignores: The rules of the files and directories to leave out. Defaults
+        to `configs/parse_ignores` and the .gitignore files of the repository.
+
+    Returns:
+    A tuple of (root_name, graph).
+    """
+    root_name, G = _parse_repo(path, parse_workers, symbol_edges, ignores)
 
     if draw_graph:
         _save_graph(G, "graph.png")
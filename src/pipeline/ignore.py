@@ -0,0 +1,186 @@
+import os
+import re
+from collections import Counter
+
+# resolved from the package, not the working directory, so that every caller gets the same rules
+_DEFAULT_IGNORES_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "configs", "parse_ignores"))
+
+def _translate(pattern: str):
+    """
+    Translates a gitignore glob into a regex. "*" and "?" stay within a path
+    segment, "**/" matches any number of leading directories and a trailing
+    "/**" everything below a directory.
+    """
+    idx, parts = 0, []
+    while idx < len(pattern):
+        char = pattern[idx]
+        if pattern.startswith("**/", idx):
+            parts.append("(?:.*/)?")
+            idx += 3
+            continue
+        if pattern.startswith("**", idx):
+            # "dir/**" matches what is inside of dir, but not dir itself
+            parts.append(".+" if idx + 2 == len(pattern) and pattern[idx - 1:idx] == "/" else ".*")
+            idx += 2
+            continue
+
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[" and "]" in pattern[idx + 2:]:
+            end = pattern.index("]", idx + 2)
+            body = pattern[idx + 1:end].replace("\\", "\\\\")
+            parts.append("[^" + body[1:] + "]" if body.startswith("!") else "[" + body + "]")
+            idx = end
+        elif char == "\\" and idx + 1 < len(pattern):
+            idx += 1
+            parts.append(re.escape(pattern[idx]))
+        else:
+            parts.append(re.escape(char))
+        idx += 1
+    return "".join(parts)
+
+class IgnoreRule:
+    """
+    One line of an ignore file, or one --exclude / --include glob, with the
+    semantics of .gitignore: a leading "!" re-includes, a trailing "/" only
+    matches directories, and a pattern without a "/" matches at any depth
+    below `base`, the directory relative to the repository root the rule
+    was read from.
+    """
+    def __init__(self, pattern: str, source: str, base: str = ""):
+        self.pattern = pattern
+        self.source = source
+        self.negated = pattern.startswith("!")
+
+        glob = pattern[1:] if self.negated else pattern
+        dir_only = glob.endswith("/")
+        glob = glob.rstrip("/")
+        anchored = "/" in glob
+        glob = glob.lstrip("/")
+
+        prefix = re.escape(f"{base}/") if base else ""
+        self.regex = prefix + ("" if anchored else "(?:.*/)?") + _translate(glob) + ("/" if dir_only else "/?")
+
+    def __repr__(self):
+        return f"IgnoreRule({self.pattern!r}, {self.source!r})"
+
+def read_rules(path: str, source: str = None, base: str = ""):
+    """
+    Reads the rules of an ignore file, skipping blank lines and comments.
+    """
+    with open(path, "r", errors="replace") as file:
+        lines = file.read().splitlines()
+    source = source or path
+    return [
+        IgnoreRule(line.rstrip(), source, base) for line in lines
+        if line.strip() and not line.startswith("#")
+    ]
+
+class _Matcher:
+    # all rules of one directory scope compiled into a single regex, the
+    # highest priority rule first since an alternation takes the first match
+    def __init__(self, file_rules: list, cli_rules: list):
+        self.file_rules = file_rules
+        self.rules = file_rules + cli_rules
+        self.regex = re.compile("|".join(
+            f"(?P<r{idx}>{self.rules[idx].regex})" for idx in reversed(range(len(self.rules)))
+        )) if self.rules else None
+
+    def match(self, rel_path: str, is_dir: bool):
+        if self.regex is None:
+            return None
+        match = self.regex.fullmatch(rel_path + "/" if is_dir else rel_path)
+        return self.rules[int(match.lastgroup[1:])] if match else None
+
+class IgnoreEngine:
+    """
+    Decides which files and directories of a repository are left out of the
+    graph. Rules come from the project wide ignore file, the .gitignore files
+    of the repository (nested ones only apply to their own directory) and the
+    --exclude / --include globs, in increasing order of priority, and as in
+    git the last matching rule wins. --include globs re-include what the
+    other rules exclude.
+
+    An ignored directory is pruned as a whole during the walk. The number of
+    directories and files every rule removed is kept for `report`.
+
+    Args:
+    rules: The project wide rules.
+    exclude: Extra globs to ignore.
+    include: Globs to keep even when another rule ignores them.
+    gitignore: Whether to read the .gitignore files of the repository.
+    """
+    def __init__(self, rules: list = None, exclude: list = None, include: list = None, gitignore: bool = True):
+        self.gitignore = gitignore
+        self._cli_rules = [IgnoreRule(glob, "--exclude") for glob in exclude or []]
+        self._cli_rules += [IgnoreRule(f"!{glob.lstrip('!')}", "--include") for glob in include or []]
+        self._base_rules = list(rules or [])
+        self._matchers = {}
+        self.removed = Counter()
+
+    @classmethod
+    def from_config(cls, path: str = None, exclude: list = None, include: list = None, gitignore: bool = True):
+        """
+        Reads the project wide rules from `path`, `configs/parse_ignores` of
+        LayerLens by default, or uses none when `path` is "". A missing
+        file raises FileNotFoundError.
+        """
+        path = _DEFAULT_IGNORES_PATH if path is None else path
+        rules = read_rules(path, source=os.path.basename(path)) if path else []
+        return cls(rules, exclude, include, gitignore)
+
+    def scope(self, rel_dir: str, dir_path: str, parent=None, has_gitignore: bool = None):
+        """
+        Returns the matcher of a directory, which adds the rules of its own
+        .gitignore to the ones of `parent`. Directories without a .gitignore
+        share the compiled matcher of their parent.
+        """
+        if has_gitignore is None:
+            has_gitignore = os.path.isfile(os.path.join(dir_path, ".gitignore"))
+        has_gitignore = self.gitignore and has_gitignore
+        if parent is not None and not has_gitignore:
+            return parent
+
+        key = (rel_dir, id(parent))
+        if key not in self._matchers:
+            file_rules = parent.file_rules if parent is not None else self._base_rules
+            if has_gitignore:
+                source = f"{rel_dir}/.gitignore" if rel_dir else ".gitignore"
+                file_rules = file_rules + read_rules(os.path.join(dir_path, ".gitignore"), source, rel_dir)
+            self._matchers[key] = _Matcher(file_rules, self._cli_rules)
+        return self._matchers[key]
+
+    def is_ignored(self, matcher, rel_path: str, is_dir: bool):
+        rule = matcher.match(rel_path, is_dir)
+        if rule is None or rule.negated:
+            return False
+        self.removed[(rule.pattern, rule.source, "dirs" if is_dir else "files")] += 1
+        return True
+
+    def ignores_path(self, repo_path: str, rel_path: str):
+        """
+        Tells whether the file at `rel_path` is ignored, either itself or through
+        one of its directories, reading the .gitignore files along the way.
+        """
+        parts = rel_path.split("/")
+        matcher = self.scope("", repo_path)
+        for depth in range(1, len(parts)):
+            rel_dir = "/".join(parts[:depth])
+            if self.is_ignored(matcher, rel_dir, is_dir=True):
+                return True
+            matcher = self.scope(rel_dir, os.path.join(repo_path, rel_dir), matcher)
+        return self.is_ignored(matcher, rel_path, is_dir=False)
+
+    def report(self):
+        """
+        Returns the rules that removed anything, as dicts with the rule, where
+        it came from, and the number of directories and files it removed. Every
+        removed directory or file is one subpackage or module node less; the
+        contents of pruned directories are never visited.
+        """
+        rules = {}
+        for (pattern, source, kind), count in self.removed.items():
+            rules.setdefault((pattern, source), {"rule": pattern, "source": source, "dirs": 0, "files": 0})[kind] += count
+        return sorted(rules.values(), key=lambda rule: (-(rule["dirs"] + rule["files"]), rule["rule"]))
@@ -0,0 +1,160 @@
+import os
+import logging
+import networkx as nx
+
+from src.pipeline.parser_py import get_changed_files
+from src.pipeline.snapshot import read_graph
+from src.pipeline.utils import find_root
+from src.pipeline.graph_builder_py import _add_obj_to_graph
+from src.pipeline.ignore import IgnoreEngine
+from src.pipeline.symbols import CONTAINS, containment_view, add_symbol_edges
+
+logger = logging.getLogger(__name__)
+
+def _remove_subtree(graph: nx.DiGraph, node: str, keep_root: bool = False):
+    descendants = nx.descendants(containment_view(graph), node)
+    graph.remove_nodes_from(descendants)
+    if not keep_root:
+        graph.remove_node(node)
+
+def _module_node_name(root_name: str, rel_path: str):
+    parts = rel_path.split("/")
+    parts[-1] = parts[-1].split(".")[0]
+    return ".".join([root_name] + parts)
+
+def _ensure_package_nodes(graph: nx.DiGraph, root_name: str, rel_dirs: list):
+    parent = root_name
+    for rel_dir in rel_dirs:
+        node_name = f"{parent}.{rel_dir}"
+        if node_name not in graph:
+            graph.add_edge(parent, node_name)
+            graph.nodes[node_name]["type"] = "subpackage"
+        parent = node_name
+    return parent
+
+def _prune_empty_packages(graph: nx.DiGraph, root_name: str, path: str, node: str, dirty: set):
+    """
+    Removes subpackage nodes whose directory no longer exists after a deletion,
+    walking up towards the root. The first surviving ancestor is marked dirty.
+    """
+    tree = containment_view(graph)
+    while node != root_name and tree.out_degree(node) == 0:
+        rel_dir = node[len(root_name) + 1:].replace(".", "/")
+        if os.path.isdir(os.path.join(path, rel_dir)):
+            break
+        parent = next(tree.predecessors(node))
+        graph.remove_node(node)
+        dirty.discard(node)
+        node = parent
+    dirty.add(node)
+
+def _symbol_edges_into(graph: nx.DiGraph, module_node: str):
+    """
+    Returns the symbol edges from the rest of the graph into `module_node` and
+    its objects, so that they can be restored once the module is re-parsed.
+    """
+    subtree = nx.descendants(containment_view(graph), module_node) | {module_node}
+    return [
+        (source, target, data) for target in subtree for source, _, data in graph.in_edges(target, data=True)
+        if data.get("type", CONTAINS) != CONTAINS and source not in subtree
+    ]
+
+def _apply_change(graph: nx.DiGraph, root_name: str, path: str, status: str, rel_path: str, dirty: set,
+                  ignores: IgnoreEngine, file_refs: list = None, incoming_edges: list = None):
+    parts = rel_path.split("/")
+    if ignores.ignores_path(path, rel_path):
+        return
+
+    module_node = _module_node_name(root_name, rel_path)
+    tree = containment_view(graph)
+
+    if status == "D":
+        if module_node in graph:
+            parent = next(tree.predecessors(module_node))
+            _remove_subtree(graph, module_node)
+            dirty.discard(module_node)
+            _prune_empty_packages(graph, root_name, path, parent, dirty)
+        return
+
+    if module_node in graph:
+        # drop the stale objects of the module, they are re-parsed below
+        if file_refs is not None:
+            incoming_edges.extend(_symbol_edges_into(graph, module_node))
+            graph.remove_edges_from([
+                (module_node, target) for _, target, edge_type in graph.out_edges(module_node, data="type")
+                if edge_type not in (None, CONTAINS)
+            ])
+        _remove_subtree(graph, module_node, keep_root=True)
+        graph.nodes[module_node].clear()
+    else:
+        parent = _ensure_package_nodes(graph, root_name, parts[:-1])
+        graph.add_edge(parent, module_node)
+    graph.nodes[module_node]["type"] = "module"
+
+    file_path = os.path.join(path, rel_path)
+    if file_path.endswith(".py") and os.path.isfile(file_path):
+        refs = _add_obj_to_graph(graph, module_node, file_path, rel_path, collect_refs=file_refs is not None)
+        if refs is not None:
+            file_refs.append(refs)
+
+    dirty.add(module_node)
+    dirty.update(nx.descendants(tree, module_node))
+
+def update_graph(snapshot_path: str, path: str, base_commit: str = None, ignores: IgnoreEngine = None):
+    """
+    Brings a previous NLA graph snapshot up to date with the repository at `path`.
+
+    Only the files that changed since `base_commit` are re-parsed. The changed
+    nodes and all of their ancestors are marked dirty and lose their stored NLA,
+    while every other node keeps its annotation.
+
+    Args:
+    snapshot_path: Path to a previous `*_nla.graphml` or `*_nla.llsnap` snapshot.
+    path: Path to the checkout of the repository at the new commit.
+    base_commit: The commit the snapshot was built from. Defaults to the
+        commit recorded in the snapshot.
+    ignores: The rules of the files to leave out, as for `build_graph`.
+
+    Returns:
+    A tuple of (root_name, graph, dirty_nodes).
+    """
+    graph = read_graph(snapshot_path)
+    graph.graph["repo_path"] = os.path.abspath(path)
+    root_name = find_root(graph)
+
+    base_commit = base_commit or graph.graph.get("commit")
+    if not base_commit:
+        raise ValueError(f"{snapshot_path} does not record the commit it was built from, pass it explicitly")
+
+    # the imports, base classes and calls of the changed modules are resolved
+    # again, and the edges other modules had into them are kept where their
+    # targets still exist
+    symbol_edges = bool(graph.graph.get("symbol_edges"))
+    file_refs = [] if symbol_edges else None
+    incoming_edges = [] if symbol_edges else None
+
+    ignores = ignores or IgnoreEngine.from_config()
+    dirty = set()
+    for status, rel_path in get_changed_files(path, base_commit):
+        _apply_change(graph, root_name, path, status, rel_path, dirty, ignores, file_refs, incoming_edges)
+
+    if symbol_edges:
+        add_symbol_edges(graph, file_refs)
+        graph.add_edges_from(
+            (source, target, data) for source, target, data in incoming_edges
+            if source in graph and target in graph and not graph.has_edge(source, target)
+        )
+
+    tree = containment_view(graph)
+    for node in list(dirty):
+        dirty.update(nx.ancestors(tree, node))
+
+    for node in graph.nodes:
+        if node in dirty:
+            graph.nodes[node].pop("nla", None)
+            graph.nodes[node].pop("processed", None)
+        else:
+            graph.nodes[node]["processed"] = True
+
+    logger.info("%d of %d nodes need to be re-annotated", len(dirty), graph.number_of_nodes())
+    return root_name, graph, dirty
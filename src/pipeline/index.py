@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import math
+import zlib
+import importlib
+import numpy as np
+from collections import Counter
+
+from src.pipeline.symbols import containment_view
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "with", "what", "which", "do", "does",
+}
+
+def tokenize(text: str):
+    """
+    Splits identifiers and prose into lowercase terms. Dotted paths, snake_case
+    and CamelCase identifiers are broken into their parts.
+    """
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return [term for term in re.findall(r"[a-z0-9]+", text.lower()) if term not in _STOPWORDS]
+
+class HashingEmbedder:
+    """
+    Local embedder that hashes terms and term bigrams into a fixed number of
+    dimensions. Needs no model download and is deterministic across runs.
+    """
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            terms = tokenize(text)
+            for feature in terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]:
+                digest = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+def load_embedder(name: str):
+    """
+    Resolves the --index-embedder option: "none", "hashing", or "module:callable"
+    for a custom embedder that maps a list of texts to an (n, dim) array.
+    """
+    if name in (None, "", "none"):
+        return None
+    if name == "hashing":
+        return HashingEmbedder()
+
+    module_name, attr = name.split(":")
+    embedder = getattr(importlib.import_module(module_name), attr)
+    return embedder() if isinstance(embedder, type) else embedder
+
+def _node_text(graph, node):
+    # identifiers are repeated so that name matches outweigh a passing mention in prose
+    name = " ".join(node.split(".")[1:])
+    return f"{name} {name} {graph.nodes[node].get('nla', '')}"
+
+def index_path_for(graph_path: str):
+    return os.path.splitext(graph_path)[0] + ".index.json"
+
+class NLAIndex:
+    """
+    BM25 inverted index over node identifiers and NLAs, optionally combined with
+    dense vectors from a local embedder. Used to narrow a query down to a small
+    candidate set before any LLM relevance call.
+    """
+    _VERSION = 1
+
+    def __init__(self, embedder=None, k1: float = 1.5, b: float = 0.75):
+        self.embedder = embedder
+        self.k1 = k1
+        self.b = b
+        self.docs = {}
+        self.doc_lens = {}
+        self.postings = {}
+        self.total_len = 0
+        self.vectors = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, node):
+        return node in self.docs
+
+    def add(self, node, text: str):
+        self.remove(node)
+        counts = Counter(tokenize(text))
+        self.docs[node] = counts
+        self.doc_lens[node] = sum(counts.values())
+        self.total_len += self.doc_lens[node]
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[node] = tf
+
+    def remove(self, node):
+        counts = self.docs.pop(node, None)
+        self.vectors.pop(node, None)
+        if counts is None:
+            return
+        self.total_len -= self.doc_lens.pop(node)
+        for term in counts:
+            self.postings[term].pop(node, None)
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def update_from_graph(self, graph, nodes=None):
+        """
+        (Re-)indexes `nodes` of `graph`, or every node when `nodes` is None, and
+        drops indexed nodes that are no longer part of the graph.
+        """
+        for node in [node for node in self.docs if node not in graph]:
+            self.remove(node)
+
+        nodes = list(graph.nodes if nodes is None else nodes)
+        texts = [_node_text(graph, node) for node in nodes]
+        for node, text in zip(nodes, texts):
+            self.add(node, text)
+
+        if self.embedder is not None and nodes:
+            for node, vector in zip(nodes, self.embedder(texts)):
+                self.vectors[node] = np.asarray(vector, dtype=np.float32)
+
+    def _bm25(self, terms):
+        scores = Counter()
+        num_docs = len(self.docs)
+        avg_len = self.total_len / num_docs if num_docs else 0.0
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for node, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[node] / avg_len) if avg_len else self.k1
+                scores[node] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 50, alpha: float = 0.5):
+        """
+        Returns the `top_k` best matching (node, score) pairs. With an embedder,
+        the max-normalized BM25 score and the cosine similarity are mixed with
+        weight `alpha` on the latter.
+        """
+        scores = self._bm25(tokenize(query))
+        if scores:
+            best = max(scores.values())
+            scores = Counter({node: score / best for node, score in scores.items()})
+
+        if self.embedder is not None and self.vectors:
+            nodes = list(self.vectors)
+            matrix = np.stack([self.vectors[node] for node in nodes])
+            similarities = matrix @ np.asarray(self.embedder([query])[0], dtype=np.float32)
+            for node, similarity in zip(nodes, similarities):
+                scores[node] = (1 - alpha) * scores.get(node, 0.0) + alpha * float(similarity)
+
+        return scores.most_common(top_k)
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            json.dump({"version": self._VERSION, "k1": self.k1, "b": self.b, "docs": self.docs}, file)
+
+        vectors_path = os.path.splitext(path)[0] + ".npz"
+        if self.vectors:
+            nodes = list(self.vectors)
+            np.savez(vectors_path, nodes=np.array(nodes), vectors=np.stack([self.vectors[node] for node in nodes]))
+        elif os.path.exists(vectors_path):
+            os.remove(vectors_path)
+
+    @classmethod
+    def load(cls, path: str, embedder=None):
+        with open(path, "r") as file:
+            data = json.load(file)
+        if data["version"] != cls._VERSION:
+            raise ValueError(f"{path} uses index version {data['version']}, expected {cls._VERSION}")
+
+        index = cls(embedder=embedder, k1=data["k1"], b=data["b"])
+        for node, counts in data["docs"].items():
+            counts = Counter(counts)
+            index.docs[node] = counts
+            index.doc_lens[node] = sum(counts.values())
+            index.total_len += index.doc_lens[node]
+            for term, tf in counts.items():
+                index.postings.setdefault(term, {})[node] = tf
+
+        vectors_path = os.path.splitext(path)[0] + ".npz"
+        if embedder is not None and os.path.exists(vectors_path):
+            stored = np.load(vectors_path)
+            index.vectors = {str(node): vector for node, vector in zip(stored["nodes"], stored["vectors"])}
+        return index
+
+def build_index(graph, embedder=None):
+    index = NLAIndex(embedder=embedder)
+    index.update_from_graph(graph)
+    return index
+
+def candidate_nodes(graph, index, query: str, top_k: int = 50):
+    """
+    Returns the `top_k` best index matches for `query` together with all of
+    their ancestors, so that a top-down traversal can still reach them.
+    """
+    tree = containment_view(graph)
+    candidates = set()
+    for node, _ in index.search(query, top_k=top_k):
+        if node in graph and node not in candidates:
+            candidates.add(node)
+            parents = list(tree.predecessors(node))
+            while parents and parents[0] not in candidates:
+                candidates.add(parents[0])
+                parents = list(tree.predecessors(parents[0]))
+    return candidates
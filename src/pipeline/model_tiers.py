@@ -0,0 +1,124 @@
+import logging
+import importlib
+
+from src.pipeline.utils import load_gen_configs
+
+logger = logging.getLogger(__name__)
+
+# node types tiers are routed by, the root node has no "type" attribute and counts as the package
+NODE_TYPES = ("function", "class", "module", "subpackage", "package")
+
+_REFUSALS = ("i'm sorry", "i am sorry", "i cannot", "i can't", "as an ai")
+
+def is_valid_nla(nla, min_chars: int = 40):
+    """
+    The default validator of the escalation step. Rejects responses that are
+    not text, are shorter than `min_chars`, read like a refusal, or were cut
+    off inside a code block.
+    """
+    if not isinstance(nla, str):
+        return False
+    text = nla.strip()
+    if len(text) < min_chars or text.lower().startswith(_REFUSALS):
+        return False
+    return text.count("```") % 2 == 0
+
+def load_validator(name: str, min_chars: int = 40):
+    """
+    Resolves the "validator" of a tier: "default" for `is_valid_nla`, or
+    "module:callable" for a custom function of the response returning a bool.
+    """
+    if name in (None, "", "default"):
+        return lambda nla: is_valid_nla(nla, min_chars)
+
+    module_name, attr = name.split(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+class ModelTier:
+    """
+    One entry of the --model-tiers option.
+
+    Args:
+    model: The model the requests of the tier are sent to.
+    types: Node types the tier applies to. Defaults to every type.
+    max_prompt_tokens: Largest prompt the tier applies to. Defaults to any size.
+    gen_configs: The generation config of the model.
+    escalate_to: The tier a response failing `validate` is sent to again, or None.
+    validate: Function of the response telling whether it is usable.
+    name: Name of the tier in the logs and metrics.
+    """
+    def __init__(self, model: str, types: list = None, max_prompt_tokens: int = None, gen_configs: dict = None,
+                 escalate_to=None, validate=None, name: str = None):
+        self.model = model
+        self.types = set(types) if types is not None else None
+        self.max_prompt_tokens = max_prompt_tokens
+        self.gen_configs = gen_configs or {}
+        self.escalate_to = escalate_to
+        self.validate = validate or is_valid_nla
+        self.name = name or model
+
+    def matches(self, node_type: str, prompt_tokens: int):
+        return (self.types is None or node_type in self.types) and \
+            (self.max_prompt_tokens is None or prompt_tokens <= self.max_prompt_tokens)
+
+class ModelRouter:
+    """
+    Picks the model of every NLA request by the type of the node and the size
+    of the prompt, e.g. a fast model for the many small functions and classes
+    and a stronger one for modules and packages. Tiers are tried in order and
+    requests no tier matches go to `default`, the --service-llm-model.
+    """
+    def __init__(self, tiers: list, default: ModelTier):
+        self.tiers = tiers
+        self.default = default
+
+    def route(self, node_type: str, prompt_tokens: int):
+        for tier in self.tiers:
+            if tier.matches(node_type, prompt_tokens):
+                return tier
+        return self.default
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Builds the router of the --model-tiers option, a list of dicts such as
+        {"types": ["function", "class"], "max_prompt_tokens": 2000,
+        "model": "gpt-4o-mini", "escalate": true}. A tier may also set
+        "gen_config_path", "name", "escalate_to" (a model, --service-llm-model
+        by default, which also turns escalation on), "validator" and
+        "min_chars", see `load_validator`.
+        """
+        default = ModelTier(args.service_llm_model, gen_configs=args.service_llm_gen_configs, name="default")
+
+        tiers = []
+        for idx, config in enumerate(args.model_tiers or []):
+            config = dict(config)
+            if "model" not in config:
+                raise ValueError(f"model tier {idx} has no \"model\"")
+            unknown_types = set(config.get("types") or []) - set(NODE_TYPES)
+            if unknown_types:
+                raise ValueError(f"model tier {idx} has unknown node types {sorted(unknown_types)}, expected {NODE_TYPES}")
+
+            gen_config_path = config.pop("gen_config_path", None)
+            gen_configs = load_gen_configs(gen_config_path, args.service_llm_provider) if gen_config_path \
+                else args.service_llm_gen_configs
+
+            escalate_to = None
+            escalate_model = config.pop("escalate_to", None)
+            if config.pop("escalate", False) or escalate_model:
+                escalate_model = escalate_model or args.service_llm_model
+                escalate_to = ModelTier(escalate_model, gen_configs=args.service_llm_gen_configs, name=f"{escalate_model} (escalated)")
+            validate = load_validator(config.pop("validator", None), config.pop("min_chars", 40))
+
+            try:
+                tiers.append(ModelTier(
+                    gen_configs=gen_configs, escalate_to=escalate_to, validate=validate,
+                    name=config.pop("name", f"tier {idx}"), **config,
+                ))
+            except TypeError as exc:
+                raise ValueError(f"model tier {idx} is invalid: {exc}") from exc
+
+            logger.info("model tier %r: %s for %s nodes with prompts of up to %s tokens%s",
+                        tiers[-1].name, tiers[-1].model, config.get("types") or "all", config.get("max_prompt_tokens") or "any",
+                        f", escalating to {escalate_to.model}" if escalate_to else "")
+        return cls(tiers, default)
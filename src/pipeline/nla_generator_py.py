@@ -1,188 +1,545 @@
 import os
-import glob
 import toml
-import yaml
-import imageio
+import imageio.v2 as imageio
 import asyncio
+import logging
+import contextlib
 import networkx as nx
-import matplotlib.pyplot as plt
 from string import Template
-from matplotlib import pylab
 
-from genai_apis import APIFactory
-from src.pipeline.utils import create_pydantic_class_from_yaml
+from src.pipeline import telemetry
+from src.pipeline.cache import NLACache
+from src.pipeline.model_tiers import ModelRouter
+from src.pipeline.checkpoint import NLACheckpoint, checkpoint_path_for, restore_checkpoint
+from src.pipeline.progress_renderer import ProgressRenderer
+from src.pipeline.source_reader import has_source, get_source
+from src.pipeline.symbols import containment_view
+from src.pipeline.utils import setup_service_llm, load_gen_configs, resolve_gen_config_path, parse_structured_output, count_tokens
+
+logger = logging.getLogger(__name__)
 
 prompt_tmpls = toml.load("configs/prompts.toml")
 
-async def _generate_nla(graph, node, out_neighbors, client, model, gen_configs):
-    dependencies = ""
+# generation configs of batched requests, with the `annotations` schema in the form of each provider
+_NLA_BATCH_GEN_CONFIG_PATHS = {
+    "openai": "configs/nla_batch_gpt_gen_configs.yaml",
+    "gemini": "configs/nla_batch_gemini_gen_configs.yaml",
+    "anthropic": "configs/nla_batch_anthropic_gen_configs.yaml",
+    "fake": "configs/nla_batch_gpt_gen_configs.yaml",
+}
+
+def _render_sub_prompt(graph, out_neighbor, prefer_nla=False):
+    if has_source(graph, out_neighbor) and not (prefer_nla and "nla" in graph.nodes[out_neighbor]):
+        sub_prompt_tmpl = prompt_tmpls["nla_generation"]["source_sub_prompt"]
+        content = get_source(graph, out_neighbor)
+    elif "nla" in graph.nodes[out_neighbor]:
+        sub_prompt_tmpl = prompt_tmpls["nla_generation"]["nla_sub_prompt"]
+        content = graph.nodes[out_neighbor]["nla"]
+    else:
+        return None
+    return Template(sub_prompt_tmpl).safe_substitute(dependency_node=out_neighbor, content=content)
+
+def _dependency_parts(graph, out_neighbors, token_budget=None):
+    """
+    Renders one sub prompt per dependency as [node, text, tokens]. When they
+    exceed `token_budget` together, dependencies that already have an NLA are
+    switched from their raw source to the NLA, largest source first.
+    """
+    parts = []
     for out_neighbor in out_neighbors:
-        if "source" in graph.nodes[out_neighbor]:
-            sub_prompt_tmpl = prompt_tmpls["nla_generation"]["source_sub_prompt"]
-            sub_prompt = Template(sub_prompt_tmpl).safe_substitute(
-                dependency_node=out_neighbor, content=graph.nodes[out_neighbor]["source"]
-            )
-            dependencies += sub_prompt
-        elif "nla" in graph.nodes[out_neighbor]:
-            sub_prompt_tmpl = prompt_tmpls["nla_generation"]["nla_sub_prompt"]
-            sub_prompt = Template(sub_prompt_tmpl).safe_substitute(
-                dependency_node=out_neighbor, content=graph.nodes[out_neighbor]["nla"]
+        sub_prompt = _render_sub_prompt(graph, out_neighbor)
+        if sub_prompt is not None:
+            parts.append([out_neighbor, sub_prompt, count_tokens(sub_prompt)])
+
+    total_tokens = sum(tokens for _, _, tokens in parts)
+    if token_budget is None or total_tokens <= token_budget:
+        return parts
+
+    for part in sorted(parts, key=lambda part: part[2], reverse=True):
+        if total_tokens <= token_budget:
+            break
+        if has_source(graph, part[0]) and "nla" in graph.nodes[part[0]]:
+            sub_prompt = _render_sub_prompt(graph, part[0], prefer_nla=True)
+            tokens = count_tokens(sub_prompt)
+            if tokens < part[2]:
+                total_tokens += tokens - part[2]
+                part[1], part[2] = sub_prompt, tokens
+    return parts
+
+def _render_dependencies(graph, out_neighbors, token_budget=None):
+    return "".join(text for _, text, _ in _dependency_parts(graph, out_neighbors, token_budget))
+
+def _truncate(text, token_budget):
+    tokens = count_tokens(text)
+    if tokens <= token_budget:
+        return text, tokens
+    text = text[:len(text) * token_budget // tokens] + "\n... (truncated)\n"
+    return text, count_tokens(text)
+
+def _chunk_parts(parts, token_budget):
+    """
+    Packs rendered parts into as few chunks of at most `token_budget` tokens as
+    possible, keeping their order. A single part over the budget is truncated.
+    """
+    chunks, chunk, chunk_tokens = [], "", 0
+    for _, text, tokens in parts:
+        if tokens > token_budget:
+            text, tokens = _truncate(text, token_budget)
+        if chunk and chunk_tokens + tokens > token_budget:
+            chunks.append(chunk)
+            chunk, chunk_tokens = "", 0
+        chunk += text
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _render_prompt(node, dependencies):
+    prompt_tmpl = prompt_tmpls["nla_generation"]["full_prompt"]
+    return Template(prompt_tmpl).safe_substitute(node=node, dependencies=dependencies)
+
+async def _request_nla(prompt, client, model, gen_configs, cache=None, tier=None):
+    """
+    Requests the NLA of a rendered prompt, from the cache if possible. With a
+    `tier` that escalates, a response failing the tier's validator is not
+    cached and the prompt is sent again to the model it escalates to.
+    """
+    escalate = tier is not None and tier.escalate_to is not None
+    nla = None
+    if cache is not None:
+        cache_key = cache.make_key(prompt, model, gen_configs)
+        nla = cache.get(cache_key)
+
+    if nla is None:
+        logger.debug(prompt)
+        with telemetry.span("llm.call", prompt_tokens=count_tokens(prompt), model=model) as attrs:
+            nla = await client.generate_text(
+                model, prompt=prompt, **gen_configs
             )
-            dependencies += sub_prompt
+            attrs["completion_tokens"] = count_tokens(nla if isinstance(nla, str) else str(nla))
+        telemetry.count("llm.calls")
+        telemetry.count("llm.prompt_tokens", attrs["prompt_tokens"])
+        telemetry.count("llm.completion_tokens", attrs["completion_tokens"])
+
+        if cache is not None and isinstance(nla, str) and not (escalate and not tier.validate(nla)):
+            cache.put(cache_key, nla)
+
+    if escalate and not tier.validate(nla):
+        logger.debug("escalating a response of %s to %s", model, tier.escalate_to.model)
+        telemetry.count("nla.escalations")
+        return await _request_nla(prompt, client, tier.escalate_to.model, tier.escalate_to.gen_configs, cache)
+    return nla
 
-    prompt_tmpl = prompt_tmpls["nla_generation"]["full_prompt"]
-    prompt = Template(prompt_tmpl).safe_substitute(node=node, dependencies=dependencies)
+def _node_type(graph, node):
+    return graph.nodes[node].get("type", "package")
+
+async def _generate_nla(graph, node, out_neighbors, client, model, gen_configs, cache=None, token_budget=None, router=None):
+    """
+    Generates the NLA of `node` from its dependencies. Dependencies that do not
+    fit in `token_budget` even as NLAs are map-reduced: every chunk of them is
+    summarized on its own, and the summaries (chunked and summarized again if
+    they still do not fit) are combined into the NLA. The tokens of every
+    prompt sent for the node are recorded as its "prompt_tokens" attribute.
+    With a `router`, every prompt goes to the model of its tier instead of
+    `model`, and the tier of the final prompt is recorded as "model_tier".
+    """
+    def __request(prompt):
+        if router is None:
+            return _request_nla(prompt, client, model, gen_configs, cache)
+        tier = router.route(_node_type(graph, node), count_tokens(prompt))
+        graph.nodes[node]["model_tier"] = tier.name
+        return _request_nla(prompt, client, tier.model, tier.gen_configs, cache, tier=tier)
+
+    parts = _dependency_parts(graph, out_neighbors, token_budget)
+    if token_budget is None or sum(tokens for _, _, tokens in parts) <= token_budget:
+        prompt = _render_prompt(node, "".join(text for _, text, _ in parts))
+        graph.nodes[node]["prompt_tokens"] = count_tokens(prompt)
+        return await __request(prompt)
+
+    prompt_tokens = 0
+    chunks = _chunk_parts(parts, token_budget)
+    while True:
+        prompts = [
+            Template(prompt_tmpls["nla_generation"]["chunk_prompt"]).safe_substitute(
+                node=node, part=idx + 1, parts=len(chunks), dependencies=chunk
+            )
+            for idx, chunk in enumerate(chunks)
+        ]
+        prompt_tokens += sum(count_tokens(prompt) for prompt in prompts)
+        logger.debug("map-reducing %s over %d chunks", node, len(chunks))
+        summaries = await asyncio.gather(*[__request(prompt) for prompt in prompts])
+
+        summary_parts = []
+        for idx, summary in enumerate(summaries):
+            text = Template(prompt_tmpls["nla_generation"]["summary_sub_prompt"]).safe_substitute(
+                part=idx + 1, content=summary
+            )
+            summary_parts.append([None, text, count_tokens(text)])
 
-    print(prompt)
+        next_chunks = _chunk_parts(summary_parts, token_budget)
+        if len(next_chunks) == 1 or len(next_chunks) >= len(chunks):
+            break
+        chunks = next_chunks
 
-    nla = await client.generate_text(
-        model, prompt=prompt, **gen_configs
+    prompt = Template(prompt_tmpls["nla_generation"]["reduce_prompt"]).safe_substitute(
+        node=node, summaries=next_chunks[0] if len(next_chunks) == 1 else "".join(next_chunks)
     )
-
-    return nla
-
-def _setup_service_llm(args):
-    service_llm_kwargs = {
-        "api_key": args.service_llm_api_key,
-        "GCP_PROJECT_ID": args.gcp_project_id,
-        "GCP_PROJECT_LOCATION": args.gcp_location,
-        "AWS_REGION": args.aws_location,
-    }
-
-    with open(args.service_llm_gen_config_path, 'r') as file:
-        service_llm_gen_configs = yaml.safe_load(file)
-
-    if args.service_llm_provider == "openai":
-        if "schema" in service_llm_gen_configs:
-            service_llm_gen_configs["response_format"] = create_pydantic_class_from_yaml(service_llm_gen_configs["schema"])
-            del service_llm_gen_configs["schema"]
-    elif args.service_llm_provider == "gemini":
-        if "schema" in service_llm_gen_configs:
-            service_llm_gen_configs["response_schema"] = service_llm_gen_configs["schema"]
-            del service_llm_gen_configs["schema"]
-    elif args.service_llm_provider == "anthropic":
-        if "schema" in service_llm_gen_configs:
-            service_llm_gen_configs["tool_choice"] = service_llm_gen_configs["schema"]["tool_choice"]
-            service_llm_gen_configs["tools"] = service_llm_gen_configs["schema"]["tools"]
-            del service_llm_gen_configs["schema"]
-
-    service_llm_client = APIFactory.get_api_client(args.service_llm_provider, **service_llm_kwargs)
-    return (service_llm_client, service_llm_gen_configs)
+    graph.nodes[node]["prompt_tokens"] = prompt_tokens + count_tokens(prompt)
+    return await __request(prompt)
+
+async def _generate_nla_batch(node_dependencies, client, model, gen_configs, cache=None, batch_gen_configs=None):
+    """
+    Annotates several nodes with a single structured-output request.
+
+    Args:
+    node_dependencies: A dict of node -> rendered dependencies, see `_render_dependencies`.
+    gen_configs: The generation config of single-node requests.
+    batch_gen_configs: The generation config of the batch request, with the
+        `annotations` structured output schema. Defaults to `gen_configs`.
+
+    Returns:
+    A dict of node -> nla. Every node is cached under the key of its own
+    single-node prompt, and nodes the batch response does not cover are
+    requested again one by one, concurrently.
+    """
+    prompts = {node: _render_prompt(node, dependencies) for node, dependencies in node_dependencies.items()}
+    nlas = {}
+    if cache is not None:
+        for node, prompt in prompts.items():
+            nla = cache.get(cache.make_key(prompt, model, gen_configs))
+            if nla is not None:
+                nlas[node] = nla
+
+    pending = [node for node in node_dependencies if node not in nlas]
+    if len(pending) > 1:
+        items = "".join(
+            Template(prompt_tmpls["nla_generation"]["batch_item"]).safe_substitute(
+                node=node, dependencies=node_dependencies[node]
+            )
+            for node in pending
+        )
+        prompt = Template(prompt_tmpls["nla_generation"]["batch_prompt"]).safe_substitute(nodes=items)
+
+        logger.debug(prompt)
+        try:
+            with telemetry.span("llm.call", prompt_tokens=count_tokens(prompt), batch_size=len(pending)) as attrs:
+                response = await client.generate_text(model, prompt=prompt, **(batch_gen_configs or gen_configs))
+                attrs["completion_tokens"] = count_tokens(response if isinstance(response, str) else str(response))
+            telemetry.count("llm.calls")
+            telemetry.count("llm.prompt_tokens", attrs["prompt_tokens"])
+            telemetry.count("llm.completion_tokens", attrs["completion_tokens"])
+            response = parse_structured_output(response)
+        except Exception:
+            # e.g. a provider rejecting the structured output schema
+            logger.warning("batched request of %d nodes failed, annotating them one by one", len(pending), exc_info=True)
+            response = {}
+        for annotation in response.get("annotations", response.get("items", [])):
+            if isinstance(annotation, dict) and annotation.get("node") in pending and annotation.get("nla"):
+                nlas[annotation["node"]] = str(annotation["nla"])
+                if cache is not None:
+                    cache.put(cache.make_key(prompts[annotation["node"]], model, gen_configs), nlas[annotation["node"]])
+
+    missing = [node for node in pending if node not in nlas]
+    nlas.update(zip(missing, await asyncio.gather(*[
+        _request_nla(prompts[node], client, model, gen_configs, cache) for node in missing
+    ])))
+    return nlas
 
 def _make_gif(filenames, output_filename, duration=1000):
-    images = []
-    for filename in filenames:
-        images.append(imageio.imread(filename))
-    imageio.mimsave(output_filename, images, duration=duration)
+    # frames are appended one at a time instead of being loaded all at once
+    with imageio.get_writer(output_filename, mode="I", duration=duration) as writer:
+        for filename in filenames:
+            writer.append_data(imageio.imread(filename))
+
+def _traverse_priorities(graph, root_node, parents, priority):
+    """
+    Computes the dispatch priority of every node for the ready queue. Lower
+    values are dispatched first.
+
+    Args:
+    graph: The NetworkX graph to traverse.
+    root_node: The root package node.
+    parents: The parent map built by `_build_traverse_index`.
+    priority: "fifo" dispatches nodes in the order they become ready.
+        "critical-path" dispatches nodes with the longest chain of ancestors
+        left to the root first, breaking ties by the size of the subtree
+        they belong to, so the deepest and largest subtrees start early.
+    """
+    if priority == "fifo":
+        return {node: (0,) for node in graph.nodes}
+
+    if priority != "critical-path":
+        raise ValueError(f"Unknown traverse priority: {priority}")
+
+    depths = nx.single_source_shortest_path_length(graph, root_node)
+    subtree_sizes = {}
+    for node in reversed(list(nx.dfs_preorder_nodes(graph, source=root_node))):
+        subtree_sizes[node] = 1 + sum(subtree_sizes[child] for child in graph.successors(node))
+
+    priorities = {}
+    for node in graph.nodes:
+        enclosing_size = subtree_sizes[parents.get(node, node)]
+        priorities[node] = (-depths[node], -enclosing_size)
+    return priorities
+
+def _build_traverse_index(graph, root_node, nodes=None):
+    """
+    Builds the parent map and resets the "children_to_be_processed" counters
+    once, so that completing a node is a constant-time update instead of a
+    path search over a reversed copy of the graph.
+
+    Args:
+    graph: The NetworkX graph to traverse.
+    root_node: The root package node.
+    nodes: The nodes to (re-)annotate. Defaults to every node. Children outside
+        of this set are considered done already and are not waited on.
+    """
+    parents = {}
+    for parent_node, child_node in nx.bfs_edges(graph, root_node):
+        parents[child_node] = parent_node
 
-def _display_progress(graph, filename, seed=1):
-    node_colors = []
     for node in graph.nodes:
-        if "processed" in graph.nodes[node]:
-            node_colors.append('green')  # Processed nodes in green
+        if nodes is None:
+            graph.nodes[node]["children_to_be_processed"] = graph.out_degree(node)
+        elif node in nodes:
+            graph.nodes[node]["children_to_be_processed"] = sum(1 for child in graph.successors(node) if child in nodes)
+        else:
+            graph.nodes[node]["children_to_be_processed"] = 0
+
+    return parents
+
+async def _nla_processings(graph, root_node, nodes, args, renderer=None):
+    """
+    Streams nodes through a fixed pool of async workers. A parent is put on the
+    ready queue the moment its last child finishes, so one slow LLM call only
+    holds up its own ancestors instead of the whole next level of the tree.
+    """
+    parents = _build_traverse_index(graph, root_node, nodes)
+    router = getattr(args, "nla_router", None)
+    priorities = _traverse_priorities(graph, root_node, parents, args.traverse_priority)
+    ready_queue = asyncio.PriorityQueue()
+    sequence = 0
+    in_flight = 0
+
+    # ready non-leaf nodes grouped by parent, the candidates for batched requests
+    ready_siblings = {}
+    batched_nodes = set()
+
+    def __enqueue(node, priority=None):
+        nonlocal sequence
+        ready_queue.put_nowait((priority or priorities[node], sequence, node))
+        sequence += 1
+        if args.nla_batch_size > 1 and node is not None and node != root_node and graph.out_degree(node) > 0:
+            ready_siblings.setdefault(parents[node], {})[node] = None
+
+    def __take_batch(node):
+        """
+        Groups `node` with other ready siblings into one request, within the
+        node count and token limits of the batch.
+        """
+        if args.nla_batch_size <= 1 or node == root_node or graph.out_degree(node) == 0:
+            return {node: None}
+
+        siblings = ready_siblings.get(parents[node], {})
+        siblings.pop(node, None)
+        dependencies = _render_dependencies(graph, list(graph.successors(node)), args.nla_prompt_token_budget)
+        tokens = count_tokens(dependencies)
+        if args.nla_prompt_token_budget is not None and tokens > args.nla_prompt_token_budget:
+            # map-reduced on its own
+            return {node: None}
+        batch = {node: dependencies}
+
+        for sibling in list(siblings):
+            if len(batch) >= args.nla_batch_size or tokens >= args.nla_batch_max_tokens:
+                break
+            dependencies = _render_dependencies(graph, list(graph.successors(sibling)), args.nla_prompt_token_budget)
+            if tokens + count_tokens(dependencies) > args.nla_batch_max_tokens:
+                continue
+            del siblings[sibling]
+            batched_nodes.add(sibling)
+            batch[sibling] = dependencies
+            tokens += count_tokens(dependencies)
+        return batch
+
+    def ___record_tokens(node):
+        data = graph.nodes[node]
+        data["completion_tokens"] = count_tokens(str(data["nla"]))
+        telemetry.event(
+            "node", node=node, type=data.get("type"), model_tier=data.get("model_tier"),
+            prompt_tokens=data.get("prompt_tokens"), completion_tokens=data["completion_tokens"],
+        )
+
+    async def ___annotate(batch):
+        if len(batch) > 1:
+            logger.debug("annotating %s with one request", list(batch))
+            nlas = await _generate_nla_batch(
+                batch, args.service_llm, args.service_llm_model, args.service_llm_gen_configs, cache=args.nla_cache,
+                batch_gen_configs=getattr(args, "service_llm_batch_gen_configs", None),
+            )
+            for node, nla in nlas.items():
+                graph.nodes[node]["nla"] = nla
+                graph.nodes[node]["prompt_tokens"] = count_tokens(_render_prompt(node, batch[node]))
+                ___record_tokens(node)
+            return
+
+        node = next(iter(batch))
+        out_neighbors = list(graph.successors(node))
+        if len(out_neighbors) > 0:
+            logger.debug("annotating %s from %d dependencies", node, len(out_neighbors))
+            graph.nodes[node]["nla"] = await _generate_nla(
+                graph, node, out_neighbors, args.service_llm, args.service_llm_model, args.service_llm_gen_configs,
+                cache=args.nla_cache, token_budget=args.nla_prompt_token_budget, router=router
+            )
+            ___record_tokens(node)
         else:
-            node_colors.append('red')  # Unprocessed nodes in red
-
-    # Initialize Figure
-    plt.figure(num=None, figsize=(30, 30), dpi=200)
-    plt.axis('off')
-    fig = plt.figure(1)
-
-    # Use spring_layout with seed for consistent positions
-    pos = nx.nx_pydot.graphviz_layout(graph, prog="neato")
-
-    # Draw nodes, edges, and labels
-    nx.draw_networkx_nodes(graph, pos, node_color=node_colors, node_size=800)
-    nx.draw_networkx_edges(graph, pos)
-    nx.draw_networkx_labels(graph, pos, labels={node: node.split(".")[-1] for node in graph.nodes})
-
-    plt.savefig(filename, bbox_inches="tight")
-    pylab.close()
-    del fig
-
-async def _nla_processings(graph, root_node, nodes, args, count=0):
-    semaphore = asyncio.Semaphore(args.workers)
-    completed_tasks = 0
-
-    async def __worker(node):
-        nonlocal count, completed_tasks
-        async def ___node(graph, root, node):
-            # print(f"Processing node: {node}, out_neighbors: {out_neighbors}")
-            # print(len(out_neighbors))
-            out_neighbors = list(graph.successors(node))
-            if len(out_neighbors) > 0:
-                print(1, node, len(out_neighbors))
-                graph.nodes[node]["nla"] = await _generate_nla(
-                    graph, node, out_neighbors, args.service_llm, args.service_llm_model, args.service_llm_gen_configs
-                )
-            else:
-                print(2, node, len(out_neighbors))
-
-            if node != root:
-                graph.nodes[node]["processed"] = True
-                path_to_root = nx.shortest_path(graph.reverse(), source=node, target=root)
-                parent_node = path_to_root[1]
-
-                if "children_to_be_processed" not in graph.nodes[parent_node]:
-                    graph.nodes[parent_node]["children_to_be_processed"] = len(list(graph.successors(parent_node)))
-                
-                graph.nodes[parent_node]["children_to_be_processed"] -= 1
-                return parent_node
-            else:
-                print(1)
-                graph.nodes[node]["processed"] = True
-                return node
-        
-        async with semaphore:
-            results = await ___node(graph, root_node, node)
-            completed_tasks += 1
-            if args.save_graph_animation and completed_tasks % args.workers == 0: 
-                count += 1
-                _display_progress(graph, f"{args.graph_imgs_path}/{root_node}/step_{count}.png")
-            return results
-
-    nla_tasks = [__worker(node) for node in nodes]
-    result_nodes = set(await asyncio.gather(*nla_tasks))
-    return result_nodes, count
-
-def _get_remained_nodes(graph, root_node, nodes):
-    if len(nodes) == 1 and list(nodes)[0] == root_node:
-        return set()
-    
-    remained_nodes = set()
-    for node in nodes:
-        if graph.nodes[node]["children_to_be_processed"] > 0:
-            remained_nodes.add(node)
-    return nodes - remained_nodes
-
-async def _dynamic_traverse(graph, root_node, args):
-    count = 0
-    leaf_nodes = [node for node in graph.nodes if graph.out_degree(node) == 0]
-
-    os.makedirs(f"{args.graph_imgs_path}/{root_node}", exist_ok=True)
-    if args.save_graph_animation: _display_progress(graph, f"{args.graph_imgs_path}/{root_node}/step_{count}.png")
-
-    result_nodes, count = await _nla_processings(graph, root_node, leaf_nodes, args, count)
-    remained_nodes = _get_remained_nodes(graph, root_node, result_nodes)
-    if args.save_graph_animation: _display_progress(graph, f"{args.graph_imgs_path}/{root_node}/step_{count+1}.png")
-
-    while remained_nodes:
-        result_nodes, count = await _nla_processings(graph, root_node, remained_nodes, args, count+2)
-        remained_nodes = _get_remained_nodes(graph, root_node, result_nodes)
-
-    graph.nodes[root_node]["processed"] = True
-    if args.save_graph_animation: _display_progress(graph, f"{args.graph_imgs_path}/{root_node}/step_{count+1}.png")
+            logger.debug("%s has no dependencies", node)
+
+    def ___complete(node):
+        graph.nodes[node]["processed"] = True
+        if node == root_node:
+            return None
+
+        parent_node = parents[node]
+        graph.nodes[parent_node]["children_to_be_processed"] -= 1
+        if graph.nodes[parent_node]["children_to_be_processed"] == 0:
+            return parent_node
+        return None
+
+    async def __worker():
+        nonlocal in_flight
+        while True:
+            _, _, node = await ready_queue.get()
+            if node is None:
+                return
+            if node in batched_nodes:
+                # already annotated as part of a sibling's batch
+                batched_nodes.discard(node)
+                continue
+
+            batch = __take_batch(node)
+            # a batch run shares its worker slots between the traversals of all of its repositories
+            slot = args.nla_slot() if getattr(args, "nla_slot", None) else contextlib.nullcontext()
+            async with slot:
+                in_flight += 1
+                telemetry.gauge("nla.queue_depth", ready_queue.qsize())
+                telemetry.gauge("nla.in_flight", in_flight)
+                try:
+                    with telemetry.span("nla.task", node=node, batch_size=len(batch)):
+                        await ___annotate(batch)
+                finally:
+                    in_flight -= 1
+
+            for batch_node in batch:
+                ready_node = ___complete(batch_node)
+                if args.checkpoint is not None:
+                    args.checkpoint.record(batch_node, graph.nodes[batch_node])
+                if renderer is not None:
+                    renderer.snapshot(graph)
+
+                if ready_node is not None:
+                    __enqueue(ready_node)
+                elif batch_node == root_node:
+                    for _ in range(args.workers):
+                        __enqueue(None, priority=(float("inf"),))
+
+    for node in (graph.nodes if nodes is None else nodes):
+        if graph.nodes[node]["children_to_be_processed"] == 0:
+            __enqueue(node)
+
+    workers = [asyncio.create_task(__worker()) for _ in range(args.workers)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+def _make_renderer(graph, root_node, args):
+    if not args.save_graph_animation:
+        return None
+    if 0 < args.graph_animation_max_nodes < graph.number_of_nodes():
+        logger.warning(
+            "not animating the progress of %d nodes, raise --graph-animation-max-nodes (0 for no limit) to opt in",
+            graph.number_of_nodes(),
+        )
+        return None
+    return ProgressRenderer(graph, f"{args.graph_imgs_path}/{root_node}", max_fps=args.graph_animation_max_fps)
+
+async def _dynamic_traverse(graph, root_node, args, nodes=None):
+    if nodes is not None and len(nodes) == 0:
+        return graph
+
+    # parents are annotated from their children only, not from what they import or call
+    tree = containment_view(graph)
+    renderer = _make_renderer(tree, root_node, args)
+    if renderer is not None:
+        renderer.snapshot(tree, force=True)
+
+    try:
+        await _nla_processings(tree, root_node, nodes, args, renderer)
+    finally:
+        if renderer is not None:
+            renderer.snapshot(tree, force=True)
+            args.graph_animation_frames = renderer.close()
 
     return graph
 
-async def generate_nla(graph, root_node, args):
-    service_llm, service_llm_gen_configs = _setup_service_llm(args)
-    args.service_llm, args.service_llm_gen_configs = service_llm, service_llm_gen_configs
-    graph = await _dynamic_traverse(graph, root_node, args)
-
-    if args.save_graph_animation:
-        filenames = glob.glob(f"{args.graph_imgs_path}/{root_node}/step_*.png")
-        filenames.sort(key=lambda x: int(x.split("_")[-1].split(".")[0]))
-        _make_gif(filenames, f"{args.graph_imgs_path}/{root_node}/graph_progress.gif", duration=args.graph_animation_duration_per_step*1000)
+async def generate_nla(graph, root_node, args, dirty_nodes=None):
+    # a batch run sets up one client, and with it one rate limiter, for all of its repositories
+    if getattr(args, "service_llm", None) is None:
+        args.service_llm, args.service_llm_gen_configs = setup_service_llm(args)
+    args.nla_router = ModelRouter.from_args(args) if getattr(args, "model_tiers", None) else None
+    if args.nla_batch_size > 1 and args.nla_router is not None:
+        # a batch is one request to one model, while tiers pick the model node by node
+        logger.warning("--nla-batch-size is ignored with --model-tiers, nodes are annotated one by one")
+        args.nla_batch_size = 1
+    if args.nla_batch_size > 1 and getattr(args, "service_llm_batch_gen_configs", None) is None:
+        batch_gen_config_path = resolve_gen_config_path(
+            getattr(args, "nla_batch_gen_config_path", None), args.service_llm_provider,
+            _NLA_BATCH_GEN_CONFIG_PATHS, "--nla-batch-gen-config-path",
+        )
+        args.service_llm_batch_gen_configs = load_gen_configs(batch_gen_config_path, args.service_llm_provider)
+    args.nla_cache = None
+    args.graph_animation_frames = None
+    if args.nla_prompt_token_budget is not None and args.nla_prompt_token_budget <= 0:
+        args.nla_prompt_token_budget = None
+    if not args.disable_nla_cache:
+        args.nla_cache = NLACache(args.nla_cache_path, max_size_mb=args.nla_cache_max_size_mb)
+
+    args.checkpoint = None
+    if args.checkpoint_dir:
+        checkpoint_path = checkpoint_path_for(args.checkpoint_dir, root_node)
+        resume = args.resume and os.path.exists(checkpoint_path)
+        if resume:
+            # continue only the frontier the interrupted run did not complete
+            restored = restore_checkpoint(graph, root_node, checkpoint_path, graph.graph.get("commit"))
+            dirty_nodes = set(graph.nodes if dirty_nodes is None else dirty_nodes) - restored
+        args.checkpoint = NLACheckpoint(
+            checkpoint_path, root_node, commit=graph.graph.get("commit"), resume=resume,
+            flush_every=args.checkpoint_every, flush_interval=args.checkpoint_interval,
+        )
+
+    try:
+        with telemetry.span("generate_nla.traverse"):
+            graph = await _dynamic_traverse(graph, root_node, args, nodes=dirty_nodes)
+    finally:
+        if args.checkpoint is not None:
+            args.checkpoint.close()
+        if args.nla_cache is not None:
+            cache_stats = args.nla_cache.stats()
+            logger.info("NLA cache: %s", cache_stats)
+            telemetry.count("nla_cache.hits", cache_stats["hits"])
+            telemetry.count("nla_cache.misses", cache_stats["misses"])
+            telemetry.gauge("nla_cache.hit_rate", cache_stats["hit_rate"])
+            telemetry.gauge("nla_cache.entries", cache_stats["entries"])
+            args.nla_cache.close()
+        if hasattr(args.service_llm, "stats"):
+            logger.info("Service LLM: %s", args.service_llm.stats())
+
+    if args.graph_animation_frames:
+        with telemetry.span("export", kind="animation"):
+            _make_gif(
+                args.graph_animation_frames, f"{args.graph_imgs_path}/{root_node}/graph_progress.gif",
+                duration=args.graph_animation_duration_per_step*1000
+            )
 
     return graph
\ No newline at end of file
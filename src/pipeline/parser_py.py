@@ -1,24 +1,157 @@
 import os
+import re
 import git
+import fcntl
+import shutil
+import hashlib
+import contextlib
+
+_CLONE_CACHE_DIR = ".layerlens_cache/repos"
+
+@contextlib.contextmanager
+def _locked(lock_path: str):
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _repo_name(repo_url: str):
+    repo_name = repo_url.rstrip("/").split("/")[-1]
+    return repo_name[:-len(".git")] if repo_name.endswith(".git") else repo_name
+
+def _has_commit(repo, ref: str):
+    if not ref or not re.fullmatch(r"[0-9a-f]{40}", ref):
+        return False
+    try:
+        repo.git.cat_file("-e", f"{ref}^{{commit}}")
+        return True
+    except git.GitCommandError:
+        return False
+
+def _ensure_commit(repo, commit: str):
+    """
+    Makes sure that `commit` is in the repository. Shallow clones of the
+    clone cache only hold the commits that were checked out, so a missing
+    commit is fetched from origin, on its own if the server allows it.
+    """
+    try:
+        repo.git.cat_file("-e", f"{commit}^{{commit}}")
+        return
+    except git.GitCommandError:
+        if "origin" not in [remote.name for remote in repo.remotes]:
+            raise
+
+    try:
+        repo.git.fetch("--depth", "1", "--no-tags", "origin", commit)
+    except git.GitCommandError:
+        # some servers refuse to serve a commit by its SHA, fall back to the full history
+        _fetch_history(repo)
+
+def _fetch_history(repo):
+    # a plain fetch does not deepen a shallow clone, commits behind the branch tips would stay missing
+    options = ["--unshallow"] if repo.git.rev_parse("--is-shallow-repository") == "true" else []
+    repo.git.fetch(*options, "--no-tags", "origin")
+
+def _fetch_ref(repo, ref: str = None):
+    try:
+        repo.git.fetch("--depth", "1", "--no-tags", "origin", ref or "HEAD")
+        target = "FETCH_HEAD"
+    except git.GitCommandError:
+        if not ref:
+            raise
+        # some servers refuse to serve a commit by its SHA, fall back to the full history
+        _fetch_history(repo)
+        target = ref
+    repo.git.checkout("--force", "--detach", target)
+    repo.git.clean("-ffdx")
+
+def _clone_repo(repo_url: str, ref: str = None, cache_dir: str = _CLONE_CACHE_DIR):
+    """
+    Checks out `repo_url` at `ref` in a clone cache keyed by the URL. Only the
+    requested commit is fetched (shallow, single ref), and an existing checkout
+    is reused with a fetch of the new commits, or no fetch at all when `ref` is
+    a commit it already has. Concurrent runs on the same URL are serialized
+    with a file lock.
+
+    Args:
+    repo_url: The URL of the repository.
+    ref: A branch, tag or full commit SHA. Defaults to the remote HEAD.
+    cache_dir: Directory of the clone cache.
+
+    Returns:
+    The path to the checkout, <cache_dir>/<hash of the URL>/<repo name>.
+    """
+    key = hashlib.sha256(repo_url.encode("utf-8")).hexdigest()[:16]
+    repo_path = os.path.abspath(os.path.join(cache_dir, key, _repo_name(repo_url)))
+    os.makedirs(os.path.dirname(repo_path), exist_ok=True)
+
+    with _locked(os.path.join(cache_dir, f"{key}.lock")):
+        try:
+            repo = git.Repo(repo_path)
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+            shutil.rmtree(repo_path, ignore_errors=True)
+            repo = git.Repo.init(repo_path)
+            repo.create_remote("origin", repo_url)
+
+        if _has_commit(repo, ref):
+            repo.git.checkout("--force", "--detach", ref)
+            repo.git.clean("-ffdx")
+        else:
+            _fetch_ref(repo, ref)
 
-def _clone_repo(repo_url: str):
-    repo_name = repo_url.split("/")[-1]
-    repo_name = repo_name.split(".")[0]
-    repo_path = os.path.join(os.getcwd(), repo_name)
-    git.Repo.clone_from(repo_url, repo_path)
     return repo_path
 
 def _is_github_url(path: str):
     return path.startswith("https://github.com/")
 
-def parse_repo(path: str):
+def parse_repo(path: str, ref: str = None, cache_dir: str = _CLONE_CACHE_DIR):
     # 1. determine if the path is a local directory or a GitHub URL
     if _is_github_url(path):
-        # 2. clone the repository
-        path = _clone_repo(path)
+        # 2. clone the repository, or update the cached clone
+        path = _clone_repo(path, ref=ref, cache_dir=cache_dir)
 
     # raise error if the path is not a valid directory
     if not os.path.isdir(path):
         raise ValueError(f"The path {path} is not a valid directory")
 
-    return path
\ No newline at end of file
+    return path
+
+def get_head_commit(path: str):
+    """
+    Returns the commit SHA checked out at `path`, or None if `path` is not
+    inside a git repository.
+    """
+    try:
+        return git.Repo(path, search_parent_directories=True).head.commit.hexsha
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError, ValueError):
+        return None
+
+def get_changed_files(path: str, base_commit: str, target_commit: str = "HEAD"):
+    """
+    Lists the files that changed between two commits of the repository at `path`.
+    Renames are reported as a deletion of the old path plus an addition of the new one.
+    A base commit missing from a shallow checkout is fetched first.
+
+    Returns:
+    A list of (status, relative_path) tuples where status is one of "A", "M", "D".
+    """
+    repo = git.Repo(path, search_parent_directories=True)
+    _ensure_commit(repo, base_commit)
+    diff = repo.git.diff("--name-status", "--no-renames", base_commit, target_commit, "--", ".")
+
+    # paths are reported relative to the top-level of the git repository
+    prefix = os.path.relpath(os.path.abspath(path), repo.working_tree_dir)
+    prefix = "" if prefix == "." else prefix + "/"
+
+    changes = []
+    for line in diff.splitlines():
+        if not line.strip():
+            continue
+        status, file_path = line.split("\t", 1)
+        if prefix and not file_path.startswith(prefix):
+            continue
+        # type changes (T) and other statuses are treated as modifications
+        changes.append((status[0] if status[0] in "AD" else "M", file_path[len(prefix):]))
+    return changes
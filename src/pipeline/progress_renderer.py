@@ -0,0 +1,116 @@
+import os
+import glob
+import time
+import logging
+import numpy as np
+import networkx as nx
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+logger = logging.getLogger(__name__)
+
+# graph drawing state of the render process, set once by `_init_render_process`
+_FRAME = None
+
+def compute_layout(graph, seed: int = 1):
+    """
+    Computes the node positions shared by every frame. Uses graphviz's neato
+    when it is installed, and networkx's spring layout otherwise.
+    """
+    try:
+        return nx.nx_pydot.graphviz_layout(graph, prog="neato")
+    except (OSError, ImportError):
+        return nx.spring_layout(graph, seed=seed)
+
+def _init_render_process(positions, segments, labels, figsize, dpi):
+    global _FRAME
+    _FRAME = (positions, segments, labels, figsize, dpi)
+
+def _render_frame(filename, processed):
+    positions, segments, labels, figsize, dpi = _FRAME
+
+    # pyplot keeps global state, a bare Agg figure does not
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.axis("off")
+    ax.add_collection(LineCollection(segments, colors="gray", linewidths=0.5, zorder=1))
+    ax.scatter(positions[:, 0], positions[:, 1], c=np.where(processed, "green", "red"), s=40, zorder=2)
+    if labels is not None:
+        for (x, y), label in zip(positions, labels):
+            ax.annotate(label, (x, y), fontsize=6, ha="center", va="bottom")
+    ax.autoscale_view()
+    fig.savefig(filename)
+    return filename
+
+class ProgressRenderer:
+    """
+    Renders the annotation progress as PNG frames from a separate process, so
+    that drawing never blocks the event loop. The layout is computed once, and
+    every frame is rendered from a snapshot of the "processed" flags.
+
+    Args:
+    graph: The graph being annotated.
+    output_dir: Directory the step_<n>.png frames are written to. Frames left
+        over from a previous run are removed.
+    max_fps: Maximum number of frames per second of annotation time.
+    max_pending: Frames waiting to be rendered beyond which new ones are dropped.
+    max_labels: Graphs up to this many nodes get node labels.
+    dpi: Resolution of the frames.
+    """
+    def __init__(self, graph, output_dir: str, max_fps: float = 2.0, max_pending: int = 4,
+                 max_labels: int = 200, dpi: int = 100):
+        self.output_dir = output_dir
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.max_pending = max_pending
+        self.nodes = list(graph.nodes)
+        self.frames = []
+        self._futures = []
+        self._last_frame = None
+
+        os.makedirs(output_dir, exist_ok=True)
+        for filename in glob.glob(os.path.join(output_dir, "step_*.png")):
+            os.remove(filename)
+
+        layout = compute_layout(graph)
+        positions = np.array([layout[node] for node in self.nodes], dtype=float).reshape(-1, 2)
+        index = {node: idx for idx, node in enumerate(self.nodes)}
+        segments = [(positions[index[u]], positions[index[v]]) for u, v in graph.edges]
+        labels = [node.split(".")[-1] for node in self.nodes] if len(self.nodes) <= max_labels else None
+        size = min(30.0, max(8.0, len(self.nodes) ** 0.5 / 2))
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=1, initializer=_init_render_process,
+            initargs=(positions, segments, labels, (size, size), dpi),
+        )
+
+    def snapshot(self, graph, force: bool = False):
+        """
+        Queues a frame of the current progress, unless the frame rate cap or the
+        number of pending frames says to skip it. `force` always queues one.
+        """
+        now = time.monotonic()
+        if not force:
+            if self._last_frame is not None and now - self._last_frame < self.min_interval:
+                return
+            if sum(not future.done() for future in self._futures) >= self.max_pending:
+                return
+        self._last_frame = now
+
+        processed = np.fromiter(("processed" in graph.nodes[node] for node in self.nodes), dtype=bool, count=len(self.nodes))
+        filename = os.path.join(self.output_dir, f"step_{len(self.frames)}.png")
+        self.frames.append(filename)
+        self._futures.append(self._executor.submit(_render_frame, filename, processed))
+
+    def close(self):
+        """
+        Waits for the pending frames and returns the frame filenames in order.
+        """
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._executor.shutdown()
+        return self.frames
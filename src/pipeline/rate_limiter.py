@@ -0,0 +1,205 @@
+import re
+import time
+import yaml
+import random
+import asyncio
+import logging
+
+from src.pipeline import telemetry
+from src.pipeline.utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+_THROTTLE_NAMES = ("RateLimit", "ResourceExhausted", "Throttl", "TooManyRequests")
+_TRANSIENT_NAMES = ("Timeout", "APIConnection", "ServiceUnavailable", "InternalServer", "Overloaded", "DeadlineExceeded")
+
+def _status_code(exc):
+    for candidate in (exc, getattr(exc, "response", None)):
+        for attr in ("status_code", "status", "code"):
+            value = getattr(candidate, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+def is_throttle_error(exc):
+    """
+    Tells whether `exc` is the provider pushing back (HTTP 429 or the SDK's
+    rate limit / quota exception), which is when the concurrency backs off.
+    """
+    if _status_code(exc) == 429:
+        return True
+    name = type(exc).__name__
+    return any(part in name for part in _THROTTLE_NAMES) or re.search(r"\b429\b", str(exc)) is not None
+
+def is_retryable_error(exc):
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)) or is_throttle_error(exc):
+        return True
+    status_code = _status_code(exc)
+    if status_code is not None and status_code >= 500:
+        return True
+    return any(part in type(exc).__name__ for part in _TRANSIENT_NAMES)
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` units per minute, holding
+    at most `capacity` units (a full minute worth by default). Waiters are
+    served in arrival order.
+    """
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def consume(self, amount: float):
+        """
+        Charges `amount` without waiting, e.g. for output tokens only known once
+        the response arrived. The bucket may go into debt, delaying later calls.
+        """
+        self._refill()
+        self.tokens -= amount
+
+class AIMDLimiter:
+    """
+    Concurrency limit with additive increase and multiplicative decrease: every
+    successful call grows the limit by about one per limit-many calls, every
+    throttled call shrinks it by `decrease`.
+    """
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = None, decrease: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = maximum or initial
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, throttled: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+class RateLimitedClient:
+    """
+    Wraps a service LLM client from `APIFactory` so that `generate_text` stays
+    within the provider's requests and tokens per minute, adapts its
+    concurrency to throttling, times out stuck calls and retries transient
+    failures with jittered exponential backoff instead of failing the run.
+
+    Args:
+    client: The wrapped client, anything with an async `generate_text(model, prompt, **kwargs)`.
+    requests_per_minute: Request quota. None for no limit.
+    tokens_per_minute: Token quota. Prompt tokens are charged before the call,
+        output tokens once the response arrived. None for no limit.
+    max_concurrency: Upper bound of concurrent calls.
+    min_concurrency: Lower bound the concurrency backs off to.
+    initial_concurrency: Concurrency to start with. Defaults to `max_concurrency`.
+    max_retries: Retries of a call after its first attempt.
+    base_delay: Backoff before the first retry in seconds, doubled on every retry.
+    max_delay: Cap of the backoff in seconds.
+    timeout: Per-call timeout in seconds. None for no timeout.
+    """
+    def __init__(self, client, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_concurrency: int = 16, min_concurrency: int = 1, initial_concurrency: int = None,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0, timeout: float = 120.0):
+        self.client = client
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AIMDLimiter(initial_concurrency or max_concurrency, min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.timeouts = 0
+
+    def _backoff(self, attempt, exc):
+        retry_after = getattr(exc, "retry_after", None)
+        if isinstance(retry_after, (int, float)) and retry_after > 0:
+            return min(self.max_delay, float(retry_after))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def generate_text(self, model, prompt, **kwargs):
+        prompt_tokens = count_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None:
+                await self.tokens.acquire(prompt_tokens)
+
+            await self.concurrency.acquire()
+            telemetry.gauge("llm.in_flight", self.concurrency.in_flight)
+            telemetry.gauge("llm.concurrency_limit", self.concurrency.limit)
+            throttled = False
+            try:
+                self.calls += 1
+                response = await asyncio.wait_for(
+                    self.client.generate_text(model, prompt=prompt, **kwargs), timeout=self.timeout
+                )
+            except Exception as exc:
+                if isinstance(exc, asyncio.TimeoutError):
+                    self.timeouts += 1
+                throttled = is_throttle_error(exc)
+                if throttled:
+                    self.throttled += 1
+                if not is_retryable_error(exc) or attempt == self.max_retries:
+                    raise
+                delay, error_name = self._backoff(attempt, exc), type(exc).__name__
+            else:
+                if self.tokens is not None:
+                    self.tokens.consume(count_tokens(response if isinstance(response, str) else str(response)))
+                return response
+            finally:
+                await self.concurrency.release(throttled=throttled)
+
+            self.retries += 1
+            telemetry.count("llm.retries")
+            if throttled:
+                telemetry.count("llm.throttled")
+            logger.warning("retrying service LLM call in %.1fs after %s (%d/%d)", delay, error_name, attempt + 1, self.max_retries)
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "timeouts": self.timeouts,
+            "concurrency": round(self.concurrency.limit, 2),
+        }
+
+def load_rate_limits(path: str, provider: str):
+    """
+    Reads the rate limit settings of `provider` from the YAML file at `path`,
+    on top of its "default" section.
+    """
+    with open(path, "r") as file:
+        configs = yaml.safe_load(file) or {}
+    rate_limits = dict(configs.get("default") or {})
+    rate_limits.update(configs.get(provider) or {})
+    return rate_limits
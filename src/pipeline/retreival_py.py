@@ -0,0 +1,122 @@
+import re
+import toml
+import asyncio
+from string import Template
+
+from src.pipeline.source_reader import has_source, get_source
+from src.pipeline.utils import parse_structured_output, find_root
+from src.pipeline.symbols import containment_view, symbol_dependencies
+
+prompt_tmpls = toml.load("configs/prompts.toml")
+
+def _node_context(graph, node, repo_path=None):
+    data = graph.nodes[node]
+    if "nla" in data:
+        context_tmpl = prompt_tmpls["retrieval"]["nla_context"]
+        content = data["nla"]
+    elif has_source(graph, node):
+        context_tmpl = prompt_tmpls["retrieval"]["source_context"]
+        content = get_source(graph, node, repo_path)
+    else:
+        return None
+    return Template(context_tmpl).safe_substitute(node=node, content=content)
+
+def _parse_score(response):
+    parsed = parse_structured_output(response)
+    if "score" in parsed:
+        return float(parsed["score"]), parsed.get("reason", "")
+    if "relevance" in parsed:
+        return (10.0 if parsed["relevance"] else 0.0), parsed.get("reason", "")
+
+    # free-form answer, take the first number as the score
+    match = re.search(r"\d+(\.\d+)?", str(response))
+    return (float(match.group()) if match else 0.0), str(response)
+
+async def _score_node(graph, node, query, client, model, gen_configs, repo_path=None):
+    context = _node_context(graph, node, repo_path)
+    if context is None:
+        return None
+
+    prompt = Template(prompt_tmpls["retrieval"]["relevance_prompt"]).safe_substitute(
+        node=node, query=query, context=context
+    )
+    response = await client.generate_text(model, prompt=prompt, **gen_configs)
+    return _parse_score(response)
+
+async def retrieve(graph, query, client, model, gen_configs,
+                   root_node=None, beam_width=3, max_depth=8, min_score=5, workers=4, repo_path=None,
+                   candidates=None):
+    """
+    Retrieves the code nodes relevant to `query` by descending the graph top-down
+    with beam search. At every level only the children of the nodes kept in the
+    beam are scored, and only the `beam_width` best scoring ones are kept, so
+    pruned subtrees are never scored and the number of LLM calls grows with
+    beam_width * depth rather than with the size of the graph.
+
+    Args:
+    graph: The NLA graph built by `generate_nla`.
+    query: The natural language query.
+    client: The service LLM client.
+    model: The service LLM model.
+    gen_configs: Generation configs of the service LLM.
+    root_node: The root package node. Defaults to the only node without parents.
+    beam_width: Number of nodes kept at every level.
+    max_depth: Maximum number of levels to descend.
+    min_score: Nodes scoring below this (0-10) are pruned.
+    workers: Maximum number of concurrent LLM calls.
+    repo_path: Path to the repository checkout, for reading source code.
+    candidates: Optional set of nodes pre-selected by the local index (see
+        `index.candidate_nodes`). Nodes outside of it are never scored.
+
+    Returns:
+    A tuple of (results, llm_calls) where results is a list of dicts with the
+    node, its type, score, reason and source, best first. On graphs built with
+    symbol edges, the callees and base classes of every node are listed as
+    its dependencies.
+    """
+    root_node = root_node or find_root(graph)
+    tree = containment_view(graph)
+    semaphore = asyncio.Semaphore(workers)
+    llm_calls = 0
+
+    async def __score(node):
+        nonlocal llm_calls
+        async with semaphore:
+            scored = await _score_node(graph, node, query, client, model, gen_configs, repo_path)
+        if scored is not None:
+            llm_calls += 1
+        return node, scored
+
+    results = []
+    frontier = [root_node]
+    for depth in range(max_depth):
+        children = [child for node in frontier for child in tree.successors(node)]
+        if candidates is not None:
+            children = [child for child in children if child in candidates]
+        if not children:
+            break
+
+        ranked = []
+        for node, result in await asyncio.gather(*[__score(node) for node in children]):
+            if result is not None:
+                ranked.append((node, *result))
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        beam = [item for item in ranked if item[1] >= min_score][:beam_width]
+
+        frontier = []
+        for node, score, reason in beam:
+            if has_source(graph, node):
+                results.append({
+                    "node": node,
+                    "type": graph.nodes[node].get("type"),
+                    "score": score,
+                    "reason": reason,
+                    "depth": depth + 1,
+                    "source": get_source(graph, node, repo_path),
+                    "dependencies": symbol_dependencies(graph, node),
+                })
+            if tree.out_degree(node) > 0:
+                frontier.append(node)
+
+    results.sort(key=lambda result: (-result["score"], result["depth"]))
+    return results, llm_calls
@@ -0,0 +1,61 @@
+import asyncio
+import contextlib
+from collections import Counter, OrderedDict, deque
+
+class FairScheduler:
+    """
+    Shares a fixed number of slots between several tenants, e.g. the NLA
+    traversals of the repositories of a batch run. While slots are free they
+    are handed out right away; once they are all taken, every freed slot goes
+    to the next tenant with a waiting task in round-robin order, so a large
+    repository cannot starve the small ones queued behind it.
+
+    Args:
+    slots: Maximum number of tasks holding a slot at once.
+    """
+    def __init__(self, slots: int):
+        self.slots = max(1, slots)
+        self.in_use = 0
+        self.granted = Counter()
+        self._waiters = OrderedDict()
+
+    async def acquire(self, tenant):
+        if self.in_use < self.slots and not self._waiters:
+            self.in_use += 1
+            self.granted[tenant] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(tenant, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was granted right before the cancellation
+                self.release()
+            raise
+
+    def release(self):
+        self.in_use -= 1
+        self._grant()
+
+    def _grant(self):
+        while self.in_use < self.slots and self._waiters:
+            tenant, waiters = self._waiters.popitem(last=False)
+            future = waiters.popleft()
+            if waiters:
+                # the tenant goes to the back of the line
+                self._waiters[tenant] = waiters
+            if future.cancelled():
+                continue
+            self.in_use += 1
+            self.granted[tenant] += 1
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, tenant):
+        await self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,315 @@
+"""
+Compact, columnar binary snapshot of a graph.
+
+Layout (little-endian):
+    magic (8 bytes) | major (u16) | minor (u16) | header length (u32) | JSON header | sections
+
+The JSON header records the graph attributes, the node and edge counts, and
+the offset/length of every section. Nodes are stored in DFS preorder from the
+root, so the subtree of a node is the contiguous range of node IDs
+[id, subtree_end[id]). Edges are stored as (source ID, target ID) pairs sorted
+by source. Every node and edge attribute is stored as a separate column; text
+values live in a single string heap and columns only hold their byte ranges.
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+import networkx as nx
+from array import array
+from bisect import bisect_left
+
+from src.pipeline.symbols import containment_view
+
+SNAPSHOT_EXTENSION = ".llsnap"
+
+_MAGIC = b"LLSNAP\x00\x00"
+_MAJOR_VERSION = 1
+_MINOR_VERSION = 0
+_PREAMBLE = struct.Struct("<8sHHI")
+
+_TYPECODES = {"int": "q", "float": "d", "bool": "B", "str": "Q"}
+
+def _to_le_bytes(values: array):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_le_bytes(typecode: str, buffer):
+    values = array(typecode)
+    values.frombytes(buffer)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _column_kind(values):
+    kinds = set()
+    for value in values:
+        if isinstance(value, bool):
+            kinds.add("bool")
+        elif isinstance(value, int):
+            kinds.add("int")
+        elif isinstance(value, float):
+            kinds.add("float")
+        else:
+            kinds.add("str")
+
+    if len(kinds) == 1:
+        return kinds.pop()
+    if kinds <= {"int", "float"}:
+        return "float"
+    return "str"
+
+def _preorder(graph: nx.DiGraph):
+    # symbol edges are not followed, a subtree is a contiguous range of the tree
+    graph = containment_view(graph)
+    roots = [node for node in graph.nodes if graph.in_degree(node) == 0]
+    order, seen = [], set()
+    for root in roots + list(graph.nodes):
+        if root in seen:
+            continue
+        for node in nx.dfs_preorder_nodes(graph, source=root):
+            if node not in seen:
+                seen.add(node)
+                order.append(node)
+    return order
+
+class _Writer:
+    def __init__(self):
+        self.sections = {}
+        self.blobs = []
+        self.offset = 0
+        self.heap = bytearray()
+
+    def add_section(self, name: str, data: bytes):
+        self.sections[name] = [self.offset, len(data)]
+        self.blobs.append(data)
+        self.offset += len(data)
+
+    def add_strings(self, strings):
+        starts, ends = array("Q"), array("Q")
+        for string in strings:
+            encoded = string.encode("utf-8")
+            starts.append(len(self.heap))
+            self.heap.extend(encoded)
+            ends.append(len(self.heap))
+        return starts, ends
+
+    def add_columns(self, prefix: str, items: list):
+        """
+        Adds one column per attribute key of `items`, a list of attribute dicts.
+        """
+        keys = sorted({key for attrs in items for key in attrs})
+        columns = {}
+        for key in keys:
+            present = array("B", (1 if key in attrs else 0 for attrs in items))
+            values = [attrs[key] for attrs in items if key in attrs]
+            kind = _column_kind(values)
+
+            section = f"{prefix}:{key}"
+            self.add_section(f"{section}:present", _to_le_bytes(present))
+            if kind == "str":
+                starts, ends = self.add_strings(str(value) for value in values)
+                self.add_section(f"{section}:starts", _to_le_bytes(starts))
+                self.add_section(f"{section}:ends", _to_le_bytes(ends))
+            else:
+                cast = {"int": int, "float": float, "bool": int}[kind]
+                self.add_section(f"{section}:values", _to_le_bytes(array(_TYPECODES[kind], (cast(v) for v in values))))
+            columns[key] = kind
+        return columns
+
+def write_snapshot(graph: nx.DiGraph, path: str):
+    """
+    Writes `graph` to `path` in the compact snapshot format.
+    """
+    order = _preorder(graph)
+    ids = {node: idx for idx, node in enumerate(order)}
+
+    tree = containment_view(graph)
+    subtree_end = array("I", range(1, len(order) + 1))
+    for node in reversed(order):
+        for child in tree.successors(node):
+            if ids[child] > ids[node]:
+                subtree_end[ids[node]] = max(subtree_end[ids[node]], subtree_end[ids[child]])
+
+    edges = sorted((ids[source], ids[target]) for source, target in graph.edges)
+    edge_sources = array("I", (source for source, _ in edges))
+    edge_targets = array("I", (target for _, target in edges))
+    id_to_node = order
+
+    writer = _Writer()
+    name_starts, name_ends = writer.add_strings(str(node) for node in order)
+    writer.add_section("node:name:starts", _to_le_bytes(name_starts))
+    writer.add_section("node:name:ends", _to_le_bytes(name_ends))
+    writer.add_section("node:subtree_end", _to_le_bytes(subtree_end))
+    writer.add_section("edge:sources", _to_le_bytes(edge_sources))
+    writer.add_section("edge:targets", _to_le_bytes(edge_targets))
+    node_columns = writer.add_columns("node_attr", [graph.nodes[node] for node in order])
+    edge_columns = writer.add_columns(
+        "edge_attr", [graph.edges[id_to_node[source], id_to_node[target]] for source, target in edges]
+    )
+    writer.add_section("heap", bytes(writer.heap))
+
+    header = json.dumps({
+        "graph": graph.graph,
+        "num_nodes": len(order),
+        "num_edges": len(edges),
+        "node_columns": node_columns,
+        "edge_columns": edge_columns,
+        "sections": writer.sections,
+    }, default=str).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(_MAGIC, _MAJOR_VERSION, _MINOR_VERSION, len(header)))
+        f.write(header)
+        for blob in writer.blobs:
+            f.write(blob)
+
+class _Reader:
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, major, minor, header_len = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a graph snapshot")
+        if major != _MAJOR_VERSION:
+            raise ValueError(f"{path} uses snapshot format version {major}.{minor}, "
+                             f"this version of LayerLens reads version {_MAJOR_VERSION}.x")
+
+        self.version = (major, minor)
+        self.header = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_len])
+        self._base = _PREAMBLE.size + header_len
+        heap_offset, _ = self.header["sections"]["heap"]
+        self._heap = self._base + heap_offset
+
+    def section(self, name: str, typecode: str, start: int = 0, stop: int = None):
+        """
+        Reads the items [start, stop) of an array section without touching the rest.
+        """
+        offset, length = self.header["sections"][name]
+        itemsize = array(typecode).itemsize
+        stop = length // itemsize if stop is None else stop
+        begin = self._base + offset + start * itemsize
+        return _from_le_bytes(typecode, self._mmap[begin:self._base + offset + stop * itemsize])
+
+    def strings(self, prefix: str, start: int = 0, stop: int = None):
+        starts = self.section(f"{prefix}:starts", "Q", start, stop)
+        ends = self.section(f"{prefix}:ends", "Q", start, stop)
+        return [self._mmap[self._heap + s:self._heap + e].decode("utf-8") for s, e in zip(starts, ends)]
+
+    def column(self, prefix: str, key: str, kind: str, start: int, stop: int):
+        """
+        Reads the values of attribute `key` for the items [start, stop). Returns
+        a list with None for the items that do not have the attribute.
+        """
+        section = f"{prefix}:{key}"
+        present = self.section(f"{section}:present", "B")
+        # values are only stored for the items that have the attribute
+        value_start = sum(present[:start])
+        value_stop = value_start + sum(present[start:stop])
+
+        if kind == "str":
+            values = self.strings(section, value_start, value_stop)
+        else:
+            values = self.section(f"{section}:values", _TYPECODES[kind], value_start, value_stop)
+            if kind == "bool":
+                values = [bool(value) for value in values]
+
+        values = iter(values)
+        return [next(values) if present[idx] else None for idx in range(start, stop)]
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+def read_snapshot(path: str, subtree: str = None, attributes: list = None):
+    """
+    Reads a graph snapshot written by `write_snapshot`.
+
+    Args:
+    path: Path to the snapshot file.
+    subtree: If given, only the subtree rooted at this node is loaded.
+    attributes: If given, only these node attributes are loaded, e.g. leave out
+        "nla" to skip reading annotation text.
+    """
+    reader = _Reader(path)
+    try:
+        num_nodes = reader.header["num_nodes"]
+        names = reader.strings("node:name")
+
+        start, stop = 0, num_nodes
+        if subtree is not None:
+            if subtree not in names:
+                raise KeyError(f"{subtree} is not a node of {path}")
+            start = names.index(subtree)
+            stop = reader.section("node:subtree_end", "I", start, start + 1)[0]
+
+        graph = nx.DiGraph()
+        graph.graph.update(reader.header["graph"])
+        graph.add_nodes_from(names[start:stop])
+
+        for key, kind in reader.header["node_columns"].items():
+            if attributes is not None and key not in attributes:
+                continue
+            for name, value in zip(names[start:stop], reader.column("node_attr", key, kind, start, stop)):
+                if value is not None:
+                    graph.nodes[name][key] = value
+
+        edge_sources = reader.section("edge:sources", "I")
+        edge_start = bisect_left(edge_sources, start)
+        edge_stop = bisect_left(edge_sources, stop)
+        edge_targets = reader.section("edge:targets", "I", edge_start, edge_stop)
+        edge_columns = {
+            key: reader.column("edge_attr", key, kind, edge_start, edge_stop)
+            for key, kind in reader.header["edge_columns"].items()
+        }
+
+        for idx, (source, target) in enumerate(zip(edge_sources[edge_start:edge_stop], edge_targets)):
+            if not start <= target < stop:
+                continue
+            attrs = {key: values[idx] for key, values in edge_columns.items() if values[idx] is not None}
+            graph.add_edge(names[source], names[target], **attrs)
+
+        return graph
+    finally:
+        reader.close()
+
+def is_snapshot(path: str):
+    return path.endswith(SNAPSHOT_EXTENSION)
+
+def read_graph(path: str):
+    """
+    Reads a graph from either a snapshot or a GraphML file, based on the extension.
+    """
+    if is_snapshot(path):
+        return read_snapshot(path)
+    return nx.read_graphml(path)
+
+def write_graph(graph: nx.DiGraph, path: str):
+    """
+    Writes a graph to either a snapshot or a GraphML file, based on the extension.
+    """
+    if is_snapshot(path):
+        write_snapshot(graph, path)
+    else:
+        nx.write_graphml(graph, path, named_key_ids=True)
+
+def convert(input_path: str, output_path: str):
+    write_graph(read_graph(input_path), output_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Converts graphs between GraphML and the compact snapshot format")
+    parser.add_argument("input_path", type=str, help=f"Path to a .graphml or {SNAPSHOT_EXTENSION} file")
+    parser.add_argument("output_path", type=str, help=f"Path to the .graphml or {SNAPSHOT_EXTENSION} file to write")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    convert(args.input_path, args.output_path)
+    print(f"{args.input_path} ({os.path.getsize(args.input_path)} bytes) -> "
+          f"{args.output_path} ({os.path.getsize(args.output_path)} bytes)")
@@ -0,0 +1,77 @@
+import os
+import mmap
+import textwrap
+from collections import OrderedDict
+
+class SourceReader:
+    """
+    Reads source spans out of memory-mapped files. Only the `max_open_files`
+    most recently used files are kept mapped.
+    """
+    def __init__(self, max_open_files: int = 32):
+        self.max_open_files = max_open_files
+        self._files = OrderedDict()
+
+    def _mmap(self, path: str):
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if path in self._files:
+            f, mapped, mapped_version = self._files[path]
+            if mapped_version == version:
+                self._files.move_to_end(path)
+                return mapped
+            # the file changed on disk since it was mapped
+            del self._files[path]
+            mapped.close()
+            f.close()
+
+        f = open(path, "rb")
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            f.close()
+            raise
+
+        self._files[path] = (f, mapped, version)
+        if len(self._files) > self.max_open_files:
+            _, (old_f, old_mapped, _) = self._files.popitem(last=False)
+            old_mapped.close()
+            old_f.close()
+        return mapped
+
+    def read(self, path: str, start_byte: int, end_byte: int):
+        return self._mmap(path)[start_byte:end_byte].decode("utf-8")
+
+    def close(self):
+        for f, mapped, _ in self._files.values():
+            mapped.close()
+            f.close()
+        self._files.clear()
+
+_READER = SourceReader()
+
+def has_source(graph, node):
+    return "start_byte" in graph.nodes[node]
+
+def get_source(graph, node, repo_path: str = None):
+    """
+    Fetches the source of a class or function node on demand from the span
+    recorded by `build_graph`.
+
+    Args:
+    graph: The NetworkX graph the node belongs to.
+    node: The node to read the source of.
+    repo_path: The path to the repository checkout. Defaults to the path
+        recorded on the graph when it was built.
+
+    Returns:
+    The dedented source text, or None if the node has no source span.
+    """
+    data = graph.nodes[node]
+    if "start_byte" not in data:
+        return None
+
+    repo_path = repo_path or graph.graph["repo_path"]
+    text = _READER.read(os.path.join(repo_path, data["file"]), data["start_byte"], data["end_byte"])
+    return textwrap.dedent(text)
@@ -0,0 +1,166 @@
+import os
+import json
+import networkx as nx
+from collections import Counter
+
+# edge types, untyped edges are containment edges
+CONTAINS = "contains"
+IMPORTS = "imports"
+INHERITS = "inherits"
+CALLS = "calls"
+
+# bounds alias chains such as re-exports of re-exports, and alias cycles
+_MAX_RESOLVE_DEPTH = 16
+
+def containment_view(graph):
+    """
+    Returns the package -> module -> class -> function tree of `graph`. Graphs
+    built with symbol edges also hold import, inheritance and call edges, which
+    the tree traversals must not follow. The view shares the node attributes of
+    `graph`, so annotations written through it land in `graph`.
+    """
+    if not graph.graph.get("symbol_edges"):
+        return graph
+    return nx.subgraph_view(graph, filter_edge=lambda u, v: graph[u][v].get("type", CONTAINS) == CONTAINS)
+
+def symbol_dependencies(graph, node, edge_types=(CALLS, INHERITS)):
+    """
+    Returns the nodes `node` directly depends on through edges of `edge_types`,
+    e.g. its callees and base classes.
+    """
+    return [target for _, target, edge_type in graph.out_edges(node, data="type") if edge_type in edge_types]
+
+def symbols_path_for(graph_path: str):
+    return os.path.splitext(graph_path)[0] + ".symbols.json"
+
+def _public_names(node: str):
+    # objects of a package's __init__ module are importable from the package itself
+    yield node
+    if ".__init__" in node:
+        yield node.replace(".__init__", "", 1)
+
+class SymbolTable:
+    """
+    Maps qualified names to node IDs. Every node is registered under its ID,
+    and modules and subpackages also under every dotted suffix of their path,
+    so that absolute imports resolve no matter which directory of the
+    repository is the import root. Import aliases are kept per module and
+    followed while resolving, which also covers re-exports.
+    """
+    _VERSION = 1
+
+    def __init__(self):
+        self.names = {}
+        self.aliases = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_node(self, node: str, node_type: str = None):
+        self.names[node] = node
+        for name in list(_public_names(node))[1:]:
+            self.names.setdefault(name, node)
+
+        if node_type in ("module", "subpackage") and not node.endswith(".__init__"):
+            parts = node.split(".")[1:]
+            for idx in range(len(parts)):
+                self.names.setdefault(".".join(parts[idx:]), node)
+
+    def add_alias(self, module_node: str, alias: str, target: str):
+        for name in _public_names(f"{module_node}.{alias}"):
+            self.aliases[name] = target
+
+    def resolve(self, name: str, _depth: int = 0):
+        """
+        Returns the node `name` refers to, or None for names outside of the
+        repository (builtins, third-party packages, local variables).
+        """
+        if _depth > _MAX_RESOLVE_DEPTH:
+            return None
+        if name in self.names:
+            return self.names[name]
+        if name in self.aliases and self.aliases[name] != name:
+            return self.resolve(self.aliases[name], _depth + 1)
+
+        parts = name.split(".")
+        for idx in range(len(parts) - 1, 0, -1):
+            head, rest = ".".join(parts[:idx]), parts[idx:]
+            target = self.aliases.get(head)
+            if target is not None and target != head:
+                return self.resolve(".".join([target, *rest]), _depth + 1)
+
+            node = self.names.get(head)
+            if node is not None:
+                # a known node without such a member, e.g. a call on a builtin
+                return None if node == head else self.resolve(".".join([node, *rest]), _depth + 1)
+        return None
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds the table of a graph with symbol edges. The aliases are
+        recovered from the "alias" attribute of its import edges.
+        """
+        table = cls()
+        # shallower nodes win the ambiguous suffixes
+        for node in sorted(graph.nodes, key=lambda node: (node.count("."), node)):
+            table.add_node(node, graph.nodes[node].get("type"))
+        for source, target, alias in graph.edges(data="alias"):
+            if alias:
+                table.add_alias(source, alias, target)
+        return table
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            json.dump({"version": self._VERSION, "names": self.names, "aliases": self.aliases}, file)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "r") as file:
+            data = json.load(file)
+        if data["version"] != cls._VERSION:
+            raise ValueError(f"{path} uses symbol table version {data['version']}, expected {cls._VERSION}")
+
+        table = cls()
+        table.names, table.aliases = data["names"], data["aliases"]
+        return table
+
+def add_symbol_edges(graph, file_refs: list):
+    """
+    Resolves the references collected by `graph_builder_py._parse_file` and
+    adds them to `graph` as typed edges. Containment edges are typed as well,
+    and the graph is flagged so that tree traversals use `containment_view`.
+
+    Args:
+    graph: The graph the referencing and referenced nodes belong to.
+    file_refs: One (aliases, refs) tuple per parsed file.
+
+    Returns:
+    A Counter of the added edges by type.
+    """
+    for _, _, data in graph.edges(data=True):
+        data.setdefault("type", CONTAINS)
+    graph.graph["symbol_edges"] = True
+
+    table = SymbolTable.from_graph(graph)
+    for aliases, _ in file_refs:
+        for module_node, alias, target in aliases:
+            table.add_alias(module_node, alias, target)
+
+    added = Counter()
+    for _, refs in file_refs:
+        for source, edge_type, name, alias in refs:
+            if source not in graph:
+                # ignored __init__ modules have no node, their package stands in for them
+                source = source.replace(".__init__", "", 1)
+                if source not in graph:
+                    continue
+            target = table.resolve(name)
+            if target is None or target == source or graph.has_edge(source, target):
+                continue
+            attrs = {"type": edge_type}
+            if alias:
+                attrs["alias"] = alias
+            graph.add_edge(source, target, **attrs)
+            added[edge_type] += 1
+    return added
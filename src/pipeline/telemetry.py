@@ -0,0 +1,134 @@
+import re
+import json
+import time
+import logging
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+def _metric_name(name: str):
+    return "layerlens_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+class Telemetry:
+    """
+    Collects span timings, counters and gauges of a run. Every span, gauge
+    sample and event is appended to a JSON lines file when `jsonl_path` is
+    given. Aggregates are kept in memory for the Prometheus text export and
+    the summary table at the end of the run.
+    """
+    def __init__(self, jsonl_path: str = None):
+        self._file = open(jsonl_path, "a") if jsonl_path else None
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def _write(self, record):
+        if self._file is not None:
+            record["ts"] = round(time.time(), 6)
+            self._file.write(json.dumps(record, default=str) + "\n")
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Times the enclosed block. The yielded dict of attributes can be extended
+        inside the block, e.g. with token counts only known at its end.
+        """
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            duration = time.perf_counter() - start
+            stats = self.spans.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            self._write({"type": "span", "name": name, "duration_s": round(duration, 6), **attrs})
+
+    def count(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        last_max = self.gauges.get(name, (value, value))[1]
+        self.gauges[name] = (value, max(last_max, value))
+        self._write({"type": "gauge", "name": name, "value": value})
+
+    def event(self, name: str, **attrs):
+        self._write({"type": "event", "name": name, **attrs})
+
+    def prometheus(self):
+        lines = [
+            "# HELP layerlens_span_seconds Time spent in each span of the run.",
+            "# TYPE layerlens_span_seconds summary",
+        ]
+        for name, (count, total, _) in sorted(self.spans.items()):
+            lines.append(f'layerlens_span_seconds_count{{span="{name}"}} {count}')
+            lines.append(f'layerlens_span_seconds_sum{{span="{name}"}} {total:.6f}')
+        lines.append("# TYPE layerlens_span_seconds_max gauge")
+        for name, (_, _, longest) in sorted(self.spans.items()):
+            lines.append(f'layerlens_span_seconds_max{{span="{name}"}} {longest:.6f}')
+
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {_metric_name(name)}_total counter")
+            lines.append(f"{_metric_name(name)}_total {value:g}")
+        for name, (last, highest) in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {_metric_name(name)} gauge")
+            lines.append(f"{_metric_name(name)} {last:g}")
+            lines.append(f"# TYPE {_metric_name(name)}_max gauge")
+            lines.append(f"{_metric_name(name)}_max {highest:g}")
+        return "\n".join(lines) + "\n"
+
+    def summary_table(self):
+        lines = [f"{'span':<28}{'count':>8}{'total (s)':>12}{'mean (s)':>11}{'max (s)':>11}"]
+        for name, (count, total, longest) in sorted(self.spans.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<28}{count:>8}{total:>12.3f}{total / count:>11.4f}{longest:>11.4f}")
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<28}{'value':>12}")
+            lines.extend(f"{name:<28}{value:>12g}" for name, value in sorted(self.counters.items()))
+        if self.gauges:
+            lines.append("")
+            lines.append(f"{'gauge':<28}{'last':>12}{'max':>12}")
+            lines.extend(f"{name:<28}{last:>12g}{highest:>12g}" for name, (last, highest) in sorted(self.gauges.items()))
+        return "\n".join(lines)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+_TELEMETRY = Telemetry()
+
+def configure(jsonl_path: str = None):
+    """
+    Starts recording a new run, optionally streaming its records to `jsonl_path`.
+    """
+    global _TELEMETRY
+    _TELEMETRY.close()
+    _TELEMETRY = Telemetry(jsonl_path)
+    return _TELEMETRY
+
+def get_telemetry():
+    return _TELEMETRY
+
+def span(name: str, **attrs):
+    return _TELEMETRY.span(name, **attrs)
+
+def count(name: str, value: float = 1):
+    _TELEMETRY.count(name, value)
+
+def gauge(name: str, value: float):
+    _TELEMETRY.gauge(name, value)
+
+def event(name: str, **attrs):
+    _TELEMETRY.event(name, **attrs)
+
+def finish(prometheus_path: str = None):
+    """
+    Logs the summary table of the run, writes its metrics in Prometheus text
+    format to `prometheus_path` and closes the JSON lines file.
+    """
+    if prometheus_path:
+        with open(prometheus_path, "w") as file:
+            file.write(_TELEMETRY.prometheus())
+    logger.info("run summary\n%s", _TELEMETRY.summary_table())
+    _TELEMETRY.close()
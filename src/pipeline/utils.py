@@ -1,14 +1,137 @@
-from pydantic import BaseModel
+import re
+import json
+import yaml
+from pydantic import BaseModel, ConfigDict
+
+from genai_apis import APIFactory
+
+from src.pipeline.symbols import containment_view
 
 def create_pydantic_class_from_yaml(schema):
-    class_name, fields = list(schema.items())[0]
-    annotations = {field: eval(type_hint) for field, type_hint in fields.items()}
+    """
+    Creates the pydantic classes of a YAML `schema` of class name -> {field:
+    type hint}. Type hints may refer to the classes defined before them, e.g.
+    `list[Verdict]`, and the last class is the one returned. Extra fields are
+    forbidden, which strict structured outputs require of every object.
+    """
+    classes = {}
+    for class_name, fields in schema.items():
+        annotations = {field: eval(type_hint, globals(), classes) for field, type_hint in fields.items()}
+
+        # Use 'type' to create the Pydantic class dynamically
+        classes[class_name] = type(
+            class_name,
+            (BaseModel,),  # Base classes (Pydantic BaseModel)
+            {"__annotations__": annotations, "model_config": ConfigDict(extra="forbid")},  # Annotations for fields
+        )
+
+    return classes[class_name]
+
+def load_gen_configs(path: str, provider: str):
+    """
+    Reads a generation config YAML and turns its structured output `schema`
+    into the form `provider` expects.
+    """
+    with open(path, 'r') as file:
+        gen_configs = yaml.safe_load(file)
+
+    if provider == "openai":
+        if "schema" in gen_configs:
+            gen_configs["response_format"] = create_pydantic_class_from_yaml(gen_configs["schema"])
+            del gen_configs["schema"]
+    elif provider == "gemini":
+        if "schema" in gen_configs:
+            gen_configs["response_schema"] = gen_configs["schema"]
+            del gen_configs["schema"]
+    elif provider == "anthropic":
+        if "schema" in gen_configs:
+            gen_configs["tool_choice"] = gen_configs["schema"]["tool_choice"]
+            gen_configs["tools"] = gen_configs["schema"]["tools"]
+            del gen_configs["schema"]
+    return gen_configs
+
+def resolve_gen_config_path(path: str, provider: str, default_paths: dict, option: str):
+    """
+    Returns `path`, or the generation config of `provider` in `default_paths`
+    when it is not set. Providers without one have to set `option`.
+    """
+    if path:
+        return path
+    if provider not in default_paths:
+        raise ValueError(f"There is no default {option} for the {provider} provider, set it explicitly")
+    return default_paths[provider]
+
+def setup_service_llm(args):
+    service_llm_kwargs = {
+        "api_key": args.service_llm_api_key,
+        "GCP_PROJECT_ID": args.gcp_project_id,
+        "GCP_PROJECT_LOCATION": args.gcp_location,
+        "AWS_REGION": args.aws_location,
+    }
+
+    service_llm_gen_configs = load_gen_configs(args.service_llm_gen_config_path, args.service_llm_provider)
+
+    if args.service_llm_provider == "fake":
+        # offline provider for tests and benchmarks
+        from src.pipeline.fake_llm import load_fake_llm
+        service_llm_client = load_fake_llm(args.fake_llm_config_path)
+    else:
+        service_llm_client = APIFactory.get_api_client(args.service_llm_provider, **service_llm_kwargs)
+    if args.rate_limit_config_path:
+        # imported here as the rate limiter counts tokens with this module
+        from src.pipeline.rate_limiter import RateLimitedClient, load_rate_limits
+        service_llm_client = RateLimitedClient(
+            service_llm_client, **load_rate_limits(args.rate_limit_config_path, args.service_llm_provider)
+        )
+    return (service_llm_client, service_llm_gen_configs)
+
+def parse_structured_output(response):
+    """
+    Normalizes the response of a structured output request into a dict. Depending
+    on the provider, the response is a pydantic object, a dict or JSON text
+    (possibly wrapped in a markdown code fence).
+    """
+    if hasattr(response, "model_dump"):
+        return response.model_dump()
+    if isinstance(response, dict):
+        return response
+    if not isinstance(response, str):
+        return dict(vars(response)) if hasattr(response, "__dict__") else {}
+
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", response.strip())
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {"items": parsed}
+
+def find_root(graph):
+    tree = containment_view(graph)
+    roots = [node for node in tree.nodes if tree.in_degree(node) == 0]
+    if len(roots) != 1:
+        raise ValueError(f"Expected a single root package in the graph, found {len(roots)}")
+    return roots[0]
+
+_ENCODING = None
+_ENCODING_UNAVAILABLE = False
 
-    # Use 'type' to create the Pydantic class dynamically
-    pydantic_class = type(
-        class_name,
-        (BaseModel,),  # Base classes (Pydantic BaseModel)
-        {"__annotations__": annotations},  # Annotations for fields
-    )
+def _get_encoding():
+    global _ENCODING, _ENCODING_UNAVAILABLE
+    if _ENCODING is None and not _ENCODING_UNAVAILABLE:
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # tiktoken is optional, and needs its BPE files to be downloaded once
+            _ENCODING_UNAVAILABLE = True
+    return _ENCODING
 
-    return pydantic_class
\ No newline at end of file
+def count_tokens(text: str):
+    """
+    Counts the tokens of `text` with tiktoken's cl100k_base encoding when it is
+    available locally, otherwise estimates roughly 4 characters per token.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
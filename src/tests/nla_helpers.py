@@ -0,0 +1,40 @@
+# nla_helpers.py
+# stub client, arguments and tree shared by the tests of the NLA traversal
+
+import asyncio
+import argparse
+import networkx as nx
+
+class StubLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_text(self, model, prompt, **kwargs):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        return f"nla {len(self.prompts)}"
+
+def make_args(client, priority="fifo", workers=3):
+    return argparse.Namespace(
+        workers=workers,
+        traverse_priority=priority,
+        service_llm=client,
+        service_llm_model="stub",
+        service_llm_gen_configs={},
+        save_graph_animation=False,
+        graph_imgs_path="graph_imgs",
+        nla_cache=None,
+        checkpoint=None,
+        nla_batch_size=1,
+        nla_batch_max_tokens=4000,
+        nla_prompt_token_budget=None,
+    )
+
+def make_tree():
+    graph = nx.DiGraph()
+    graph.add_edges_from([
+        ("pkg", "pkg.a"), ("pkg", "pkg.b"),
+        ("pkg.a", "pkg.a.f"), ("pkg.a", "pkg.a.g"),
+        ("pkg.b", "pkg.b.sub"), ("pkg.b.sub", "pkg.b.sub.h"),
+    ])
+    return graph
@@ -0,0 +1,48 @@
+# test_batch.py
+
+import json
+import asyncio
+import pytest
+
+from src.pipeline.snapshot import read_graph
+from batch import build_parser, load_manifest, run_batch
+
+def _make_repo(path, modules):
+    path.mkdir(parents=True)
+    for idx in range(modules):
+        (path / f"mod{idx}.py").write_text(f"class Thing{idx}:\n    def run(self):\n        pass\n\ndef helper{idx}():\n    pass\n")
+    return str(path)
+
+def test_batch_annotates_every_repo_with_one_client(tmp_path):
+    manifest = tmp_path / "repos.jsonl"
+    manifest.write_text("\n".join(json.dumps(entry) for entry in [
+        {"repo": _make_repo(tmp_path / "large", 8)},
+        {"repo": _make_repo(tmp_path / "small", 1), "name": "tiny"},
+        {"repo": str(tmp_path / "missing")},
+    ]) + "\n")
+    fake_config_path = tmp_path / "fake_llm.yaml"
+    fake_config_path.write_text("latency: constant\nlatency_ms: 5\n")
+
+    args = build_parser().parse_args([
+        "--manifest", str(manifest), "--output-dir", str(tmp_path / "out"), "--service-llm-provider", "fake",
+        "--service-llm-model", "fake", "--service-llm-gen-config-path", "configs/gpt_gen_configs.yaml",
+        "--fake-llm-config-path", str(fake_config_path), "--disable-nla-cache", "--checkpoint-dir", "",
+        "--parse-workers", "1", "--workers", "2",
+    ])
+    results = asyncio.run(run_batch(load_manifest(args.manifest), args))
+
+    assert [result["repo"] for result in results] == ["large", "tiny", "missing"]
+    assert [result["status"] for result in results] == ["done", "done", "failed"]
+    assert results[0]["nla_tasks"] == results[0]["nodes"] and results[1]["nla_tasks"] == results[1]["nodes"]
+
+    # every non-leaf node of both repositories went through the shared client
+    graphs = [read_graph(result["graph_path"]) for result in results[:2]]
+    assert graphs[1].nodes["small"]["nla"]
+    parents = sum(1 for graph in graphs for node in graph.nodes if graph.out_degree(node) > 0)
+    assert args.service_llm.stats()["calls"] == parents
+
+def test_manifest_needs_distinct_names(tmp_path):
+    manifest = tmp_path / "repos.jsonl"
+    manifest.write_text('{"repo": "a/pkg"}\n{"repo": "b/pkg"}\n')
+    with pytest.raises(ValueError):
+        load_manifest(str(manifest))
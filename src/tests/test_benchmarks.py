@@ -0,0 +1,23 @@
+# test_benchmarks.py
+
+import sys
+import asyncio
+
+from benchmarks import e2e
+
+def _run_e2e(workspace, monkeypatch, nla_batch_size):
+    workspace.mkdir()
+    fake_config_path = workspace / "fake_llm.yaml"
+    fake_config_path.write_text("latency: constant\nlatency_ms: 0\n")
+    monkeypatch.setattr(sys, "argv", [
+        "e2e", "--modules", "12", "--depth", "2", "--branching", "2", "--parse-workers", "1",
+        "--nla-batch-size", str(nla_batch_size), "--fake-llm-config-path", str(fake_config_path),
+        "--rate-limit-config-path", "",
+    ])
+    _, stages = asyncio.run(e2e._run(e2e.parse_args(), str(workspace)))
+    return {stage["stage"]: stage["llm_calls"] for stage in stages}
+
+def test_e2e_with_batched_nla_requests(tmp_path, monkeypatch):
+    calls = _run_e2e(tmp_path / "single", monkeypatch, 1)
+    batched_calls = _run_e2e(tmp_path / "batched", monkeypatch, 4)
+    assert 0 < batched_calls["generate_nla"] < calls["generate_nla"]
@@ -0,0 +1,76 @@
+# test_cache.py
+
+import time
+
+from src.pipeline.cache import NLACache, RelevanceCache
+from src.pipeline.cache import make_cache_key
+
+def test_cache_key_is_content_addressed():
+    assert make_cache_key("prompt", "model", {"a": 1, "b": 2}) == make_cache_key("prompt", "model", {"b": 2, "a": 1})
+    assert make_cache_key("prompt", "model", {"a": 1}) != make_cache_key("prompt", "other-model", {"a": 1})
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "nla.sqlite")
+    cache = NLACache(path)
+    key = cache.make_key("prompt", "model", {})
+    assert cache.get(key) is None
+    cache.put(key, "annotation")
+    cache.close()
+
+    cache = NLACache(path)
+    assert cache.get(key) == "annotation"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 0
+    cache.close()
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = NLACache(str(tmp_path / "nla.sqlite"), max_size_mb=25 / (1024 * 1024))
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    assert cache.get("a") is not None  # "b" becomes the least recently used entry
+    cache.put("c", "x" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    cache.close()
+
+def test_relevance_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "nla.sqlite")
+    cache = RelevanceCache(path, ttl_s=60)
+    key = cache.make_key("How to send an HTTP request?", "Sends requests.", "model", {})
+    assert key == cache.make_key("  how to send an http   request", "Sends requests.", "model", {})
+    assert key != cache.make_key("How to send an HTTP request?", "Sends requests with retries.", "model", {})
+
+    cache.put_verdict(key, True, "it sends them")
+    assert cache.get_verdict(key) == (True, "it sends them")
+
+    # shares the file with the NLA cache, but not the entries
+    nla_cache = NLACache(path)
+    assert len(nla_cache) == 0
+    nla_cache.close()
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get_verdict(key) is None
+    assert cache.stats()["expired"] == 1 and cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert len(cache) == 0 and cache.stats()["size_bytes"] == 0
+    cache.close()
+
+def test_cache_hits_write_access_times_back_in_bulk(tmp_path, monkeypatch):
+    path = str(tmp_path / "nla.sqlite")
+    cache = NLACache(path)
+    cache.put("a", "annotation")
+    changes = cache._conn.total_changes
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    for _ in range(10):
+        assert cache.get("a") == "annotation"
+    assert cache._conn.total_changes == changes
+    cache.close()
+
+    cache = NLACache(path)
+    assert cache._conn.execute("SELECT last_access FROM nla_cache WHERE key = 'a'").fetchone()[0] == now + 60
+    cache.close()
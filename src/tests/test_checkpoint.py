@@ -0,0 +1,62 @@
+# test_checkpoint.py
+
+import asyncio
+import pytest
+
+from src.pipeline.checkpoint import NLACheckpoint, load_checkpoint, restore_checkpoint
+from src.pipeline.nla_generator_py import _dynamic_traverse
+from src.tests.nla_helpers import StubLLM, make_args, make_tree
+
+class _CrashingLLM(StubLLM):
+    def __init__(self, crash_after):
+        super().__init__()
+        self.crash_after = crash_after
+
+    async def generate_text(self, model, prompt, **kwargs):
+        if len(self.prompts) >= self.crash_after:
+            raise RuntimeError("quota exhausted")
+        return await super().generate_text(model, prompt, **kwargs)
+
+def test_resume_continues_the_remaining_frontier(tmp_path):
+    path = str(tmp_path / "pkg_nla.ckpt.jsonl")
+    graph = make_tree()
+    args = make_args(_CrashingLLM(crash_after=2), workers=1)
+    args.graph_imgs_path = str(tmp_path)
+    args.checkpoint = NLACheckpoint(path, "pkg", flush_every=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(_dynamic_traverse(graph, "pkg", args))
+    args.checkpoint.close()
+
+    # a fresh graph, as after restarting the process
+    graph = make_tree()
+    restored = restore_checkpoint(graph, "pkg", path)
+    remaining = set(graph.nodes) - restored
+    assert graph.nodes["pkg.a"]["nla"] == "nla 1"
+    assert "pkg" in remaining and "pkg.a" not in remaining
+
+    client = StubLLM()
+    args = make_args(client, workers=1)
+    args.graph_imgs_path = str(tmp_path)
+    args.checkpoint = NLACheckpoint(path, "pkg", resume=True)
+    asyncio.run(_dynamic_traverse(graph, "pkg", args, nodes=remaining))
+    args.checkpoint.close()
+
+    # only the parents the crashed run did not annotate are requested again
+    assert len(client.prompts) == 4 - 2
+    assert all(graph.nodes[node].get("processed") for node in graph.nodes)
+    assert set(load_checkpoint(path)[1]) == set(graph.nodes)
+
+def test_checkpoint_ignores_a_torn_last_line(tmp_path):
+    path = tmp_path / "pkg_nla.ckpt.jsonl"
+    checkpoint = NLACheckpoint(str(path), "pkg", commit="abc")
+    checkpoint.record("pkg.a", {"nla": "a", "processed": True})
+    checkpoint.close()
+    with open(path, "a") as file:
+        file.write('{"node": "pkg.b", "nl')
+
+    header, records = load_checkpoint(str(path))
+    assert header["commit"] == "abc"
+    assert records == {"pkg.a": {"nla": "a"}}
+
+    with pytest.raises(ValueError):
+        restore_checkpoint(make_tree(), "pkg", str(path), commit="def")
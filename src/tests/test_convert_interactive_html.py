@@ -0,0 +1,139 @@
+# test_convert_interactive_html.py
+
+import os
+import re
+import json
+import asyncio
+
+import convert_interactive_html
+from convert_interactive_html import build_parser, main as render_html, _radial_layout, _visible_nodes
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.snapshot import read_graph, write_graph
+from src.pipeline.utils import load_gen_configs, resolve_gen_config_path
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def _make_graph(tmp_path, annotate=True):
+    repo = tmp_path / "myrepo"
+    _write(repo / "core" / "api.py", "def get():\n    pass\n\ndef post():\n    pass\n")
+    _write(repo / "core" / "models.py", "class Model:\n    def save(self):\n        pass\n")
+    _write(repo / "core" / "sub" / "deep.py", "def deep():\n    pass\n")
+    _write(repo / "helpers.py", "def helper():\n    pass\n")
+    root_node, graph = build_graph(str(repo))
+    for node in graph.nodes if annotate else []:
+        graph.nodes[node]["nla"] = f"Annotation of {node}."
+    graph_path = str(tmp_path / "myrepo_nla.graphml")
+    write_graph(graph, graph_path)
+    return graph, graph_path
+
+def _render(tmp_path, graph_path, *extra):
+    fake_config_path = tmp_path / "fake_llm.yaml"
+    fake_config_path.write_text("latency: constant\nlatency_ms: 0\n")
+    output_path = str(tmp_path / "out" / "myrepo-pyvis.html")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    args = build_parser().parse_args([
+        "--graph-path", graph_path, "--output-path", output_path, "--index-top-k", "0",
+        "--service-llm-provider", "fake", "--service-llm-model", "fake",
+        "--fake-llm-config-path", str(fake_config_path),
+        "--relevance-cache-path", str(tmp_path / "relevance.sqlite"), *extra,
+    ])
+    asyncio.run(render_html(args))
+    with open(output_path) as file:
+        html = file.read()
+    nodes = json.loads(re.search(r"nodes = new vis\.DataSet\((\[.*?\])\);", html).group(1))
+    return output_path, html, {node["id"]: node for node in nodes}
+
+def test_layout_and_collapsed_subpackages(tmp_path):
+    graph, _ = _make_graph(tmp_path)
+    positions = _radial_layout(graph, "myrepo")
+
+    assert set(positions) == set(graph.nodes)
+    assert positions["myrepo"] == (0.0, 0.0)
+    assert len(set(positions.values())) == graph.number_of_nodes()
+
+    visible = _visible_nodes(graph, "myrepo", expanded=set())
+    assert visible == {"myrepo", "myrepo.core", "myrepo.helpers", "myrepo.helpers.helper"}
+    visible = _visible_nodes(graph, "myrepo", expanded={"myrepo.core"})
+    assert "myrepo.core.models.Model.save" in visible and "myrepo.core.sub" in visible
+    assert "myrepo.core.sub.deep" not in visible
+
+def test_scalable_export(tmp_path):
+    # without annotations nothing is relevant, so every subpackage starts collapsed
+    graph, graph_path = _make_graph(tmp_path, annotate=False)
+    output_path, html, nodes = _render(tmp_path, graph_path, "--export-mode", "scalable", "--detail-chunk-size", "2")
+
+    assert set(nodes) == set(graph.nodes)
+    assert all("source" not in node and node["physics"] is False for node in nodes.values())
+    assert nodes["myrepo.core.api.get"]["hidden"] and not nodes["myrepo.core"]["hidden"]
+    assert '"enabled": false' in re.search(r'"physics": \{[^}]*\}', html).group(0)
+
+    # every node's source is in exactly one chunk, which is named after its chunk number
+    details_dir = os.path.splitext(output_path)[0] + "_details"
+    details = {}
+    for name in sorted(os.listdir(details_dir)):
+        with open(os.path.join(details_dir, name)) as file:
+            chunk, payload = re.fullmatch(r"layerlensDetails\((\d+), (.*)\);\n", file.read()).groups()
+        for node, node_details in json.loads(payload).items():
+            assert nodes[node]["chunk"] == int(chunk) and node not in details
+            details[node] = node_details
+    assert len(os.listdir(details_dir)) == (len(details) + 1) // 2
+    assert details["myrepo.core.api.get"]["source"].startswith("def get():")
+
+def test_inline_export_keeps_attributes(tmp_path):
+    _, graph_path = _make_graph(tmp_path)
+    output_path, _, nodes = _render(tmp_path, graph_path)
+
+    assert nodes["myrepo.core.api.get"]["source"].startswith("def get():")
+    assert not os.path.exists(os.path.splitext(output_path)[0] + "_details")
+
+def test_repeat_queries_are_served_from_the_relevance_cache(tmp_path, monkeypatch):
+    graph, graph_path = _make_graph(tmp_path)
+    scored = []
+    score_nodes = convert_interactive_html._score_nodes
+
+    async def __score_nodes(nodes, *args):
+        scored.append({node for node, _ in nodes})
+        return await score_nodes(nodes, *args)
+
+    monkeypatch.setattr(convert_interactive_html, "_score_nodes", __score_nodes)
+    _render(tmp_path, graph_path, "--prompt", "How to save a model?")
+    _, _, nodes = _render(tmp_path, graph_path, "--prompt", "how to save a model")
+    assert len(scored[0]) > 0 and scored[1] == set()
+    assert all(node["relevance"]["cached"] for node in nodes.values() if "relevance" in node)
+
+    # only the node whose annotation changed is scored again
+    graph.nodes["myrepo.core.models"]["nla"] = "A changed annotation."
+    write_graph(graph, graph_path)
+    _render(tmp_path, graph_path, "--prompt", "How to save a model?")
+    assert scored[2] == {"myrepo.core.models"}
+
+def test_failed_batch_requests_fall_back_to_single_requests(tmp_path, monkeypatch):
+    graph, graph_path = _make_graph(tmp_path)
+
+    async def __fail(*args):
+        raise RuntimeError("invalid schema")
+
+    monkeypatch.setattr(convert_interactive_html, "_score_batch", __fail)
+    _, _, nodes = _render(tmp_path, graph_path, "--batch-size", "3", "--disable-relevance-cache")
+    assert set(nodes) == set(graph.nodes)
+
+def test_batched_requests_share_the_service_llm_client(tmp_path, monkeypatch):
+    _, graph_path = _make_graph(tmp_path)
+    clients = []
+    setup_service_llm = convert_interactive_html.setup_service_llm
+
+    def __setup_service_llm(args):
+        clients.append(setup_service_llm(args)[0])
+        return clients[-1], {}
+
+    monkeypatch.setattr(convert_interactive_html, "setup_service_llm", __setup_service_llm)
+    _render(tmp_path, graph_path, "--batch-size", "3", "--disable-relevance-cache")
+    assert len(clients) == 1
+    assert clients[0].calls < len(read_graph(graph_path).nodes)
+
+def test_batch_gen_configs_default_to_the_provider():
+    path = resolve_gen_config_path(None, "gemini", convert_interactive_html._BATCH_GEN_CONFIG_PATHS, "--batch-gen-config-path")
+    schema = load_gen_configs(path, "gemini")["response_schema"]
+    assert schema["properties"]["verdicts"]["items"]["required"] == ["node", "relevance", "reason"]
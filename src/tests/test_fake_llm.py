@@ -0,0 +1,58 @@
+# test_fake_llm.py
+
+import json
+import asyncio
+import argparse
+import pytest
+
+from src.pipeline.fake_llm import FakeLLMClient, FakeRateLimitError
+from src.pipeline.rate_limiter import RateLimitedClient
+from src.pipeline.utils import setup_service_llm
+
+def test_fake_llm_answers_structured_prompts():
+    client = FakeLLMClient(latency="constant", latency_ms=0)
+    batch_prompt = 'Answer with {"annotations": [...]}\ndependencies of "pkg.a":\n...\ndependencies of "pkg.b":\n...'
+    annotations = json.loads(asyncio.run(client.generate_text("fake", prompt=batch_prompt)))["annotations"]
+    assert [annotation["node"] for annotation in annotations] == ["pkg.a", "pkg.b"]
+
+    score = json.loads(asyncio.run(client.generate_text("fake", prompt='{"score": <0-10>}')))["score"]
+    assert 0 <= score <= 10
+
+    # answers only depend on the prompt
+    assert asyncio.run(client.generate_text("fake", prompt="describe")) == asyncio.run(client.generate_text("fake", prompt="describe"))
+    assert client.stats()["calls"] == 4
+    assert client.stats()["completion_tokens"] > 0
+
+def test_fake_llm_error_rates():
+    client = FakeLLMClient(latency="constant", latency_ms=0, throttle_rate=1.0)
+    with pytest.raises(FakeRateLimitError):
+        asyncio.run(client.generate_text("fake", prompt="describe"))
+
+    # the rate limited client retries through the injected throttling
+    client = FakeLLMClient(latency="constant", latency_ms=0, throttle_rate=0.5, seed=1)
+    limited = RateLimitedClient(client, max_retries=20, base_delay=0.001)
+
+    async def __run():
+        return await asyncio.gather(*[limited.generate_text("fake", prompt=str(idx)) for idx in range(20)])
+
+    assert len(asyncio.run(__run())) == 20
+    assert client.stats()["failures"] == limited.stats()["throttled"] > 0
+
+def test_setup_service_llm_fake_provider(tmp_path):
+    fake_config_path = tmp_path / "fake_llm.yaml"
+    fake_config_path.write_text("latency: constant\nlatency_ms: 0\n")
+    args = argparse.Namespace(
+        service_llm_provider="fake",
+        service_llm_api_key=None,
+        gcp_project_id=None,
+        gcp_location=None,
+        aws_location=None,
+        service_llm_gen_config_path="configs/gpt_gen_configs.yaml",
+        fake_llm_config_path=str(fake_config_path),
+        rate_limit_config_path="configs/rate_limits.yaml",
+    )
+
+    client, gen_configs = setup_service_llm(args)
+    assert isinstance(client, RateLimitedClient)
+    assert isinstance(client.client, FakeLLMClient)
+    assert isinstance(asyncio.run(client.generate_text("fake", prompt="describe", **gen_configs)), str)
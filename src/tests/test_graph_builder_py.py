@@ -0,0 +1,53 @@
+# test_graph_builder_py.py
+
+from src.pipeline import graph_builder_py
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.source_reader import get_source
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def _make_repo(tmp_path):
+    repo = tmp_path / "myrepo"
+    _write(repo / "core" / "api.py", "def get():\n    pass\n")
+    _write(repo / "core" / "models.py", "class Model:\n    def save(self):\n        pass\n")
+    _write(repo / "helpers.py", "def helper():\n    pass\n")
+    _write(repo / "README.md", "# myrepo\n")
+    _write(repo / "notes.txt", "notes\n")
+    _write(repo / ".git" / "HEAD", "ref: refs/heads/main\n")
+    return repo
+
+def test_build_graph(tmp_path):
+    root_node, graph = build_graph(str(_make_repo(tmp_path)), draw_graph=False)
+
+    assert root_node == "myrepo"
+    assert set(graph.successors("myrepo")) == {"myrepo.core", "myrepo.helpers", "myrepo.notes"}
+    assert graph.nodes["myrepo.core"]["type"] == "subpackage"
+    assert graph.nodes["myrepo.core.models"]["type"] == "module"
+    assert graph.nodes["myrepo.core.models.Model"]["type"] == "class"
+    assert graph.nodes["myrepo.core.models.Model.save"]["type"] == "function"
+    assert "myrepo.README" not in graph
+    assert "myrepo..git" not in graph
+
+def test_build_graph_with_parse_workers(tmp_path, monkeypatch):
+    repo = str(_make_repo(tmp_path))
+    _, serial_graph = build_graph(repo, draw_graph=False, parse_workers=1)
+
+    monkeypatch.setattr(graph_builder_py, "_MIN_FILES_FOR_POOL", 0)
+    _, parallel_graph = build_graph(repo, draw_graph=False, parse_workers=2)
+
+    assert set(serial_graph.edges) == set(parallel_graph.edges)
+    assert dict(serial_graph.nodes(data=True)) == dict(parallel_graph.nodes(data=True))
+
+def test_nodes_store_spans_instead_of_source(tmp_path):
+    repo = _make_repo(tmp_path)
+    _write(repo / "core" / "views.py", "import functools\n\nclass View:\n    @functools.cache\n    def render(self):\n        return 'é'\n")
+    _, graph = build_graph(str(repo), draw_graph=False)
+
+    data = graph.nodes["myrepo.core.views.View.render"]
+    assert "source" not in data
+    assert data["file"] == "core/views.py"
+    assert (data["lineno"], data["end_lineno"]) == (4, 6)
+    assert get_source(graph, "myrepo.core.views.View.render") == "@functools.cache\ndef render(self):\n    return 'é'"
+    assert get_source(graph, "myrepo.core.views") is None
@@ -0,0 +1,113 @@
+# test_ignore.py
+
+import os
+import pytest
+
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.ignore import IgnoreEngine, IgnoreRule
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def _make_repo(tmp_path):
+    repo = tmp_path / "myrepo"
+    _write(repo / "core" / "api.py", "def get():\n    pass\n")
+    _write(repo / "core" / "api_pb2.py", "class Request:\n    pass\n")
+    _write(repo / "core" / ".gitignore", "generated/\n!keep_pb2.py\n")
+    _write(repo / "core" / "keep_pb2.py", "class Keep:\n    pass\n")
+    _write(repo / "core" / "generated" / "out.py", "def out():\n    pass\n")
+    _write(repo / "third_party" / "lib" / "vendored.py", "def vendored():\n    pass\n")
+    _write(repo / "generated" / "top.py", "def top():\n    pass\n")
+    _write(repo / "build" / "artifact.py", "def artifact():\n    pass\n")
+    _write(repo / ".gitignore", "# build outputs\nbuild/\n")
+    _write(repo / "README.md", "# myrepo\n")
+    return repo
+
+def _matches(rule, path, is_dir=False):
+    ignores = IgnoreEngine([IgnoreRule(rule, "test")])
+    return ignores.is_ignored(ignores.scope("", "/nonexistent"), path, is_dir)
+
+def test_glob_rules():
+    assert _matches("*_pb2.py", "a/b/api_pb2.py")
+    assert not _matches("*_pb2.py", "a/b/api_pb2.pyi")
+    assert _matches("third_party/**", "third_party/lib/x.py")
+    assert not _matches("third_party/**", "src/third_party/x.py")
+    assert _matches("**/migrations/", "app/migrations", is_dir=True)
+    assert not _matches("migrations/", "app/migrations")
+    assert _matches("/setup.py", "setup.py")
+    assert not _matches("/setup.py", "pkg/setup.py")
+    assert _matches("test_?.py", "pkg/test_a.py")
+    assert _matches("[abc].py", "b.py") and not _matches("[!abc].py", "b.py")
+
+def test_build_graph_with_ignores(tmp_path):
+    ignores = IgnoreEngine.from_config(exclude=["*_pb2.py", "third_party/**"])
+    _, graph = build_graph(str(_make_repo(tmp_path)), ignores=ignores)
+
+    assert "myrepo.core.api" in graph
+    assert "myrepo.core.api_pb2" not in graph
+    assert "myrepo.core.keep_pb2" not in graph  # --exclude outranks the .gitignore files
+    assert "myrepo.core.generated" not in graph  # nested .gitignore
+    assert "myrepo.generated.top" in graph  # ... only applies below its own directory
+    assert "myrepo.build" not in graph
+    assert "myrepo.third_party" in graph and "myrepo.third_party.lib" not in graph
+
+    report = {(rule["rule"], rule["source"]): (rule["dirs"], rule["files"]) for rule in ignores.report()}
+    assert report[("*_pb2.py", "--exclude")] == (0, 2)
+    assert report[("third_party/**", "--exclude")] == (1, 0)
+    assert report[("generated/", "core/.gitignore")] == (1, 0)
+    assert report[("build/", ".gitignore")] == (1, 0)
+    assert report[("README.md", "parse_ignores")] == (0, 1)
+
+def test_include_and_no_gitignore(tmp_path):
+    repo = str(_make_repo(tmp_path))
+    _, graph = build_graph(repo, ignores=IgnoreEngine.from_config(include=["build/"]))
+    assert "myrepo.build.artifact" in graph
+    assert "myrepo.core.keep_pb2" in graph
+
+    _, graph = build_graph(repo, ignores=IgnoreEngine.from_config(gitignore=False))
+    assert "myrepo.build.artifact" in graph
+    assert "myrepo.core.generated.out" in graph
+    assert "myrepo.README" not in graph
+
+def test_pruned_directories_are_not_scanned(tmp_path, monkeypatch):
+    repo = _make_repo(tmp_path)
+    scanned = []
+    scandir = os.scandir
+
+    def __scandir(path):
+        scanned.append(os.path.relpath(path, repo))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", __scandir)
+    build_graph(str(repo), ignores=IgnoreEngine.from_config(exclude=["third_party/"]))
+    assert "third_party" not in scanned
+    assert "build" not in scanned
+    assert os.path.join("core", "generated") not in scanned
+
+def test_ignores_path(tmp_path):
+    repo = str(_make_repo(tmp_path))
+    ignores = IgnoreEngine.from_config()
+
+    assert ignores.ignores_path(repo, "core/generated/out.py")
+    assert ignores.ignores_path(repo, "build/artifact.py")
+    assert ignores.ignores_path(repo, "docs/conf.py")
+    assert not ignores.ignores_path(repo, "core/api.py")
+
+def test_default_rules_do_not_depend_on_the_working_directory(tmp_path, monkeypatch):
+    repo = _make_repo(tmp_path)
+    _write(repo / ".git" / "hooks" / "pre-commit.py", "print()\n")
+    _write(repo / "docs" / "conf.py", "project = 'myrepo'\n")
+    monkeypatch.chdir(tmp_path)
+
+    _, graph = build_graph("myrepo")
+    assert "myrepo.docs" not in graph
+    assert not any(".git" in node for node in graph.nodes)
+
+    # .git is pruned even without any rules
+    _, graph = build_graph("myrepo", ignores=IgnoreEngine.from_config("", gitignore=False))
+    assert "myrepo.docs.conf" in graph
+    assert not any(".git" in node for node in graph.nodes)
+
+    with pytest.raises(FileNotFoundError):
+        IgnoreEngine.from_config("configs/parse_ignores")
@@ -0,0 +1,79 @@
+# test_incremental_py.py
+
+import subprocess
+import networkx as nx
+
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.parser_py import get_head_commit
+from src.pipeline.incremental_py import update_graph
+
+def _git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True,
+    )
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def test_update_graph_marks_only_changed_subtree_dirty(tmp_path, monkeypatch):
+    repo = tmp_path / "myrepo"
+    _write(repo / "core" / "api.py", "def get():\n    pass\n")
+    _write(repo / "core" / "models.py", "class Model:\n    def save(self):\n        pass\n")
+    _write(repo / "helpers.py", "def helper():\n    pass\n")
+    _git(repo, "init", "-q")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", "initial")
+
+    monkeypatch.chdir(tmp_path)
+    root_node, graph = build_graph("myrepo", draw_graph=False)
+    for node in graph.nodes:
+        graph.nodes[node]["nla"] = f"old nla of {node}"
+    graph.graph["commit"] = get_head_commit("myrepo")
+    nx.write_graphml(graph, "myrepo_nla.graphml", named_key_ids=True)
+
+    _write(repo / "core" / "api.py", "def get():\n    pass\n\ndef post():\n    pass\n")
+    _write(repo / "extra" / "new.py", "def fresh():\n    pass\n")
+    (repo / "helpers.py").unlink()
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "update")
+
+    root_node, graph, dirty = update_graph("myrepo_nla.graphml", "myrepo")
+
+    assert root_node == "myrepo"
+    assert "myrepo.core.api.post" in graph
+    assert "myrepo.extra.new.fresh" in graph
+    assert "myrepo.helpers" not in graph
+    assert {"myrepo", "myrepo.core", "myrepo.core.api", "myrepo.extra", "myrepo.extra.new"} <= dirty
+    assert "myrepo.core.models" not in dirty
+    assert graph.nodes["myrepo.core.models"]["nla"] == "old nla of myrepo.core.models"
+    assert graph.nodes["myrepo.core.models"]["processed"]
+    assert "nla" not in graph.nodes["myrepo.core"]
+
+def test_update_graph_keeps_symbol_edges(tmp_path, monkeypatch):
+    repo = tmp_path / "myrepo"
+    _write(repo / "core" / "base.py", "class Base:\n    pass\n")
+    _write(repo / "core" / "models.py", "from core.base import Base\n\nclass Model(Base):\n    pass\n")
+    _write(repo / "helpers.py", "from core.models import Model\n\ndef make():\n    return Model()\n")
+    _git(repo, "init", "-q")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", "initial")
+
+    monkeypatch.chdir(tmp_path)
+    _, graph = build_graph("myrepo", draw_graph=False, symbol_edges=True)
+    graph.graph["commit"] = get_head_commit("myrepo")
+    nx.write_graphml(graph, "myrepo_nla.graphml", named_key_ids=True)
+
+    _write(repo / "core" / "models.py", "from core.base import Base\n\nclass Model(Base):\n    def save(self):\n        pass\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "update")
+
+    root_node, graph, dirty = update_graph("myrepo_nla.graphml", "myrepo")
+
+    # edges out of the re-parsed module are resolved again, edges into it are kept
+    assert graph.edges["myrepo.core.models.Model", "myrepo.core.base.Base"]["type"] == "inherits"
+    assert graph.edges["myrepo.helpers.make", "myrepo.core.models.Model"]["type"] == "calls"
+    assert graph.edges["myrepo.core.models.Model", "myrepo.core.models.Model.save"]["type"] == "contains"
+    assert dirty == {"myrepo", "myrepo.core", "myrepo.core.models", "myrepo.core.models.Model",
+                     "myrepo.core.models.Model.save", "myrepo.core.models.save"}
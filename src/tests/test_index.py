@@ -0,0 +1,43 @@
+# test_index.py
+
+import networkx as nx
+
+from src.pipeline.index import NLAIndex, HashingEmbedder, build_index, candidate_nodes, tokenize
+
+def _make_graph():
+    graph = nx.DiGraph()
+    graph.add_edges_from([
+        ("pkg", "pkg.http"), ("pkg", "pkg.db"),
+        ("pkg.http", "pkg.http.send_request"), ("pkg.db", "pkg.db.QueryBuilder"),
+    ])
+    graph.nodes["pkg"]["nla"] = "A client library"
+    graph.nodes["pkg.http"]["nla"] = "Sends HTTP requests and parses responses"
+    graph.nodes["pkg.db"]["nla"] = "Builds SQL queries against the database"
+    return graph
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("pkg.db.QueryBuilder send_request") == ["pkg", "db", "query", "builder", "send", "request"]
+
+def test_index_search_and_candidates():
+    graph = _make_graph()
+    index = build_index(graph)
+
+    assert index.search("http request", top_k=1)[0][0] in {"pkg.http", "pkg.http.send_request"}
+    assert candidate_nodes(graph, index, "sql query builder", top_k=1) == {"pkg", "pkg.db", "pkg.db.QueryBuilder"}
+
+def test_index_incremental_update_and_persistence(tmp_path):
+    graph = _make_graph()
+    index = build_index(graph, embedder=HashingEmbedder(dim=64))
+
+    graph.remove_node("pkg.db.QueryBuilder")
+    graph.nodes["pkg.db"]["nla"] = "Caches HTTP responses on disk"
+    index.update_from_graph(graph, ["pkg.db"])
+    assert "pkg.db.QueryBuilder" not in index
+    assert "sql" not in index.postings
+    assert index.search("cache disk", top_k=1)[0][0] == "pkg.db"
+
+    path = str(tmp_path / "pkg_nla.index.json")
+    index.save(path)
+    loaded = NLAIndex.load(path, embedder=HashingEmbedder(dim=64))
+    assert len(loaded) == len(index)
+    assert loaded.search("cache responses", top_k=3) == index.search("cache responses", top_k=3)
@@ -0,0 +1,89 @@
+# test_model_tiers.py
+
+import asyncio
+import argparse
+import pytest
+import networkx as nx
+
+from src.pipeline.model_tiers import ModelRouter, is_valid_nla
+from src.pipeline.nla_generator_py import _dynamic_traverse
+
+class _StubLLM:
+    def __init__(self, short_models=()):
+        self.calls = []
+        self.short_models = short_models
+
+    async def generate_text(self, model, prompt, **kwargs):
+        self.calls.append(model)
+        await asyncio.sleep(0)
+        if model in self.short_models:
+            return "ok"
+        return f"A description of the code written by {model}, long enough to pass validation."
+
+def _make_args(client, model_tiers):
+    args = argparse.Namespace(
+        workers=2,
+        traverse_priority="fifo",
+        service_llm=client,
+        service_llm_provider="fake",
+        service_llm_model="strong",
+        service_llm_gen_configs={},
+        save_graph_animation=False,
+        graph_imgs_path="graph_imgs",
+        nla_cache=None,
+        checkpoint=None,
+        nla_batch_size=1,
+        nla_batch_max_tokens=4000,
+        nla_prompt_token_budget=None,
+        model_tiers=model_tiers,
+    )
+    args.nla_router = ModelRouter.from_args(args)
+    return args
+
+def _make_tree():
+    graph = nx.DiGraph()
+    graph.add_node("pkg")
+    graph.add_node("pkg.mod", type="module")
+    graph.add_node("pkg.mod.Cls", type="class")
+    graph.add_node("pkg.mod.Cls.method", type="function")
+    graph.add_node("pkg.mod.func", type="function")
+    graph.add_edges_from([("pkg", "pkg.mod"), ("pkg.mod", "pkg.mod.Cls"), ("pkg.mod.Cls", "pkg.mod.Cls.method"),
+                          ("pkg.mod", "pkg.mod.func")])
+    return graph
+
+def test_router_matches_tiers_in_order():
+    args = _make_args(None, [
+        {"types": ["function", "class"], "max_prompt_tokens": 100, "model": "cheap"},
+        {"types": ["module"], "model": "medium", "name": "modules"},
+    ])
+    router = args.nla_router
+    assert router.route("class", 50).model == "cheap"
+    assert router.route("class", 500).model == "strong"
+    assert router.route("module", 5000).name == "modules"
+    assert router.route("package", 10).name == "default"
+
+    with pytest.raises(ValueError):
+        _make_args(None, [{"types": ["method"], "model": "cheap"}])
+    with pytest.raises(ValueError):
+        _make_args(None, [{"types": ["function"], "model": "cheap", "max_tokens": 10}])
+
+def test_default_validator():
+    assert is_valid_nla("This function parses the arguments of the command line interface.")
+    assert not is_valid_nla("ok")
+    assert not is_valid_nla("I'm sorry, but I cannot describe this code without more context.")
+    assert not is_valid_nla("It builds the graph as follows:\n```python\nG = nx.DiGraph()\n")
+    assert not is_valid_nla(None)
+
+def test_traversal_routes_and_escalates():
+    graph = _make_tree()
+    client = _StubLLM(short_models=("cheap",))
+    args = _make_args(client, [{"types": ["class"], "model": "cheap", "escalate": True}, {"types": ["module"], "model": "medium"}])
+
+    asyncio.run(_dynamic_traverse(graph, "pkg", args))
+
+    # the class goes to the cheap model, whose too short answer is escalated to the default model
+    assert graph.nodes["pkg.mod.Cls"]["nla"].endswith("by strong, long enough to pass validation.")
+    assert graph.nodes["pkg.mod.Cls"]["model_tier"] == "tier 0"
+    assert graph.nodes["pkg.mod"]["model_tier"] == "tier 1"
+    assert graph.nodes["pkg"]["model_tier"] == "default"
+    assert sorted(client.calls) == ["cheap", "medium", "strong", "strong"]
@@ -0,0 +1,206 @@
+# test_nla_generator_py.py
+
+import os
+import json
+import pytest
+import asyncio
+import networkx as nx
+
+from src.pipeline.nla_generator_py import generate_nla
+from src.pipeline.nla_generator_py import _dynamic_traverse
+from src.pipeline.nla_generator_py import _traverse_priorities
+from src.pipeline.nla_generator_py import _build_traverse_index
+from src.pipeline.nla_generator_py import _dependency_parts
+from src.pipeline.nla_generator_py import _make_gif
+from src.pipeline.nla_generator_py import _generate_nla_batch
+from src.tests.nla_helpers import StubLLM, make_args, make_tree
+
+def test_dynamic_traverse_annotates_every_parent(tmp_path):
+    for priority in ["fifo", "critical-path"]:
+        graph = make_tree()
+        client = StubLLM()
+        args = make_args(client, priority)
+        args.graph_imgs_path = str(tmp_path)
+
+        asyncio.run(_dynamic_traverse(graph, "pkg", args))
+
+        assert all(graph.nodes[node].get("processed") for node in graph.nodes)
+        assert {node for node in graph.nodes if "nla" in graph.nodes[node]} == {"pkg", "pkg.a", "pkg.b", "pkg.b.sub"}
+        assert len(client.prompts) == 4
+        # the root is always annotated last, after all of its children
+        assert "pkg.a" in client.prompts[-1] and "pkg.b" in client.prompts[-1]
+
+def test_critical_path_priority_prefers_deepest_nodes():
+    graph = make_tree()
+    parents = _build_traverse_index(graph, "pkg")
+    priorities = _traverse_priorities(graph, "pkg", parents, "critical-path")
+    assert priorities["pkg.b.sub.h"] < priorities["pkg.a.f"]
+    assert priorities["pkg.a.f"] == priorities["pkg.a.g"]
+
+def test_build_traverse_index():
+    graph = make_tree()
+    parents = _build_traverse_index(graph, "pkg")
+    assert parents["pkg.b.sub.h"] == "pkg.b.sub"
+    assert "pkg" not in parents
+    assert graph.nodes["pkg"]["children_to_be_processed"] == 2
+    assert graph.nodes["pkg.a.f"]["children_to_be_processed"] == 0
+
+def test_dynamic_traverse_only_annotates_given_nodes(tmp_path):
+    graph = make_tree()
+    client = StubLLM()
+    args = make_args(client)
+    args.graph_imgs_path = str(tmp_path)
+
+    asyncio.run(_dynamic_traverse(graph, "pkg", args, nodes={"pkg", "pkg.b", "pkg.b.sub", "pkg.b.sub.h"}))
+
+    assert len(client.prompts) == 3
+    assert "nla" not in graph.nodes["pkg.a"]
+    assert graph.nodes["pkg"]["processed"]
+
+class _BatchStubLLM(StubLLM):
+    async def generate_text(self, model, prompt, **kwargs):
+        self.prompts.append(prompt)
+        if '"annotations"' in prompt:
+            nodes = [line.split('"')[1] for line in prompt.splitlines() if line.startswith("dependencies of ")]
+            return json.dumps({"annotations": [{"node": node, "nla": f"batched nla of {node}"} for node in nodes]})
+        return "single nla"
+
+def test_dynamic_traverse_batches_ready_siblings(tmp_path):
+    graph = nx.DiGraph()
+    graph.add_edges_from([("pkg", f"pkg.m{idx}") for idx in range(4)])
+    graph.add_edges_from([(f"pkg.m{idx}", f"pkg.m{idx}.f") for idx in range(4)])
+    client = _BatchStubLLM()
+    args = make_args(client, workers=1)
+    args.graph_imgs_path = str(tmp_path)
+    args.nla_batch_size = 3
+
+    asyncio.run(_dynamic_traverse(graph, "pkg", args))
+
+    # m0..m2 share one request, m3 gets its own, then the root
+    assert len(client.prompts) == 3
+    assert graph.nodes["pkg.m1"]["nla"] == "batched nla of pkg.m1"
+    assert graph.nodes["pkg.m3"]["nla"] == "single nla"
+    assert all(graph.nodes[node].get("processed") for node in graph.nodes)
+
+class _FailingBatchStubLLM(StubLLM):
+    def __init__(self):
+        super().__init__()
+        self.gen_configs = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_text(self, model, prompt, **kwargs):
+        self.prompts.append(prompt)
+        self.gen_configs.append(kwargs)
+        if '"annotations"' in prompt:
+            return "not json"
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return "single nla"
+
+def test_generate_nla_batch_falls_back_concurrently():
+    client = _FailingBatchStubLLM()
+    nlas = asyncio.run(_generate_nla_batch(
+        {f"pkg.m{idx}": f"deps {idx}" for idx in range(3)}, client, "stub", {"temperature": 0.8},
+        batch_gen_configs={"temperature": 0.8, "response_format": "annotations"},
+    ))
+
+    assert nlas == {f"pkg.m{idx}": "single nla" for idx in range(3)}
+    # the batch request carries the structured output schema, the single-node ones do not
+    assert client.gen_configs[0]["response_format"] == "annotations"
+    assert all("response_format" not in kwargs for kwargs in client.gen_configs[1:])
+    assert client.max_in_flight == 3
+
+def test_dependency_parts_prefer_nla_over_budget(tmp_path):
+    (tmp_path / "mod.py").write_text("def f():\n" + "    x = 1\n" * 200)
+    graph = nx.DiGraph(repo_path=str(tmp_path))
+    graph.add_edge("pkg.mod", "pkg.mod.f")
+    graph.nodes["pkg.mod.f"].update(type="function", file="mod.py", start_byte=0, end_byte=1610, nla="short nla")
+
+    assert "x = 1" in _dependency_parts(graph, ["pkg.mod.f"])[0][1]
+    assert "short nla" in _dependency_parts(graph, ["pkg.mod.f"], token_budget=100)[0][1]
+
+def test_dynamic_traverse_map_reduces_oversized_parents(tmp_path):
+    graph = nx.DiGraph()
+    graph.add_edges_from([("pkg", f"pkg.m{idx}") for idx in range(6)])
+    for idx in range(6):
+        graph.nodes[f"pkg.m{idx}"]["nla"] = f"module {idx} " * 80
+    client = StubLLM()
+    args = make_args(client, workers=1)
+    args.graph_imgs_path = str(tmp_path)
+    args.nla_prompt_token_budget = 500
+
+    asyncio.run(_dynamic_traverse(graph, "pkg", args, nodes={"pkg"}))
+
+    # the dependencies are summarized in chunks, then the summaries are combined
+    assert len(client.prompts) > 2
+    assert all("part " in prompt for prompt in client.prompts[:-1])
+    assert "summaries" in client.prompts[-1]
+    assert graph.nodes["pkg"]["nla"] == f"nla {len(client.prompts)}"
+    assert graph.nodes["pkg"]["prompt_tokens"] > 500
+
+def test_dynamic_traverse_renders_progress_frames(tmp_path):
+    graph = make_tree()
+    args = make_args(StubLLM())
+    args.graph_imgs_path = str(tmp_path)
+    args.save_graph_animation = True
+    args.graph_animation_max_fps = 0
+    args.graph_animation_max_nodes = 100
+
+    asyncio.run(_dynamic_traverse(graph, "pkg", args))
+
+    # the first and last frames are always rendered
+    assert len(args.graph_animation_frames) >= 2
+    assert all(os.path.exists(frame) for frame in args.graph_animation_frames)
+    _make_gif(args.graph_animation_frames, str(tmp_path / "progress.gif"), duration=100)
+    assert (tmp_path / "progress.gif").stat().st_size > 0
+
+    # large graphs are only animated when opted in
+    args.graph_animation_max_nodes = 3
+    args.graph_animation_frames = None
+    asyncio.run(_dynamic_traverse(make_tree(), "pkg", args))
+    assert args.graph_animation_frames is None
+
+def test_batching_is_disabled_with_model_tiers(caplog):
+    client = _BatchStubLLM()
+    args = make_args(client)
+    args.nla_batch_size = 3
+    args.nla_batch_gen_config_path = None
+    args.service_llm_provider = "anthropic"
+    args.model_tiers = [{"types": ["module"], "model": "small"}]
+    args.disable_nla_cache = True
+    args.checkpoint_dir = None
+    graph = nx.DiGraph()
+    graph.add_edges_from([("pkg", f"pkg.m{idx}") for idx in range(3)] + [(f"pkg.m{idx}", f"pkg.m{idx}.f") for idx in range(3)])
+    for idx in range(3):
+        graph.nodes[f"pkg.m{idx}"]["type"] = "module"
+
+    asyncio.run(generate_nla(graph, "pkg", args))
+    assert args.nla_batch_size == 1 and "ignored with --model-tiers" in caplog.text
+    assert all(graph.nodes[f"pkg.m{idx}"]["model_tier"] == "tier 0" for idx in range(3))
+    assert not any('"annotations"' in prompt for prompt in client.prompts)
+
+def test_batch_gen_configs_default_to_the_provider():
+    args = make_args(_BatchStubLLM())
+    args.nla_batch_size = 3
+    args.nla_batch_gen_config_path = None
+    args.disable_nla_cache = True
+    args.checkpoint_dir = None
+    graph = make_tree()
+
+    args.service_llm_provider = "gemini"
+    asyncio.run(generate_nla(graph, "pkg", args))
+    schema = args.service_llm_batch_gen_configs["response_schema"]
+    assert schema["properties"]["annotations"]["items"]["required"] == ["node", "nla"]
+
+    args.service_llm_batch_gen_configs = None
+    args.service_llm_provider = "anthropic"
+    asyncio.run(generate_nla(graph, "pkg", args))
+    assert "tools" not in args.service_llm_batch_gen_configs
+
+    args.service_llm_batch_gen_configs = None
+    args.service_llm_provider = "bedrock"
+    with pytest.raises(ValueError, match="--nla-batch-gen-config-path"):
+        asyncio.run(generate_nla(graph, "pkg", args))
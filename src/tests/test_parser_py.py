@@ -2,10 +2,13 @@
 
 import pytest
 import os
+import git
 import shutil
+import threading
 
 from src.pipeline.parser_py import _is_github_url
 from src.pipeline.parser_py import _clone_repo
+from src.pipeline.parser_py import get_changed_files
 
 def test_is_github_url():
     assert _is_github_url("https://github.com/user/repo") == True
@@ -18,4 +21,83 @@ def test_clone_repo():
     repo_path = _clone_repo("https://github.com/deep-diver/hiera")
     assert os.path.isdir(repo_path) == True
     assert os.path.exists(repo_path) == True
-    shutil.rmtree(repo_path)
\ No newline at end of file
+    shutil.rmtree(repo_path)
+
+def _make_remote(tmp_path):
+    work = git.Repo.init(tmp_path / "work")
+    (tmp_path / "work" / "mod.py").write_text("VERSION = 1\n")
+    work.index.add(["mod.py"])
+    first = work.index.commit("first").hexsha
+    (tmp_path / "work" / "mod.py").write_text("VERSION = 2\n")
+    work.index.add(["mod.py"])
+    work.index.commit("second")
+
+    git.Repo.init(tmp_path / "remote.git", bare=True)
+    work.create_remote("origin", str(tmp_path / "remote.git")).push("HEAD:refs/heads/main")
+    git.Repo(tmp_path / "remote.git").git.symbolic_ref("HEAD", "refs/heads/main")
+    return work, f"file://{tmp_path / 'remote.git'}", first
+
+def test_clone_repo_is_shallow_and_cached(tmp_path):
+    work, url, first = _make_remote(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+
+    repo_path = _clone_repo(url, cache_dir=cache_dir)
+    assert os.path.basename(repo_path) == "remote"
+    assert open(os.path.join(repo_path, "mod.py")).read() == "VERSION = 2\n"
+    assert git.Repo(repo_path).git.rev_parse("--is-shallow-repository") == "true"
+
+    # pinned to an older commit, in the same cached checkout
+    assert _clone_repo(url, ref=first, cache_dir=cache_dir) == repo_path
+    assert open(os.path.join(repo_path, "mod.py")).read() == "VERSION = 1\n"
+
+    # new commits are picked up with a fetch
+    (tmp_path / "work" / "mod.py").write_text("VERSION = 3\n")
+    work.index.add(["mod.py"])
+    work.index.commit("third")
+    work.remote("origin").push("HEAD:refs/heads/main")
+    assert _clone_repo(url, ref="main", cache_dir=cache_dir) == repo_path
+    assert open(os.path.join(repo_path, "mod.py")).read() == "VERSION = 3\n"
+
+def test_clone_repo_concurrent_runs(tmp_path):
+    _, url, _ = _make_remote(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    paths, errors = [], []
+
+    def __clone():
+        try:
+            paths.append(_clone_repo(url, cache_dir=cache_dir))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=__clone) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(set(paths)) == 1
+
+def test_clone_repo_pins_a_commit_when_fetch_by_sha_is_refused(tmp_path, monkeypatch):
+    _, url, first = _make_remote(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    repo_path = _clone_repo(url, cache_dir=cache_dir)
+
+    # protocol v0 servers only serve the advertised refs
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "1")
+    monkeypatch.setenv("GIT_CONFIG_KEY_0", "protocol.version")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_0", "0")
+    assert _clone_repo(url, ref=first, cache_dir=cache_dir) == repo_path
+    assert open(os.path.join(repo_path, "mod.py")).read() == "VERSION = 1\n"
+
+def test_changed_files_fetch_a_missing_base_commit(tmp_path):
+    _, url, first = _make_remote(tmp_path)
+
+    # a fresh cache only holds the newest commit
+    repo_path = _clone_repo(url, cache_dir=str(tmp_path / "cache"))
+    repo = git.Repo(repo_path)
+    with pytest.raises(git.GitCommandError):
+        repo.git.cat_file("-e", f"{first}^{{commit}}")
+
+    assert get_changed_files(repo_path, first) == [("M", "mod.py")]
+    assert open(os.path.join(repo_path, "mod.py")).read() == "VERSION = 2\n"
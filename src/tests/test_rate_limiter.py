@@ -0,0 +1,102 @@
+# test_rate_limiter.py
+
+import time
+import asyncio
+import pytest
+
+from src.pipeline.rate_limiter import RateLimitedClient, TokenBucket, AIMDLimiter, is_throttle_error
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+class _FlakyLLM:
+    """
+    Fails the first `failures` calls with `error`, then answers.
+    """
+    def __init__(self, failures=0, error=_RateLimitError, delay=0.0):
+        self.failures = failures
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_text(self, model, prompt, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.calls <= self.failures:
+                raise self.error("slow down")
+            return f"answer to {prompt}"
+        finally:
+            self.in_flight -= 1
+
+def test_retries_throttled_calls():
+    client = _FlakyLLM(failures=2)
+    limited = RateLimitedClient(client, max_concurrency=4, base_delay=0.001)
+
+    assert asyncio.run(limited.generate_text("stub", prompt="q")) == "answer to q"
+    assert client.calls == 3
+    assert limited.stats()["retries"] == 2
+    assert limited.stats()["throttled"] == 2
+    # every throttled call halves the concurrency
+    assert limited.concurrency.limit < 4
+
+def test_gives_up_after_max_retries_and_on_fatal_errors():
+    limited = RateLimitedClient(_FlakyLLM(failures=10), max_retries=2, base_delay=0.001)
+    with pytest.raises(_RateLimitError):
+        asyncio.run(limited.generate_text("stub", prompt="q"))
+
+    client = _FlakyLLM(failures=1, error=ValueError)
+    with pytest.raises(ValueError):
+        asyncio.run(RateLimitedClient(client, base_delay=0.001).generate_text("stub", prompt="q"))
+    assert client.calls == 1
+
+def test_times_out_stuck_calls():
+    limited = RateLimitedClient(_FlakyLLM(delay=1.0), max_retries=1, base_delay=0.001, timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(limited.generate_text("stub", prompt="q"))
+    assert limited.stats()["timeouts"] == 2
+
+def test_concurrency_is_bounded():
+    client = _FlakyLLM(delay=0.01)
+    limited = RateLimitedClient(client, max_concurrency=3)
+
+    async def __run():
+        await asyncio.gather(*[limited.generate_text("stub", prompt=str(idx)) for idx in range(12)])
+
+    asyncio.run(__run())
+    assert client.max_in_flight == 3
+
+def test_token_bucket_waits_for_refill():
+    async def __run():
+        bucket = TokenBucket(per_minute=1200, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire(1)
+        return time.monotonic() - start
+
+    # two calls are served from the bucket, the other two wait 50ms each
+    assert asyncio.run(__run()) >= 0.09
+
+def test_aimd_limiter():
+    async def __run():
+        limiter = AIMDLimiter(initial=8, maximum=8)
+        await limiter.acquire()
+        await limiter.release(throttled=True)
+        throttled_limit = limiter.limit
+        for _ in range(20):
+            await limiter.acquire()
+            await limiter.release()
+        return throttled_limit, limiter.limit
+
+    throttled_limit, recovered_limit = asyncio.run(__run())
+    assert throttled_limit == 4
+    assert 4 < recovered_limit <= 8
+
+def test_is_throttle_error():
+    assert is_throttle_error(_RateLimitError())
+    assert is_throttle_error(type("ResourceExhausted", (Exception,), {})())
+    assert not is_throttle_error(ValueError("bad request"))
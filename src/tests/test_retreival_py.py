@@ -0,0 +1,50 @@
+# test_retreival_py.py
+
+import json
+import asyncio
+import networkx as nx
+
+from src.pipeline.retreival_py import retrieve
+
+class _KeywordLLM:
+    """
+    Scores a node 9 if its name contains one of the keywords, 1 otherwise.
+    """
+    def __init__(self, keywords):
+        self.keywords = keywords
+        self.scored_nodes = []
+
+    async def generate_text(self, model, prompt, **kwargs):
+        node = prompt.split('"')[1]
+        self.scored_nodes.append(node)
+        score = 9 if any(keyword in node for keyword in self.keywords) else 1
+        return json.dumps({"score": score, "reason": f"{node} scored {score}"})
+
+def _make_graph(tmp_path):
+    (tmp_path / "http.py").write_text("def send():\n    pass\n\ndef recv():\n    pass\n")
+    graph = nx.DiGraph(repo_path=str(tmp_path))
+    graph.add_edges_from([
+        ("pkg", "pkg.http"), ("pkg", "pkg.db"),
+        ("pkg.http", "pkg.http.send"), ("pkg.http", "pkg.http.recv"),
+        ("pkg.db", "pkg.db.query"), ("pkg.db", "pkg.db.connect"),
+    ])
+    for node in ["pkg", "pkg.http", "pkg.db"]:
+        graph.nodes[node]["nla"] = f"description of {node}"
+    for node, start, end in [("pkg.http.send", 0, 20), ("pkg.http.recv", 22, 42)]:
+        graph.nodes[node].update(type="function", file="http.py", start_byte=start, end_byte=end)
+    for node in ["pkg.db.query", "pkg.db.connect"]:
+        graph.nodes[node].update(type="function", file="http.py", start_byte=0, end_byte=20)
+    return graph
+
+def test_retrieve_prunes_irrelevant_subtrees(tmp_path):
+    client = _KeywordLLM(["http", "send"])
+    results, llm_calls = asyncio.run(retrieve(
+        _make_graph(tmp_path), "how to send a request", client, "stub", {}, beam_width=1,
+    ))
+
+    assert [result["node"] for result in results] == ["pkg.http.send"]
+    assert results[0]["source"] == "def send():\n    pass"
+    assert results[0]["score"] == 9
+    # the children of pkg.db are never scored
+    assert sorted(client.scored_nodes) == ["pkg.db", "pkg.http", "pkg.http.recv", "pkg.http.send"]
+    assert llm_calls == 4
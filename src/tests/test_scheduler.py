@@ -0,0 +1,42 @@
+# test_scheduler.py
+
+import asyncio
+
+from src.pipeline.scheduler import FairScheduler
+
+def test_freed_slots_go_round_robin_across_tenants():
+    order = []
+
+    async def __task(scheduler, tenant):
+        async with scheduler.slot(tenant):
+            order.append(tenant)
+            await asyncio.sleep(0.01)
+
+    async def __run():
+        scheduler = FairScheduler(1)
+        # the large repository queues all of its tasks before the small one
+        tasks = [asyncio.create_task(__task(scheduler, "large")) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(__task(scheduler, "small")) for _ in range(2)]
+        await asyncio.gather(*tasks)
+        return scheduler
+
+    scheduler = asyncio.run(__run())
+    assert order == ["large", "large", "small", "large", "small", "large"]
+    assert scheduler.granted == {"large": 4, "small": 2}
+    assert scheduler.in_use == 0
+
+def test_cancelled_waiters_give_up_their_turn():
+    async def __run():
+        scheduler = FairScheduler(1)
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.wait_for(scheduler.acquire("c"), timeout=1)
+        return scheduler
+
+    scheduler = asyncio.run(__run())
+    assert scheduler.in_use == 1 and "b" not in scheduler.granted
@@ -0,0 +1,51 @@
+# test_server.py
+
+import json
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+import server.main
+from server.jobs import JobManager
+
+def _make_repo(tmp_path):
+    repo_path = tmp_path / "toypkg"
+    repo_path.mkdir()
+    (repo_path / "__init__.py").write_text("")
+    (repo_path / "http.py").write_text("def send(request):\n    return request\n\nclass Session:\n    def get(self):\n        pass\n")
+    return str(repo_path)
+
+def test_jobs_are_deduplicated_streamed_and_cached(tmp_path, monkeypatch):
+    fake_config_path = tmp_path / "fake_llm.yaml"
+    fake_config_path.write_text("latency: constant\nlatency_ms: 20\n")
+    monkeypatch.setattr(server.main, "manager", JobManager(
+        str(tmp_path / "data"), max_workers=2, pipeline_overrides={
+            "fake_llm_config_path": str(fake_config_path),
+            "disable_nla_cache": True,
+            "parse_workers": 1,
+            "workers": 2,
+        },
+    ))
+    request = {"repo_url": _make_repo(tmp_path), "prompt": "send a request",
+               "service_llm_provider": "fake", "service_llm_model": "fake"}
+
+    with TestClient(server.main.app) as client:
+        first = client.post("/jobs", json=request).json()
+        second = client.post("/jobs", json=request).json()
+        assert second["job_id"] == first["job_id"] and second["deduplicated"]
+
+        with client.stream("GET", first["events_url"]) as response:
+            events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+        stages = [event.get("stage") for event in events]
+        assert "building graph" in stages and "annotating" in stages
+        assert events[-1]["status"] == "done"
+
+        result = client.get(first["result_url"])
+        assert result.status_code == 200 and "<html>" in result.text
+
+        # finished outputs are served from the cache
+        cached = client.post("/jobs", json=request).json()
+        assert cached["job_id"] != first["job_id"] and cached["status"] == "done"
+        assert client.get(f"/jobs/{cached['job_id']}").json()["last_event"]["stage"] == "cached"
+        assert client.get("/jobs/unknown").status_code == 404
@@ -0,0 +1,62 @@
+# test_snapshot.py
+
+import pytest
+import networkx as nx
+
+from src.pipeline.snapshot import read_graph, write_graph, read_snapshot, convert
+
+def _make_graph():
+    graph = nx.DiGraph(repo_path="/tmp/pkg", commit="abc123")
+    graph.add_edges_from([
+        ("pkg", "pkg.a"), ("pkg", "pkg.b"),
+        ("pkg.a", "pkg.a.f"), ("pkg.b", "pkg.b.g"), ("pkg.b", "pkg.b.h"),
+    ])
+    graph.nodes["pkg.a"]["type"] = "module"
+    graph.nodes["pkg.a"]["nla"] = "módulo a"
+    graph.nodes["pkg.a.f"]["type"] = "function"
+    graph.nodes["pkg.a.f"]["start_byte"] = 10
+    graph.nodes["pkg.a.f"]["processed"] = True
+    graph.nodes["pkg.b.g"]["score"] = 0.5
+    graph.edges["pkg", "pkg.b"]["weight"] = 3
+    return graph
+
+def test_snapshot_roundtrip(tmp_path):
+    graph = _make_graph()
+    path = str(tmp_path / "pkg.llsnap")
+    write_graph(graph, path)
+    loaded = read_graph(path)
+
+    assert loaded.graph["commit"] == "abc123"
+    assert set(loaded.edges) == set(graph.edges)
+    assert dict(loaded.nodes(data=True)) == dict(graph.nodes(data=True))
+    assert loaded.edges["pkg", "pkg.b"] == {"weight": 3}
+
+def test_snapshot_partial_load(tmp_path):
+    path = str(tmp_path / "pkg.llsnap")
+    write_graph(_make_graph(), path)
+
+    subtree = read_snapshot(path, subtree="pkg.b")
+    assert set(subtree.nodes) == {"pkg.b", "pkg.b.g", "pkg.b.h"}
+    assert set(subtree.edges) == {("pkg.b", "pkg.b.g"), ("pkg.b", "pkg.b.h")}
+    assert subtree.nodes["pkg.b.g"]["score"] == 0.5
+
+    no_text = read_snapshot(path, attributes=["type"])
+    assert "nla" not in no_text.nodes["pkg.a"]
+    assert no_text.nodes["pkg.a"]["type"] == "module"
+
+def test_snapshot_graphml_conversion(tmp_path):
+    graphml_path = str(tmp_path / "pkg.graphml")
+    snapshot_path = str(tmp_path / "pkg.llsnap")
+    write_graph(_make_graph(), graphml_path)
+
+    convert(graphml_path, snapshot_path)
+    convert(snapshot_path, str(tmp_path / "roundtrip.graphml"))
+
+    assert dict(read_graph(snapshot_path).nodes(data=True)) == dict(nx.read_graphml(graphml_path).nodes(data=True))
+    assert set(read_graph(str(tmp_path / "roundtrip.graphml")).edges) == set(_make_graph().edges)
+
+def test_snapshot_rejects_unknown_files(tmp_path):
+    path = tmp_path / "bogus.llsnap"
+    path.write_bytes(b"not a snapshot at all")
+    with pytest.raises(ValueError):
+        read_graph(str(path))
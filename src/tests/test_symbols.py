@@ -0,0 +1,74 @@
+# test_symbols.py
+
+from src.pipeline.graph_builder_py import build_graph
+from src.pipeline.snapshot import write_graph, read_snapshot
+from src.pipeline.symbols import SymbolTable, containment_view, symbol_dependencies
+from src.pipeline.utils import find_root
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+def _make_repo(tmp_path):
+    repo = tmp_path / "myrepo"
+    _write(repo / "pkg" / "__init__.py", "from .api import get\n")
+    _write(repo / "pkg" / "api.py",
+           "from .models import Model as M\nimport pkg.util\n\n"
+           "def get():\n    return M().save()\n\n"
+           "def post():\n    get()\n    pkg.util.helper()\n    return len([])\n")
+    _write(repo / "pkg" / "models.py",
+           "from pkg.base import Base\n\n"
+           "class Model(Base):\n    def save(self):\n        return self.validate()\n\n"
+           "    def validate(self):\n        return True\n")
+    _write(repo / "pkg" / "base.py", "class Base:\n    pass\n")
+    _write(repo / "pkg" / "util.py", "def helper():\n    pass\n")
+    _write(repo / "client.py", "from pkg import get\n\ndef run():\n    return get()\n")
+    return repo
+
+def _typed_edges(graph, edge_type):
+    return {(source, target) for source, target, data in graph.edges(data="type") if data == edge_type}
+
+def test_symbol_edges(tmp_path):
+    root_node, graph = build_graph(str(_make_repo(tmp_path)), symbol_edges=True)
+
+    assert _typed_edges(graph, "inherits") == {("myrepo.pkg.models.Model", "myrepo.pkg.base.Base")}
+    assert {
+        ("myrepo.client.run", "myrepo.pkg.api.get"),  # through the re-export of the package
+        ("myrepo.pkg.api.get", "myrepo.pkg.models.Model"),  # through an aliased import
+        ("myrepo.pkg.api.post", "myrepo.pkg.api.get"),
+        ("myrepo.pkg.api.post", "myrepo.pkg.util.helper"),
+        ("myrepo.pkg.models.Model.save", "myrepo.pkg.models.Model.validate"),
+    } <= _typed_edges(graph, "calls")
+    assert graph.edges["myrepo.client", "myrepo.pkg.api.get"] == {"type": "imports", "alias": "get"}
+    assert graph.edges["myrepo.pkg", "myrepo.pkg.api"]["type"] == "contains"
+    assert symbol_dependencies(graph, "myrepo.pkg.models.Model") == ["myrepo.pkg.base.Base"]
+
+    # the tree traversals do not see the symbol edges
+    tree = containment_view(graph)
+    assert find_root(graph) == root_node
+    assert set(tree.successors("myrepo.pkg.api")) == {"myrepo.pkg.api.get", "myrepo.pkg.api.post"}
+
+def test_build_graph_without_symbol_edges(tmp_path):
+    _, graph = build_graph(str(_make_repo(tmp_path)))
+
+    assert all(edge_type is None for _, _, edge_type in graph.edges(data="type"))
+    assert containment_view(graph) is graph
+
+def test_symbol_table_and_snapshot_round_trip(tmp_path):
+    _, graph = build_graph(str(_make_repo(tmp_path)), symbol_edges=True)
+
+    SymbolTable.from_graph(graph).save(str(tmp_path / "symbols.json"))
+    table = SymbolTable.load(str(tmp_path / "symbols.json"))
+    assert table.resolve("pkg.models.Model") == "myrepo.pkg.models.Model"
+    assert table.resolve("pkg.get") == "myrepo.pkg.api.get"
+    assert table.resolve("myrepo.pkg.api.M.save") == "myrepo.pkg.models.Model.save"
+    assert table.resolve("numpy.array") is None
+
+    write_graph(graph, str(tmp_path / "myrepo.llsnap"))
+    assert set(read_snapshot(str(tmp_path / "myrepo.llsnap")).edges(data="type")) == set(graph.edges(data="type"))
+
+    # subtrees are still contiguous ranges, symbol edges leaving them are dropped
+    subtree = read_snapshot(str(tmp_path / "myrepo.llsnap"), subtree="myrepo.pkg.models")
+    assert set(subtree.nodes) == {"myrepo.pkg.models", "myrepo.pkg.models.Model", "myrepo.pkg.models.Model.save",
+                                  "myrepo.pkg.models.Model.validate", "myrepo.pkg.models.save", "myrepo.pkg.models.validate"}
+    assert ("myrepo.pkg.models.Model.save", "myrepo.pkg.models.Model.validate") in subtree.edges
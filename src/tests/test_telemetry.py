@@ -0,0 +1,50 @@
+# test_telemetry.py
+
+import json
+import asyncio
+
+from src.pipeline import telemetry
+from src.pipeline.nla_generator_py import _dynamic_traverse
+from src.tests.nla_helpers import StubLLM, make_args, make_tree
+
+def test_telemetry_records_spans_and_metrics(tmp_path):
+    jsonl_path = tmp_path / "metrics.jsonl"
+    recorder = telemetry.Telemetry(str(jsonl_path))
+    with recorder.span("llm.call", node="pkg.a") as attrs:
+        attrs["completion_tokens"] = 12
+    recorder.count("llm.calls")
+    recorder.count("llm.calls")
+    recorder.gauge("nla.queue_depth", 5)
+    recorder.gauge("nla.queue_depth", 2)
+    recorder.close()
+
+    records = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    assert records[0]["type"] == "span"
+    assert records[0]["node"] == "pkg.a" and records[0]["completion_tokens"] == 12
+    assert [record["value"] for record in records[1:]] == [5, 2]
+
+    prometheus = recorder.prometheus()
+    assert 'layerlens_span_seconds_count{span="llm.call"} 1' in prometheus
+    assert "layerlens_llm_calls_total 2" in prometheus
+    assert "layerlens_nla_queue_depth 2" in prometheus
+    assert "layerlens_nla_queue_depth_max 5" in prometheus
+    assert "llm.call" in recorder.summary_table()
+
+def test_traversal_is_instrumented(tmp_path):
+    jsonl_path = tmp_path / "metrics.jsonl"
+    telemetry.configure(str(jsonl_path))
+    graph = make_tree()
+    args = make_args(StubLLM())
+    args.graph_imgs_path = str(tmp_path)
+
+    asyncio.run(_dynamic_traverse(graph, "pkg", args))
+    telemetry.finish(str(tmp_path / "metrics.prom"))
+
+    records = [json.loads(line) for line in jsonl_path.read_text().splitlines()]
+    node_events = {record["node"]: record for record in records if record["name"] == "node"}
+    # every parent reports the tokens of its prompt and completion
+    assert set(node_events) == {node for node in graph.nodes if graph.out_degree(node) > 0}
+    assert all(event["prompt_tokens"] > 0 and event["completion_tokens"] > 0 for event in node_events.values())
+    assert sum(record["name"] == "nla.task" for record in records) == graph.number_of_nodes()
+    assert "layerlens_llm_calls_total 4" in (tmp_path / "metrics.prom").read_text()
+    telemetry.configure()
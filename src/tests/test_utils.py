@@ -0,0 +1,19 @@
+# test_utils.py
+
+from src.pipeline.utils import create_pydantic_class_from_yaml
+
+def test_create_pydantic_class_from_yaml_with_nested_classes():
+    schema = {
+        "Verdict": {"node": "str", "relevance": "bool", "reason": "str"},
+        "BatchRelevance": {"verdicts": "list[Verdict]"},
+    }
+    batch_class = create_pydantic_class_from_yaml(schema)
+
+    batch = batch_class.model_validate({"verdicts": [{"node": "pkg.a", "relevance": True, "reason": "sends requests"}]})
+    assert batch.verdicts[0].node == "pkg.a"
+
+    # strict structured outputs need every object closed
+    json_schema = batch_class.model_json_schema()
+    assert json_schema["additionalProperties"] is False
+    assert json_schema["$defs"]["Verdict"]["additionalProperties"] is False
+    assert json_schema["$defs"]["Verdict"]["required"] == ["node", "relevance", "reason"]